@@ -7,11 +7,15 @@ from flask import Flask
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
 from config import config
-from models.models import db
+from db import db, migrate
 import os
 
-from routes.driver_toll_zones import driver_toll_zones_bp
-from routes.payments import payments_bp
+from routes.auth_routes import auth_bp
+from routes.geo_fencing_routes import geo_fencing_bp
+from routes.toll_zones import toll_zones_bp
+from routes.tolls_history import tolls_history_bp
+from routes.reports import reports_bp
+from routes.mpesa_routes import mpesa_bp
 
 
 def create_app(config_name=None):
@@ -22,12 +26,17 @@ def create_app(config_name=None):
     app.config.from_object(config.get(config_name, config["default"]))
 
     db.init_app(app)
+    migrate.init_app(app, db)
     JWTManager(app)
     CORS(app)
 
     # Register routes
-    app.register_blueprint(driver_toll_zones_bp)
-    app.register_blueprint(payments_bp)
+    app.register_blueprint(auth_bp, url_prefix="/api")
+    app.register_blueprint(geo_fencing_bp, url_prefix="/api")
+    app.register_blueprint(toll_zones_bp, url_prefix="/api")
+    app.register_blueprint(tolls_history_bp, url_prefix="/api")
+    app.register_blueprint(reports_bp, url_prefix="/api")
+    app.register_blueprint(mpesa_bp)
 
     @app.route("/health", methods=["GET"])
     def health_check():
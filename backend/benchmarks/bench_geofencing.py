@@ -0,0 +1,355 @@
+"""
+Geo-Fencing Benchmark
+File: backend/benchmarks/bench_geofencing.py
+
+Generates synthetic toll zones and a synthetic driver population, then
+measures point classification latency (p50/p99) and throughput:
+
+- index:  ZoneIndex.find_zone (STRtree only), no database
+- grid:   ZoneIndex.find_zone with the coverage grid, no database
+- batch:  ZoneIndex.classify_many over the whole ping set, no database
+- db:     GeoFencingService.check_zone_entry against SQLite, zones cached
+- db_sql: Same, with the zone cache disabled so every ping runs the SQL
+          bounding-box prefilter
+
+Usage:
+    python -m benchmarks.bench_geofencing
+    python -m benchmarks.bench_geofencing --sizes 10 1000 --pings 5000
+    python -m benchmarks.bench_geofencing --output results.json --compare baseline.json
+"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import uuid
+from datetime import datetime
+
+import shapely
+from shapely.geometry import Polygon
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.zone_index import ZoneIndex, ZoneSnapshot  # noqa: E402
+
+
+DEFAULT_SIZES = [10, 1000, 10000, 100000]
+
+# Zones sit on a jittered lattice this far apart, so density stays constant
+ZONE_SPACING = 0.02
+ORIGIN_LAT = -4.0
+ORIGIN_LNG = 34.0
+
+
+# --------------------------------------------------
+# Synthetic data
+# --------------------------------------------------
+def generate_zones(count, rng):
+    """Irregular 8-vertex polygons, 300-800 m across, spread on a lattice"""
+    side = math.ceil(math.sqrt(count))
+    zones = []
+    for i in range(count):
+        row, col = divmod(i, side)
+        center_lat = ORIGIN_LAT + row * ZONE_SPACING + rng.uniform(-0.004, 0.004)
+        center_lng = ORIGIN_LNG + col * ZONE_SPACING + rng.uniform(-0.004, 0.004)
+        radius = rng.uniform(0.0015, 0.004)
+
+        ring = []
+        for k in range(8):
+            angle = 2 * math.pi * k / 8
+            r = radius * rng.uniform(0.7, 1.0)
+            ring.append((center_lng + r * math.cos(angle), center_lat + r * math.sin(angle)))
+        ring.append(ring[0])
+
+        zones.append({
+            "zone_id": uuid.UUID(int=rng.getrandbits(128)),
+            "zone_name": f"Synthetic Zone {i}",
+            "charge_amount": rng.choice([50, 100, 200]),
+            "polygon": Polygon(ring)
+        })
+    return zones
+
+
+def region_bounds(zone_count):
+    side = math.ceil(math.sqrt(zone_count))
+    span = side * ZONE_SPACING
+    return ORIGIN_LAT - ZONE_SPACING, ORIGIN_LAT + span, ORIGIN_LNG - ZONE_SPACING, ORIGIN_LNG + span
+
+
+def generate_pings(zone_count, driver_count, ping_count, rng):
+    """
+    Random-walk traces for a driver population, interleaved round-robin
+
+    Each driver moves ~55 m per ping with a slowly drifting heading, so
+    traces drive into, through and out of zones like real vehicles.
+    """
+    min_lat, max_lat, min_lng, max_lng = region_bounds(zone_count)
+    step = 0.0005
+
+    drivers = [
+        {
+            "driver_id": uuid.UUID(int=rng.getrandbits(128)),
+            "lat": rng.uniform(min_lat, max_lat),
+            "lng": rng.uniform(min_lng, max_lng),
+            "heading": rng.uniform(0, 2 * math.pi)
+        }
+        for _ in range(driver_count)
+    ]
+
+    pings = []
+    for i in range(ping_count):
+        driver = drivers[i % driver_count]
+        driver["heading"] += rng.gauss(0, 0.3)
+        driver["lat"] += step * math.sin(driver["heading"])
+        driver["lng"] += step * math.cos(driver["heading"])
+
+        # Bounce off the region edges
+        if not min_lat <= driver["lat"] <= max_lat or not min_lng <= driver["lng"] <= max_lng:
+            driver["heading"] += math.pi
+            driver["lat"] = min(max(driver["lat"], min_lat), max_lat)
+            driver["lng"] = min(max(driver["lng"], min_lng), max_lng)
+
+        pings.append((driver["driver_id"], driver["lat"], driver["lng"]))
+
+    return [driver["driver_id"] for driver in drivers], pings
+
+
+def snapshots(zones):
+    return [
+        ZoneSnapshot(z["zone_id"], z["zone_name"], z["charge_amount"], z["polygon"])
+        for z in zones
+    ]
+
+
+# --------------------------------------------------
+# Measurement
+# --------------------------------------------------
+def summarize(mode, zone_count, latencies_ns, total_seconds, extra=None):
+    latencies_ns = sorted(latencies_ns)
+    result = {
+        "mode": mode,
+        "zones": zone_count,
+        "ops": len(latencies_ns),
+        "p50_us": round(percentile(latencies_ns, 50) / 1000, 2),
+        "p99_us": round(percentile(latencies_ns, 99) / 1000, 2),
+        "throughput_per_s": round(len(latencies_ns) / total_seconds, 1) if total_seconds else None
+    }
+    if extra:
+        result.update(extra)
+    return result
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0
+    k = min(len(sorted_values) - 1, max(0, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[k]
+
+
+def time_each(fn, items):
+    latencies = []
+    started = time.perf_counter()
+    for item in items:
+        t0 = time.perf_counter_ns()
+        fn(item)
+        latencies.append(time.perf_counter_ns() - t0)
+    return latencies, time.perf_counter() - started
+
+
+def bench_in_memory(zone_count, zones, pings, grid_cell_size):
+    results = []
+
+    t0 = time.perf_counter()
+    index = ZoneIndex(snapshots(zones))
+    build_s = time.perf_counter() - t0
+    latencies, total = time_each(lambda p: index.find_zone(p[1], p[2]), pings)
+    results.append(summarize("index", zone_count, latencies, total, {"build_s": round(build_s, 3)}))
+
+    t0 = time.perf_counter()
+    gridded = ZoneIndex(snapshots(zones), grid_cell_size=grid_cell_size)
+    build_s = time.perf_counter() - t0
+    if gridded.grid is not None:
+        latencies, total = time_each(lambda p: gridded.find_zone(p[1], p[2]), pings)
+        results.append(summarize("grid", zone_count, latencies, total, {
+            "build_s": round(build_s, 3),
+            "grid_cells": len(gridded.grid.cells),
+            "grid_hit_rate": gridded.grid.hit_rate()
+        }))
+
+    lats = [p[1] for p in pings]
+    lngs = [p[2] for p in pings]
+    t0 = time.perf_counter_ns()
+    index.classify_many(lats, lngs)
+    elapsed_ns = time.perf_counter_ns() - t0
+    # One vectorized call: report the amortized per-ping cost
+    per_ping = elapsed_ns / max(len(pings), 1)
+    results.append(summarize("batch", zone_count, [per_ping] * len(pings), elapsed_ns / 1e9))
+
+    return results
+
+
+def bench_database(zone_count, zones, driver_ids, pings, grid_cell_size, cache_zones=True):
+    from flask import Flask
+    from config import TestingConfig
+    from db import db, User, TollZone, ZoneSetVersion
+    from services.driver_state import driver_state_store
+    from services.geo_service import GeoFencingService
+    from services.trajectory import trajectory_processor
+    from services.zone_index import reset_zone_index
+
+    app = Flask(__name__)
+    app.config.from_object(TestingConfig)
+    app.config["SQLALCHEMY_ECHO"] = False
+    app.config["ZONE_GRID_CELL_DEGREES"] = grid_cell_size
+    app.config["ZONE_VERSION_POLL_SECONDS"] = 1.0  # production default
+    app.config["ZONE_CACHE_MAX_ZONES"] = 0 if cache_zones else 1
+    db.init_app(app)
+
+    with app.app_context():
+        db.create_all()
+        reset_zone_index()
+        driver_state_store.reset()
+        trajectory_processor.reset()
+
+        db.session.bulk_insert_mappings(User, [
+            {"user_id": driver_id, "username": str(driver_id), "password_hash": "x"}
+            for driver_id in driver_ids
+        ])
+        zone_rows = []
+        for z in zones:
+            row = TollZone(zone_id=z["zone_id"], zone_name=z["zone_name"], charge_amount=z["charge_amount"])
+            GeoFencingService.store_zone_geometry(row, {
+                "type": "Polygon",
+                "coordinates": [[list(c) for c in z["polygon"].exterior.coords]]
+            })
+            zone_rows.append(row)
+        db.session.add_all(zone_rows)
+        ZoneSetVersion.bump()
+        db.session.commit()
+        db.session.remove()
+
+        t0 = time.perf_counter()
+        GeoFencingService.get_cached_zone_index()
+        warm_s = time.perf_counter() - t0
+
+        def check(ping):
+            GeoFencingService.check_zone_entry(ping[0], ping[1], ping[2])
+            db.session.remove()  # request teardown
+
+        latencies, total = time_each(check, pings)
+        result = summarize("db" if cache_zones else "db_sql", zone_count, latencies, total, {"index_load_s": round(warm_s, 3)})
+
+        db.session.remove()
+        db.drop_all()
+        reset_zone_index()
+        driver_state_store.reset()
+        trajectory_processor.reset()
+
+    return result
+
+
+# --------------------------------------------------
+# Reporting
+# --------------------------------------------------
+def environment():
+    try:
+        commit = subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        "timestamp": datetime.utcnow().isoformat() + "Z",
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "shapely": shapely.__version__,
+        "machine": platform.machine()
+    }
+
+
+def compare(results, baseline_path, tolerance):
+    """Print p99 deltas against a previous run; return the number of regressions"""
+    with open(baseline_path) as f:
+        baseline = {(r["mode"], r["zones"]): r for r in json.load(f)["results"]}
+
+    regressions = 0
+    print(f"\n{'mode':<6} {'zones':>7} {'p99 base':>10} {'p99 now':>10} {'delta':>8}")
+    for r in results:
+        base = baseline.get((r["mode"], r["zones"]))
+        if not base or not base["p99_us"]:
+            continue
+        delta = (r["p99_us"] - base["p99_us"]) / base["p99_us"]
+        flag = ""
+        if delta > tolerance:
+            regressions += 1
+            flag = "  ❌ REGRESSION"
+        print(f"{r['mode']:<6} {r['zones']:>7} {base['p99_us']:>10} {r['p99_us']:>10} {delta:>+8.1%}{flag}")
+    return regressions
+
+
+def run(sizes, drivers, pings, with_db, grid_cell_size, seed):
+    results = []
+    for size in sizes:
+        rng = random.Random(seed + size)
+        zones = generate_zones(size, rng)
+        driver_ids, ping_set = generate_pings(size, drivers, pings, rng)
+
+        results.extend(bench_in_memory(size, zones, ping_set, grid_cell_size))
+        modes = 3
+        if with_db:
+            results.append(bench_database(size, zones, driver_ids, ping_set, grid_cell_size))
+            results.append(bench_database(
+                size, zones, driver_ids, ping_set, grid_cell_size, cache_zones=False
+            ))
+            modes += 2
+
+        for r in results[-modes:]:
+            print(
+                f"{r['mode']:<6} zones={r['zones']:<7} p50={r['p50_us']:>9}us "
+                f"p99={r['p99_us']:>9}us  {r['throughput_per_s']:>12}/s"
+            )
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Geo-fencing benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--drivers", type=int, default=1000)
+    parser.add_argument("--pings", type=int, default=20000)
+    parser.add_argument("--no-db", action="store_true", help="Skip the SQLite-backed run")
+    parser.add_argument("--grid-cell", type=float, default=0.001)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="bench_geofencing.json")
+    parser.add_argument("--compare", help="Previous results JSON to compare p99 against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed p99 slowdown (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    results = run(args.sizes, args.drivers, args.pings, not args.no_db, args.grid_cell, args.seed)
+
+    with open(args.output, "w") as f:
+        json.dump({
+            "environment": environment(),
+            "parameters": {
+                "sizes": args.sizes,
+                "drivers": args.drivers,
+                "pings": args.pings,
+                "grid_cell": args.grid_cell,
+                "seed": args.seed
+            },
+            "results": results
+        }, f, indent=2)
+    print(f"\n✅ Results written to {args.output}")
+
+    if args.compare:
+        return 1 if compare(results, args.compare, args.tolerance) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
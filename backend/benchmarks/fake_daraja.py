@@ -0,0 +1,305 @@
+"""
+Fake Daraja Server
+File: backend/benchmarks/fake_daraja.py
+
+Local stand-in for the Safaricom Daraja API, for load tests only. Point the
+backend at it with MPESA_API_BASE_URL=http://<host>:<port>.
+
+Covers:
+- OAuth:        GET  /oauth/v1/generate
+- STK push:     POST /mpesa/stkpush/v1/processrequest  (+ async callback)
+- STK query:    POST /mpesa/stkpushquery/v1/query
+- C2B register: POST /mpesa/c2b/v2/registerurl
+- C2B simulate: POST /mpesa/c2b/v1/simulate             (+ async confirmation)
+- Counters:     GET  /__stats
+
+Every API call waits latency_ms +/- jitter_ms and fails with HTTP
+failure_status (500 by default, Daraja's usual outage answer) at
+failure_rate. STK callbacks arrive callback_delay_ms after the push and
+report a cancelled payment (ResultCode 1032) at decline_rate. At
+lost_callback_rate the callback is never sent; STK Query still reports the
+outcome once the callback would have arrived.
+
+Usage:
+    python -m benchmarks.fake_daraja --port 8090
+    python -m benchmarks.fake_daraja --latency-ms 300 --jitter-ms 100 --failure-rate 0.02
+    python -m benchmarks.fake_daraja --failure-rate 1 --failure-status 503
+"""
+
+import argparse
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import requests
+from flask import Flask, jsonify, request
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    """Skip werkzeug's per-request access log, which dominates under load"""
+
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+class FakeDaraja:
+    """Behaviour and counters shared by the fake's routes"""
+
+    def __init__(self, latency_ms=0, jitter_ms=0, failure_rate=0.0, failure_status=500, decline_rate=0.0,
+                 callback_delay_ms=500, lost_callback_rate=0.0, seed=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.failure_rate = failure_rate
+        self.failure_status = failure_status
+        self.decline_rate = decline_rate
+        self.callback_delay_ms = callback_delay_ms
+        self.lost_callback_rate = lost_callback_rate
+
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self._callbacks = ThreadPoolExecutor(max_workers=32, thread_name_prefix="fake-daraja-callback")
+        self._callback_session = requests.Session()
+        self.c2b_urls = {}
+        # CheckoutRequestID -> (settles_at, stkCallback body)
+        self.stk_results = {}
+
+        self.counts = {
+            "oauth": 0, "stk_push": 0, "stk_query": 0, "c2b_register": 0, "c2b_simulate": 0,
+            "failures": 0, "callbacks_sent": 0, "callbacks_failed": 0, "callbacks_lost": 0
+        }
+
+    def random(self):
+        with self._rng_lock:
+            return self._rng.random()
+
+    def delay(self):
+        """Sleep for the configured latency; return True if the call should fail"""
+        wait_ms = self.latency_ms
+        if self.jitter_ms:
+            wait_ms += (self.random() * 2 - 1) * self.jitter_ms
+        if wait_ms > 0:
+            time.sleep(wait_ms / 1000)
+
+        if self.failure_rate and self.random() < self.failure_rate:
+            self.counts["failures"] += 1
+            return True
+        return False
+
+    def send_later(self, url, payload):
+        self._callbacks.submit(self._send, url, payload)
+
+    def _send(self, url, payload):
+        time.sleep(self.callback_delay_ms / 1000)
+        try:
+            self._callback_session.post(url, json=payload, timeout=10)
+            self.counts["callbacks_sent"] += 1
+        except requests.exceptions.RequestException:
+            self.counts["callbacks_failed"] += 1
+
+    def shutdown(self):
+        self._callbacks.shutdown(wait=False, cancel_futures=True)
+
+
+def create_fake_daraja(**options):
+    """Build the fake as a Flask app; options are passed to FakeDaraja"""
+    app = Flask("fake_daraja")
+    fake = FakeDaraja(**options)
+    app.extensions["fake_daraja"] = fake
+
+    def failure():
+        status = fake.failure_status
+        return jsonify({"errorCode": f"{status}.003.02", "errorMessage": "Simulated outage"}), status
+
+    @app.route("/oauth/v1/generate", methods=["GET"])
+    def oauth():
+        fake.counts["oauth"] += 1
+        if fake.delay():
+            return failure()
+        return jsonify({"access_token": uuid.uuid4().hex, "expires_in": "3599"})
+
+    @app.route("/mpesa/stkpush/v1/processrequest", methods=["POST"])
+    def stk_push():
+        fake.counts["stk_push"] += 1
+        if fake.delay():
+            return failure()
+
+        body = request.get_json(force=True)
+        merchant_request_id = f"fake-{uuid.uuid4().hex[:12]}"
+        checkout_request_id = f"ws_CO_{uuid.uuid4().hex[:20]}"
+
+        if fake.decline_rate and fake.random() < fake.decline_rate:
+            callback = {"ResultCode": 1032, "ResultDesc": "Request cancelled by user"}
+        else:
+            callback = {
+                "ResultCode": 0,
+                "ResultDesc": "The service request is processed successfully.",
+                "CallbackMetadata": {"Item": [
+                    {"Name": "Amount", "Value": body.get("Amount")},
+                    {"Name": "MpesaReceiptNumber", "Value": uuid.uuid4().hex[:10].upper()},
+                    {"Name": "TransactionDate", "Value": int(datetime.now().strftime("%Y%m%d%H%M%S"))},
+                    {"Name": "PhoneNumber", "Value": body.get("PhoneNumber")}
+                ]}
+            }
+        callback.update({"MerchantRequestID": merchant_request_id, "CheckoutRequestID": checkout_request_id})
+        fake.stk_results[checkout_request_id] = (time.monotonic() + fake.callback_delay_ms / 1000, callback)
+
+        if fake.lost_callback_rate and fake.random() < fake.lost_callback_rate:
+            fake.counts["callbacks_lost"] += 1
+        else:
+            fake.send_later(body["CallBackURL"], {"Body": {"stkCallback": callback}})
+
+        return jsonify({
+            "MerchantRequestID": merchant_request_id,
+            "CheckoutRequestID": checkout_request_id,
+            "ResponseCode": "0",
+            "ResponseDescription": "Success. Request accepted for processing",
+            "CustomerMessage": "Success. Request accepted for processing"
+        })
+
+    @app.route("/mpesa/stkpushquery/v1/query", methods=["POST"])
+    def stk_query():
+        fake.counts["stk_query"] += 1
+        if fake.delay():
+            return failure()
+
+        body = request.get_json(force=True)
+        checkout_request_id = body.get("CheckoutRequestID")
+        settles_at, callback = fake.stk_results.get(checkout_request_id, (None, None))
+
+        if callback is None:
+            return jsonify({"errorCode": "400.002.02", "errorMessage": "Bad Request - Invalid CheckoutRequestID"}), 400
+        if time.monotonic() < settles_at:
+            return jsonify({"errorCode": "500.001.1001", "errorMessage": "The transaction is being processed"}), 500
+
+        return jsonify({
+            "ResponseCode": "0",
+            "ResponseDescription": "The service request has been accepted successsfully",
+            "MerchantRequestID": callback["MerchantRequestID"],
+            "CheckoutRequestID": checkout_request_id,
+            "ResultCode": str(callback["ResultCode"]),
+            "ResultDesc": callback["ResultDesc"]
+        })
+
+    @app.route("/mpesa/c2b/v2/registerurl", methods=["POST"])
+    def c2b_register():
+        fake.counts["c2b_register"] += 1
+        if fake.delay():
+            return failure()
+
+        body = request.get_json(force=True)
+        fake.c2b_urls[str(body.get("ShortCode"))] = body
+        return jsonify({
+            "OriginatorCoversationID": uuid.uuid4().hex,
+            "ResponseCode": "0",
+            "ResponseDescription": "Success"
+        })
+
+    @app.route("/mpesa/c2b/v1/simulate", methods=["POST"])
+    def c2b_simulate():
+        fake.counts["c2b_simulate"] += 1
+        if fake.delay():
+            return failure()
+
+        body = request.get_json(force=True)
+        registered = fake.c2b_urls.get(str(body.get("ShortCode")))
+        if registered:
+            fake.send_later(registered["ConfirmationURL"], {
+                "TransactionType": "Pay Bill",
+                "TransID": uuid.uuid4().hex[:10].upper(),
+                "TransTime": datetime.now().strftime("%Y%m%d%H%M%S"),
+                "TransAmount": str(body.get("Amount")),
+                "BusinessShortCode": str(body.get("ShortCode")),
+                "BillRefNumber": body.get("BillRefNumber"),
+                "MSISDN": str(body.get("Msisdn")),
+                "FirstName": "Load",
+                "LastName": "Test"
+            })
+
+        return jsonify({
+            "OriginatorCoversationID": uuid.uuid4().hex,
+            "ResponseCode": "0",
+            "ResponseDescription": "Accept the service request successfully."
+        })
+
+    @app.route("/__stats", methods=["GET"])
+    def stats():
+        return jsonify(fake.counts)
+
+    return app
+
+
+class FakeDarajaServer:
+    """
+    Run the fake on a background thread
+
+        with FakeDarajaServer(latency_ms=50) as daraja:
+            os.environ["MPESA_API_BASE_URL"] = daraja.url
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, **options):
+        self.app = create_fake_daraja(**options)
+        self._server = make_server(
+            host, port, self.app, threaded=True, request_handler=QuietRequestHandler
+        )
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return f"http://{self._server.host}:{self._server.server_port}"
+
+    @property
+    def fake(self):
+        return self.app.extensions["fake_daraja"]
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self.fake.shutdown()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local Daraja stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Share of API calls answered with an error")
+    parser.add_argument("--failure-status", type=int, default=500, help="HTTP status of those errors")
+    parser.add_argument("--decline-rate", type=float, default=0.0, help="Share of STK pushes the customer cancels")
+    parser.add_argument("--callback-delay-ms", type=float, default=500)
+    parser.add_argument("--lost-callback-rate", type=float, default=0.0, help="Share of STK callbacks never sent")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args(argv)
+
+    server = FakeDarajaServer(
+        args.host, args.port,
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+        failure_rate=args.failure_rate, failure_status=args.failure_status, decline_rate=args.decline_rate,
+        callback_delay_ms=args.callback_delay_ms, lost_callback_rate=args.lost_callback_rate,
+        seed=args.seed
+    )
+    print(f"Fake Daraja listening on {server.url}")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.fake.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,281 @@
+"""
+STK Push Load Harness
+File: backend/benchmarks/load_stk_push.py
+
+Drives POST /payments/stk-push with concurrent clients and reports
+throughput and latency percentiles:
+
+- push: time until /payments/stk-push answers (the web worker's share)
+- e2e:  time until /payments/status/<payment_id> reports paid or failed,
+        i.e. the STK call, the Daraja callback and its write (--wait)
+
+By default the harness runs everything in-process: the fake Daraja server
+(benchmarks/fake_daraja.py) and a backend app serving the payments
+blueprint on a temporary SQLite file. Use --target to load a running
+backend instead; that backend should have MPESA_API_BASE_URL pointing at
+a fake Daraja started with python -m benchmarks.fake_daraja.
+
+Usage:
+    python -m benchmarks.load_stk_push
+    python -m benchmarks.load_stk_push --requests 2000 --concurrency 50 --latency-ms 300 --wait
+    python -m benchmarks.load_stk_push --lost-callback-rate 0.2 --reconcile
+    python -m benchmarks.load_stk_push --target http://localhost:5000 --wait
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from werkzeug.serving import make_server
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.bench_geofencing import environment, percentile  # noqa: E402
+from benchmarks.fake_daraja import FakeDarajaServer, QuietRequestHandler  # noqa: E402
+
+
+FINAL_STATUSES = ("paid", "failed")
+
+
+# --------------------------------------------------
+# In-process backend
+# --------------------------------------------------
+@contextlib.contextmanager
+def mpesa_pointed_at(api_base_url, callback_base_url):
+    """Temporarily point MpesaConfig at the fake Daraja and our own callbacks"""
+    from services.config import MpesaConfig
+    from services.mpesa_service import MpesaService
+
+    overrides = {
+        "CONSUMER_KEY": "load-test",
+        "CONSUMER_SECRET": "load-test",
+        "BASE_URL": callback_base_url,
+        "API_BASE_URL": api_base_url,
+        "OAUTH_URL": f"{api_base_url}/oauth/v1/generate?grant_type=client_credentials",
+        "STK_PUSH_URL": f"{api_base_url}/mpesa/stkpush/v1/processrequest",
+        "STK_QUERY_URL": f"{api_base_url}/mpesa/stkpushquery/v1/query",
+        "C2B_REGISTER_URL": f"{api_base_url}/mpesa/c2b/v2/registerurl",
+        "C2B_SIMULATE_URL": f"{api_base_url}/mpesa/c2b/v1/simulate"
+    }
+    previous = {name: getattr(MpesaConfig, name) for name in overrides}
+
+    for name, value in overrides.items():
+        setattr(MpesaConfig, name, value)
+    MpesaService.reset_token_cache()
+    try:
+        yield
+    finally:
+        for name, value in previous.items():
+            setattr(MpesaConfig, name, value)
+        MpesaService.reset_token_cache()
+
+
+@contextlib.contextmanager
+def in_process_backend(daraja_options):
+    """Yield (backend_url, daraja_server, app) for a throwaway backend + fake Daraja"""
+    from flask import Flask
+    from config import TestingConfig
+    from db import db
+    from routes.mpesa_routes import mpesa_bp
+
+    with tempfile.TemporaryDirectory() as tmp, FakeDarajaServer(**daraja_options) as daraja:
+        app = Flask(__name__)
+        app.config.from_object(TestingConfig)
+        app.config["SQLALCHEMY_ECHO"] = False
+        app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{os.path.join(tmp, 'load.db')}"
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {"connect_args": {"timeout": 30}}
+        db.init_app(app)
+        app.register_blueprint(mpesa_bp)
+
+        with app.app_context():
+            db.create_all()
+
+        server = make_server("127.0.0.1", 0, app, threaded=True, request_handler=QuietRequestHandler)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        backend_url = f"http://127.0.0.1:{server.server_port}"
+
+        try:
+            with mpesa_pointed_at(daraja.url, f"{backend_url}/payments/"):
+                yield backend_url, daraja, app
+        finally:
+            server.shutdown()
+            with app.app_context():
+                db.session.remove()
+                db.engine.dispose()
+
+
+# --------------------------------------------------
+# Load
+# --------------------------------------------------
+def drive(target, total, concurrency, wait, poll_interval, wait_timeout):
+    """Send total STK pushes from concurrency clients; return (records, elapsed_s)"""
+    local = threading.local()
+
+    def session():
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        return local.session
+
+    def one(i):
+        record = {"http_status": None, "outcome": None}
+        started = time.perf_counter()
+        try:
+            response = session().post(f"{target}/payments/stk-push", json={
+                "phone": f"2547{i % 100000000:08d}",
+                "amount": 100
+            }, timeout=60)
+        except requests.exceptions.RequestException:
+            record["outcome"] = "error"
+            return record
+
+        record["push_ms"] = (time.perf_counter() - started) * 1000
+        record["http_status"] = response.status_code
+        if not wait or response.status_code != 202:
+            return record
+
+        status_url = f"{target}/payments/status/{response.json()['payment_id']}"
+        deadline = started + wait_timeout
+        while time.perf_counter() < deadline:
+            time.sleep(poll_interval)
+            status = session().get(status_url, timeout=30).json().get("status")
+            if status in FINAL_STATUSES:
+                record["outcome"] = status
+                record["e2e_ms"] = (time.perf_counter() - started) * 1000
+                return record
+
+        record["outcome"] = "timeout"
+        return record
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        records = list(pool.map(one, range(total)))
+    return records, time.perf_counter() - started
+
+
+def reconcile(app, callback_delay_ms):
+    """Settle payments whose callback was lost; return the reconciler's run stats"""
+    from db import db
+    from services.payment_reconciler import PaymentReconciler
+    from services.stk_dispatcher import stk_dispatcher
+
+    stk_dispatcher.join()
+    time.sleep(callback_delay_ms / 1000 + 0.5)
+
+    with app.app_context():
+        stats = PaymentReconciler(older_than_seconds=0, queries_per_second=0).run_once()
+        db.session.remove()
+
+    print(f"reconcile: {stats}")
+    return stats
+
+
+def summarize(records, elapsed, concurrency):
+    push = sorted(r["push_ms"] for r in records if "push_ms" in r)
+    e2e = sorted(r["e2e_ms"] for r in records if "e2e_ms" in r)
+    accepted = sum(1 for r in records if r["http_status"] == 202)
+
+    def latency(values):
+        return {
+            "p50_ms": round(percentile(values, 50), 2),
+            "p90_ms": round(percentile(values, 90), 2),
+            "p99_ms": round(percentile(values, 99), 2),
+            "max_ms": round(values[-1], 2) if values else 0
+        }
+
+    return {
+        "requests": len(records),
+        "concurrency": concurrency,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_per_s": round(accepted / elapsed, 1) if elapsed else None,
+        "http_status": {str(k): v for k, v in Counter(r["http_status"] for r in records).items()},
+        "outcomes": dict(Counter(r["outcome"] for r in records if r["outcome"])),
+        "push": latency(push),
+        "e2e": latency(e2e) if e2e else None
+    }
+
+
+def print_summary(summary):
+    print(f"requests={summary['requests']} concurrency={summary['concurrency']} "
+          f"elapsed={summary['elapsed_s']}s throughput={summary['throughput_per_s']}/s")
+    print(f"http status: {summary['http_status']}  outcomes: {summary['outcomes']}")
+    for name in ("push", "e2e"):
+        stats = summary[name]
+        if stats:
+            print(f"{name:<5} p50={stats['p50_ms']:>9}ms p90={stats['p90_ms']:>9}ms "
+                  f"p99={stats['p99_ms']:>9}ms max={stats['max_ms']:>9}ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="STK push load harness")
+    parser.add_argument("--target", help="Base URL of a running backend (default: in-process)")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--wait", action="store_true", help="Poll each payment until paid/failed")
+    parser.add_argument("--poll-interval", type=float, default=0.1)
+    parser.add_argument("--wait-timeout", type=float, default=60)
+    parser.add_argument("--latency-ms", type=float, default=100, help="Fake Daraja latency (in-process only)")
+    parser.add_argument("--jitter-ms", type=float, default=20)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--failure-status", type=int, default=500)
+    parser.add_argument("--decline-rate", type=float, default=0.0)
+    parser.add_argument("--callback-delay-ms", type=float, default=500)
+    parser.add_argument("--lost-callback-rate", type=float, default=0.0)
+    parser.add_argument("--reconcile", action="store_true",
+                        help="Run the payment reconciler after the load (in-process only)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="bench_stk_push.json")
+    args = parser.parse_args(argv)
+
+    load = (args.requests, args.concurrency, args.wait, args.poll_interval, args.wait_timeout)
+    extra = {}
+
+    if args.target:
+        records, elapsed = drive(args.target.rstrip("/"), *load)
+        stats_url = f"{args.target.rstrip('/')}/payments/stats"
+    else:
+        daraja_options = {
+            "latency_ms": args.latency_ms, "jitter_ms": args.jitter_ms,
+            "failure_rate": args.failure_rate, "failure_status": args.failure_status,
+            "decline_rate": args.decline_rate,
+            "callback_delay_ms": args.callback_delay_ms,
+            "lost_callback_rate": args.lost_callback_rate, "seed": args.seed
+        }
+        with in_process_backend(daraja_options) as (backend_url, daraja, app):
+            records, elapsed = drive(backend_url, *load)
+            if args.reconcile:
+                extra["reconcile"] = reconcile(app, args.callback_delay_ms)
+            extra["daraja"] = dict(daraja.fake.counts)
+            extra["backend"] = requests.get(f"{backend_url}/payments/stats", timeout=10).json()
+        stats_url = None
+
+    if stats_url:
+        try:
+            extra["backend"] = requests.get(stats_url, timeout=10).json()
+        except (requests.exceptions.RequestException, ValueError):
+            pass
+
+    summary = summarize(records, elapsed, args.concurrency)
+    print_summary(summary)
+
+    with open(args.output, "w") as f:
+        json.dump({
+            "environment": environment(),
+            "parameters": vars(args),
+            "summary": summary,
+            **extra
+        }, f, indent=2)
+    print(f"\nResults written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
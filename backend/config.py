@@ -47,6 +47,45 @@ class Config:
     MPESA_PASSKEY = os.getenv("MPESA_PASSKEY")
     MPESA_CALLBACK_URL = os.getenv("MPESA_CALLBACK_URL")
 
+    # --------------------
+    # GEO-FENCING
+    # --------------------
+    # How often (seconds) each worker checks whether toll zones changed
+    ZONE_VERSION_POLL_SECONDS = float(os.getenv("ZONE_VERSION_POLL_SECONDS", "1"))
+    # Rebuild a changed zone index (and grid) off the request path, serving the old one meanwhile
+    ZONE_INDEX_BACKGROUND_REBUILD = os.getenv("ZONE_INDEX_BACKGROUND_REBUILD", "true").lower() == "true"
+    # Upper bound on fixes accepted by /check-location/batch
+    LOCATION_BATCH_MAX_FIXES = int(os.getenv("LOCATION_BATCH_MAX_FIXES", "5000"))
+    # Max age (seconds) of a cached driver geofence state before re-reading it
+    DRIVER_STATE_TTL_SECONDS = float(os.getenv("DRIVER_STATE_TTL_SECONDS", "300"))
+    # Fixes further apart than this are not joined into a trajectory segment
+    TRAJECTORY_MAX_GAP_SECONDS = float(os.getenv("TRAJECTORY_MAX_GAP_SECONDS", "600"))
+    # How far (seconds) a batch fix may be stamped ahead of the server clock
+    FIX_MAX_CLOCK_SKEW_SECONDS = float(os.getenv("FIX_MAX_CLOCK_SKEW_SECONDS", "60"))
+    # Coverage grid cell size in degrees (0.001 ~ 110 m); 0 disables the grid
+    ZONE_GRID_CELL_DEGREES = float(os.getenv("ZONE_GRID_CELL_DEGREES", "0.001"))
+    ZONE_GRID_MAX_CELLS = int(os.getenv("ZONE_GRID_MAX_CELLS", "2000000"))
+    # Above this many zones each ping loads only bbox-matching zones from SQL
+    ZONE_CACHE_MAX_ZONES = int(os.getenv("ZONE_CACHE_MAX_ZONES", "50000"))
+
+    # --------------------
+    # AUTOMATIC CHARGES
+    # --------------------
+    # Queue a charge for every new TollEntry and push it without a client call
+    # (opt-in: clients must then pay by payment_id rather than by amount)
+    AUTO_CHARGE_ENABLED = os.getenv("AUTO_CHARGE_ENABLED", "false").lower() == "true"
+    # How often (seconds) each worker dispatches due charges; 0 disables the sweeper
+    AUTO_CHARGE_SWEEP_SECONDS = float(os.getenv("AUTO_CHARGE_SWEEP_SECONDS", "2"))
+
+    # --------------------
+    # REPORTING
+    # --------------------
+    # Zone rollup refresh re-reads this many seconds before its watermark
+    ROLLUP_LAG_SECONDS = float(os.getenv("ROLLUP_LAG_SECONDS", "30"))
+    ROLLUP_INTERVAL_SECONDS = float(os.getenv("ROLLUP_INTERVAL_SECONDS", "60"))
+    # Upper bound on buckets returned by /reports/zones
+    REPORT_MAX_BUCKETS = int(os.getenv("REPORT_MAX_BUCKETS", "10000"))
+
     # --------------------
     # SECURITY
     # --------------------
@@ -75,6 +114,9 @@ class TestingConfig(Config):
     """Testing configuration"""
     TESTING = True
     SQLALCHEMY_DATABASE_URI = "sqlite:///:memory:"
+    ZONE_VERSION_POLL_SECONDS = 0
+    ZONE_INDEX_BACKGROUND_REBUILD = False
+    AUTO_CHARGE_SWEEP_SECONDS = 0
 
 
 class ProductionConfig(Config):
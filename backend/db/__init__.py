@@ -1,4 +1,6 @@
-from db.database import db, migrate, init_db
-from db.models import User, TollEntry, TollZone, TollPaid
+from db.database import db, migrate, init_db, has_writes
+from db.models import User, TollEntry, TollZone, TollPaid, TollPaidDuplicate, C2BPayment, ZoneSetVersion, ZoneChange, \
+    ZoneHourlyRollup, ZoneDailyRollup, RollupWatermark
 
-__all__ = ['db', 'migrate', 'init_db', 'User', 'TollEntry', 'TollZone', 'TollPaid']
\ No newline at end of file
+__all__ = ['db', 'migrate', 'init_db', 'has_writes', 'User', 'TollEntry', 'TollZone', 'TollPaid', 'TollPaidDuplicate', 'C2BPayment', 'ZoneSetVersion', 'ZoneChange',
+           'ZoneHourlyRollup', 'ZoneDailyRollup', 'RollupWatermark']
\ No newline at end of file
@@ -1,10 +1,39 @@
 # backend/db/database.py
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
+from sqlalchemy import event
 
 db = SQLAlchemy()
 migrate = Migrate()
 
+
+# session.new/dirty/deleted are empty again once a flush (or a bulk
+# query.update()) has sent the changes, so they cannot tell on their own
+# whether the transaction holds anything worth committing. These listeners
+# note any write in session.info until the transaction ends.
+@event.listens_for(db.session, "after_flush")
+def _note_flush(session, flush_context):
+    session.info["wrote"] = True
+
+
+@event.listens_for(db.session, "do_orm_execute")
+def _note_bulk_write(orm_execute_state):
+    if orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert:
+        orm_execute_state.session.info["wrote"] = True
+
+
+@event.listens_for(db.session, "after_commit")
+@event.listens_for(db.session, "after_rollback")
+def _clear_writes(session):
+    session.info.pop("wrote", None)
+
+
+def has_writes(session=None):
+    """True when the session's transaction has anything to commit"""
+    session = session if session is not None else db.session
+    return bool(session.new or session.dirty or session.deleted or session.info.get("wrote"))
+
+
 def init_db(app):
     """Initialize the database with the Flask app."""
     db.init_app(app)
@@ -13,6 +13,7 @@ class User(db.Model):
     user_id = db.Column(db.UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     username = db.Column(db.String(255), unique=True, nullable=False)
     password_hash = db.Column(db.String(255), nullable=False)
+    phone_number = db.Column(db.String(20), nullable=True)  # M-Pesa number for automatic charges
     
     def __repr__(self):
         return f'<User {self.username}>'
@@ -29,10 +30,31 @@ class TollEntry(db.Model):
     zone_id = db.Column(db.UUID(as_uuid=True), db.ForeignKey('toll_zones.zone_id'), nullable=False)  # ADD THIS LINE
     entry_time = db.Column(db.DateTime, nullable=False)
     exit_time = db.Column(db.DateTime, nullable=True)
+    payment_id = db.Column(db.UUID(as_uuid=True), db.ForeignKey('tolls_paid.id'), nullable=True)  # Charge covering this entry
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     user = db.relationship('User', backref='toll_entries')
     zone = db.relationship('TollZone', backref='toll_entries')  # ADD THIS LINE
+    payment = db.relationship('TollPaid', backref='entries')
+
+    __table_args__ = (
+        # Open entries per driver/zone (geo hot path: exits and re-checks)
+        db.Index(
+            'ix_toll_entries_open',
+            user_id, zone_id, entry_time.desc(),
+            postgresql_where=exit_time.is_(None),
+            sqlite_where=exit_time.is_(None)
+        ),
+        # Latest exit per driver/zone (grace-period lookups)
+        db.Index('ix_toll_entries_user_zone_exit', user_id, zone_id, exit_time.desc()),
+        # Per-driver trip history, newest first (/my-trips keyset pages)
+        db.Index('ix_toll_entries_user_entry_time', user_id, entry_time.desc(), entry_id.desc()),
+        # Rollup refresh: new rows since the watermark, then one zone-hour
+        db.Index('ix_toll_entries_created_at', created_at),
+        db.Index('ix_toll_entries_zone_entry_time', zone_id, entry_time),
+        # Entry covered by a charge (ChargePipeline)
+        db.Index('ix_toll_entries_payment_id', payment_id),
+    )
     
     def __repr__(self):
         return f'<TollEntry {self.entry_id}>'
@@ -47,7 +69,25 @@ class TollZone(db.Model):
     zone_id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     zone_name = db.Column(db.String, nullable=False)
     charge_amount = db.Column(db.Integer, nullable=False)
-    polygon_coords = db.Column(JSONB, nullable=False)
+    polygon_coords = db.Column(JSONB().with_variant(db.JSON, "sqlite"), nullable=False)
+
+    # Canonical geometry, written once at create/update time
+    geometry_wkb = db.Column(db.LargeBinary, nullable=True)
+    min_lat = db.Column(db.Float, nullable=True)
+    max_lat = db.Column(db.Float, nullable=True)
+    min_lng = db.Column(db.Float, nullable=True)
+    max_lng = db.Column(db.Float, nullable=True)
+
+    __table_args__ = (
+        # Bounding-box prefilter for GeoFencingService.load_zone_snapshots
+        db.Index('ix_toll_zones_bbox_lat', min_lat, max_lat),
+        db.Index('ix_toll_zones_bbox_lng', min_lng, max_lng),
+        db.Index(
+            'ix_toll_zones_bbox_gist',
+            db.func.box(db.func.point(min_lng, min_lat), db.func.point(max_lng, max_lat)),
+            postgresql_using='gist'
+        ).ddl_if(dialect='postgresql'),
+    )
     
     def to_dict(self):
         return {
@@ -72,4 +112,188 @@ class TollPaid(db.Model):
     mpesa_receipt_number = db.Column(db.String, nullable=True)  # Add this new field
     phone_number = db.Column(db.String, nullable=True)  # Optional: store phone
     status = db.Column(db.String, nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
\ No newline at end of file
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)  # Keyset for /tolls-history
+    # Bumped by every UPDATE (ORM, bulk and Core); upserts set it explicitly
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        # One row per STK request; callbacks upsert on it
+        db.Index('ix_tolls_paid_checkout_request_id', checkout_request_id, unique=True),
+        # Keyset scan of stuck payments (PaymentReconciler)
+        db.Index(
+            'ix_tolls_paid_pending',
+            created_at, id,
+            postgresql_where=status == 'PENDING',
+            sqlite_where=status == 'PENDING'
+        ),
+        # Keyset pagination of /tolls-history, unfiltered and by status
+        db.Index('ix_tolls_paid_created_at_id', created_at, id),
+        db.Index('ix_tolls_paid_status_created_at_id', status, created_at, id),
+        # Changed rows since the last rollup refresh (ZoneRollups)
+        db.Index('ix_tolls_paid_updated_at', updated_at),
+        # Charges waiting to be dispatched, oldest first (ChargePipeline)
+        db.Index(
+            'ix_tolls_paid_queued',
+            created_at,
+            postgresql_where=status == 'QUEUED',
+            sqlite_where=status == 'QUEUED'
+        ),
+    )
+
+
+class TollPaidDuplicate(db.Model):
+    """
+    A tolls_paid row that lost to another row for the same payment: a
+    duplicate removed before the checkout_request_id index, or a callback
+    row folded into the payment it belonged to. Kept for audit only.
+    """
+    __tablename__ = "tolls_paid_duplicates"
+
+    id = db.Column(UUID(as_uuid=True), primary_key=True)  # id it had in tolls_paid
+    zone_id = db.Column(UUID(as_uuid=True), nullable=True)
+    amount = db.Column(db.Integer, nullable=False)
+    checkout_request_id = db.Column(db.String, nullable=True)
+    mpesa_receipt_number = db.Column(db.String, nullable=True)
+    phone_number = db.Column(db.String, nullable=True)
+    status = db.Column(db.String, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=True)
+    duplicate_of = db.Column(UUID(as_uuid=True), nullable=True)  # tolls_paid row it was folded into
+    archived_at = db.Column(db.DateTime, nullable=True)
+
+
+# -----------------------------
+# C2B Payments Table
+# -----------------------------
+class C2BPayment(db.Model):
+    """Paybill confirmation received from Daraja (one row per TransID)"""
+    __tablename__ = "c2b_payments"
+
+    id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    trans_id = db.Column(db.String(32), nullable=False)  # M-Pesa receipt number
+    bill_ref_number = db.Column(db.String(64), nullable=True)  # Account number the customer typed
+    amount = db.Column(db.Integer, nullable=False)
+    msisdn = db.Column(db.String(20), nullable=True)
+    business_short_code = db.Column(db.String(20), nullable=True)
+    transaction_type = db.Column(db.String(32), nullable=True)
+    trans_time = db.Column(db.DateTime, nullable=True)
+    payment_id = db.Column(UUID(as_uuid=True), db.ForeignKey('tolls_paid.id'), nullable=True)  # Charge it settled
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    payment = db.relationship('TollPaid', backref='c2b_payments')
+
+    __table_args__ = (
+        # Daraja retries confirmations; the first copy wins
+        db.Index('ix_c2b_payments_trans_id', trans_id, unique=True),
+        # Matching paybill payments to charges by account number
+        db.Index('ix_c2b_payments_bill_ref_number', bill_ref_number),
+    )
+
+
+# -----------------------------
+# Zone Rollup Tables
+# -----------------------------
+class ZoneHourlyRollup(db.Model):
+    """Per-zone traffic and revenue for one hour (maintained by ZoneRollups)"""
+    __tablename__ = "zone_hourly_rollups"
+
+    zone_id = db.Column(UUID(as_uuid=True), primary_key=True)
+    bucket_start = db.Column(db.DateTime, primary_key=True)  # Start of the hour (UTC)
+    entries = db.Column(db.Integer, nullable=False, default=0)
+    payments_completed = db.Column(db.Integer, nullable=False, default=0)
+    payments_failed = db.Column(db.Integer, nullable=False, default=0)
+    amount_completed = db.Column(db.BigInteger, nullable=False, default=0)
+    amount_failed = db.Column(db.BigInteger, nullable=False, default=0)
+
+    __table_args__ = (
+        # Dashboards read a time range across all zones
+        db.Index('ix_zone_hourly_rollups_bucket_start', bucket_start),
+    )
+
+
+class ZoneDailyRollup(db.Model):
+    """Per-zone traffic and revenue for one day, summed from the hourly rollups"""
+    __tablename__ = "zone_daily_rollups"
+
+    zone_id = db.Column(UUID(as_uuid=True), primary_key=True)
+    bucket_start = db.Column(db.DateTime, primary_key=True)  # Midnight (UTC)
+    entries = db.Column(db.Integer, nullable=False, default=0)
+    payments_completed = db.Column(db.Integer, nullable=False, default=0)
+    payments_failed = db.Column(db.Integer, nullable=False, default=0)
+    amount_completed = db.Column(db.BigInteger, nullable=False, default=0)
+    amount_failed = db.Column(db.BigInteger, nullable=False, default=0)
+
+    __table_args__ = (
+        db.Index('ix_zone_daily_rollups_bucket_start', bucket_start),
+    )
+
+
+class RollupWatermark(db.Model):
+    """How far each rollup job has read its source tables"""
+    __tablename__ = "rollup_watermarks"
+
+    name = db.Column(db.String(64), primary_key=True)
+    value = db.Column(db.DateTime, nullable=False)
+
+
+# -----------------------------
+# Zone Set Version Table
+# -----------------------------
+class ZoneSetVersion(db.Model):
+    """Single-row counter bumped whenever any toll zone changes"""
+    __tablename__ = "zone_set_version"
+
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    @staticmethod
+    def current():
+        version = db.session.query(ZoneSetVersion.version).filter_by(id=1).scalar()
+        return version or 0
+
+    @staticmethod
+    def bump():
+        """
+        Increment the version inside the caller's transaction and return it.
+        The row stays locked until commit, so versions commit in order.
+        """
+        now = datetime.utcnow()
+        updated = ZoneSetVersion.query.filter_by(id=1).update({
+            ZoneSetVersion.version: ZoneSetVersion.version + 1,
+            ZoneSetVersion.updated_at: now
+        })
+        if not updated:
+            db.session.add(ZoneSetVersion(id=1, version=1, updated_at=now))
+        return ZoneSetVersion.current()
+
+
+# -----------------------------
+# Zone Change Log Table
+# -----------------------------
+class ZoneChange(db.Model):
+    """
+    One row per zone per zone-set version that touched it; seq is the
+    ZoneSetVersion the change was committed under
+    """
+    __tablename__ = "zone_changes"
+
+    seq = db.Column(db.BigInteger, primary_key=True)
+    zone_id = db.Column(UUID(as_uuid=True), primary_key=True)
+    op = db.Column(db.String(10), nullable=False)  # 'upsert' or 'delete'
+    changed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    @staticmethod
+    def record(zone_ids, op="upsert"):
+        """
+        Bump the zone-set version and log the zones it covers, inside the
+        caller's transaction
+
+        Returns:
+            int: The new version (the changes' seq)
+        """
+        seq = ZoneSetVersion.bump()
+        now = datetime.utcnow()
+        db.session.add_all(
+            ZoneChange(seq=seq, zone_id=zone_id, op=op, changed_at=now) for zone_id in zone_ids
+        )
+        return seq
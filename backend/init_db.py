@@ -8,10 +8,13 @@ Usage:
     python init_db.py init      # Just create tables
     python init_db.py seed      # Just seed data
     python init_db.py reset     # Drop, recreate, and seed
+    python init_db.py grid      # Rebuild the zone coverage grid and report hit rate
+    python init_db.py backfill-geometry  # Store canonical WKB/bbox for existing zones
+    python init_db.py reconcile-payments [--loop]  # Settle PENDING payments via STK Query
 """
 
 from app import create_app
-from models.models import db, User, TollZone, TollPaid, TollEntry
+from db import db, User, TollZone, TollPaid, TollEntry
 from werkzeug.security import generate_password_hash
 
 
@@ -156,6 +159,126 @@ def seed_sample_data():
         print("\n✅ Database seeding complete!")
 
 
+def rebuild_zone_grid(samples=10000):
+    """Make every worker rebuild its zone grid and measure the grid hit rate"""
+    import random
+    from db.models import ZoneSetVersion
+    from services.geo_service import GeoFencingService
+    from services.zone_index import reset_zone_index
+
+    app = create_app()
+
+    with app.app_context():
+        print("\n" + "=" * 60)
+        print("🗺️  REBUILDING ZONE GRID")
+        print("=" * 60)
+
+        # Workers pick up the new version on their next ping
+        ZoneSetVersion.bump()
+        db.session.commit()
+
+        reset_zone_index()
+        index = GeoFencingService.get_cached_zone_index()
+        if index is None or index.grid is None or not len(index):
+            print("❌ Grid disabled (no zones, zones not cached, ZONE_GRID_CELL_DEGREES=0 or too many cells)")
+            return
+
+        # Sample points around the zones, where pings actually land
+        margin = index.grid.cell_size * 10
+        for _ in range(samples):
+            zone = random.choice(index.zones)
+            min_lng, min_lat, max_lng, max_lat = zone.polygon.bounds
+            GeoFencingService.find_zone(
+                random.uniform(min_lat - margin, max_lat + margin),
+                random.uniform(min_lng - margin, max_lng + margin)
+            )
+
+        for key, value in index.grid.stats().items():
+            print(f"   {key}: {value}")
+        print("\n✅ Zone grid rebuilt!")
+
+
+def backfill_zone_geometry(batch_size=500):
+    """Normalize zones saved before canonical geometry columns existed"""
+    from db.models import ZoneChange
+    from services.geo_service import GeoFencingService
+
+    app = create_app()
+
+    with app.app_context():
+        print("\n" + "=" * 60)
+        print("📐 BACKFILLING ZONE GEOMETRY")
+        print("=" * 60)
+
+        converted = 0
+        failed = []
+        while True:
+            zones = TollZone.query.filter(
+                TollZone.geometry_wkb.is_(None),
+                ~TollZone.zone_id.in_([zone_id for zone_id, _ in failed])
+            ).limit(batch_size).all()
+            if not zones:
+                break
+
+            changed = []
+            for zone in zones:
+                try:
+                    GeoFencingService.store_zone_geometry(zone, zone.polygon_coords)
+                    changed.append(zone.zone_id)
+                except ValueError as e:
+                    failed.append((zone.zone_id, str(e)))
+
+            converted += len(changed)
+            if changed:
+                ZoneChange.record(changed)
+                db.session.commit()
+
+        print(f"\n✅ Converted {converted} zone(s)")
+        for zone_id, error in failed:
+            print(f"❌ {zone_id}: {error}")
+
+
+def reconcile_payments(loop=False):
+    """Settle PENDING payments whose STK callback never arrived"""
+    from services.payment_reconciler import PaymentReconciler
+
+    app = create_app()
+    reconciler = PaymentReconciler()
+
+    if loop:
+        reconciler.run_forever(app)
+        return
+
+    with app.app_context():
+        print("\n" + "=" * 60)
+        print("🔁 RECONCILING PENDING PAYMENTS")
+        print("=" * 60)
+
+        for key, value in reconciler.run_once().items():
+            print(f"   {key}: {value}")
+        print("\n✅ Reconciliation complete!")
+
+
+def refresh_rollups(loop=False):
+    """Bring the per-zone hourly/daily rollups up to date"""
+    from services.zone_rollups import zone_rollups
+
+    app = create_app()
+
+    if loop:
+        zone_rollups.run_forever(app)
+        return
+
+    with app.app_context():
+        print("\n" + "=" * 60)
+        print("📊 REFRESHING ZONE ROLLUPS")
+        print("=" * 60)
+
+        for key, value in zone_rollups.refresh().items():
+            print(f"   {key}: {value}")
+        print("\n✅ Rollups up to date!")
+
+
 def drop_all_tables():
     """Drop all tables (use with caution!)"""
     app = create_app()
@@ -183,8 +306,16 @@ if __name__ == '__main__':
             seed_sample_data()
         elif cmd == 'drop':
             drop_all_tables()
+        elif cmd == 'grid':
+            rebuild_zone_grid()
+        elif cmd == 'backfill-geometry':
+            backfill_zone_geometry()
+        elif cmd == 'reconcile-payments':
+            reconcile_payments(loop='--loop' in sys.argv[2:])
+        elif cmd == 'refresh-rollups':
+            refresh_rollups(loop='--loop' in sys.argv[2:])
         else:
-            print("Usage: python init_db.py [init|seed|reset|drop]")
+            print("Usage: python init_db.py [init|seed|reset|drop|grid|backfill-geometry|reconcile-payments|refresh-rollups]")
     else:
         # default
         init_database()
@@ -0,0 +1,49 @@
+"""add automatic charge links
+
+Revision ID: 1c6e9a3f5d27
+Revises: f3b7d2e91a06
+Create Date: 2026-10-17 16:58:31.604219
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1c6e9a3f5d27'
+down_revision = 'f3b7d2e91a06'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('phone_number', sa.String(length=20), nullable=True))
+
+    # Restores the entry -> charge link dropped in c39844654dd2
+    with op.batch_alter_table('toll_entries', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('payment_id', sa.UUID(), nullable=True))
+        batch_op.create_foreign_key('toll_entries_payment_id_fkey', 'tolls_paid', ['payment_id'], ['id'])
+        batch_op.create_index('ix_toll_entries_payment_id', ['payment_id'], unique=False)
+
+    with op.batch_alter_table('tolls_paid', schema=None) as batch_op:
+        batch_op.create_index(
+            'ix_tolls_paid_queued',
+            ['created_at'],
+            unique=False,
+            postgresql_where=sa.text("status = 'QUEUED'"),
+            sqlite_where=sa.text("status = 'QUEUED'")
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('tolls_paid', schema=None) as batch_op:
+        batch_op.drop_index('ix_tolls_paid_queued')
+
+    with op.batch_alter_table('toll_entries', schema=None) as batch_op:
+        batch_op.drop_index('ix_toll_entries_payment_id')
+        batch_op.drop_constraint('toll_entries_payment_id_fkey', type_='foreignkey')
+        batch_op.drop_column('payment_id')
+
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('phone_number')
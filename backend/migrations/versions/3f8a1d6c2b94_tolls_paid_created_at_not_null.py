@@ -0,0 +1,32 @@
+"""make tolls_paid.created_at not null
+
+Revision ID: 3f8a1d6c2b94
+Revises: e6c3b9a5f812
+Create Date: 2026-10-18 09:12:36.418205
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f8a1d6c2b94'
+down_revision = 'e6c3b9a5f812'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # /tolls-history pages on (created_at, id); rows without a created_at
+    # would never be reached by the keyset and cannot be put in a cursor
+    op.execute(
+        "UPDATE tolls_paid SET created_at = COALESCE(updated_at, CURRENT_TIMESTAMP) "
+        "WHERE created_at IS NULL"
+    )
+    with op.batch_alter_table('tolls_paid', schema=None) as batch_op:
+        batch_op.alter_column('created_at', existing_type=sa.DateTime(), nullable=False)
+
+
+def downgrade():
+    with op.batch_alter_table('tolls_paid', schema=None) as batch_op:
+        batch_op.alter_column('created_at', existing_type=sa.DateTime(), nullable=True)
@@ -0,0 +1,52 @@
+"""add tolls_paid_duplicates links
+
+Revision ID: 6b2e9d4f1a38
+Revises: 3f8a1d6c2b94
+Create Date: 2026-10-18 11:04:52.730914
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6b2e9d4f1a38'
+down_revision = '3f8a1d6c2b94'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # e25a8f4c7b19 only created the archive when it had duplicates to move
+    if sa.inspect(op.get_bind()).has_table('tolls_paid_duplicates'):
+        with op.batch_alter_table('tolls_paid_duplicates', schema=None) as batch_op:
+            batch_op.add_column(sa.Column('duplicate_of', sa.UUID(), nullable=True))
+            batch_op.add_column(sa.Column('archived_at', sa.DateTime(), nullable=True))
+        return
+
+    op.create_table('tolls_paid_duplicates',
+        sa.Column('id', sa.UUID(), nullable=False),
+        sa.Column('zone_id', sa.UUID(), nullable=True),
+        sa.Column('amount', sa.Integer(), nullable=False),
+        sa.Column('checkout_request_id', sa.String(), nullable=True),
+        sa.Column('mpesa_receipt_number', sa.String(), nullable=True),
+        sa.Column('phone_number', sa.String(), nullable=True),
+        sa.Column('status', sa.String(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('duplicate_of', sa.UUID(), nullable=True),
+        sa.Column('archived_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    # Folded-in callback rows have no place in the older schema; the
+    # payment they were folded into kept their status and receipt
+    op.execute("DELETE FROM tolls_paid_duplicates WHERE duplicate_of IS NOT NULL")
+    with op.batch_alter_table('tolls_paid_duplicates', schema=None) as batch_op:
+        batch_op.drop_column('archived_at')
+        batch_op.drop_column('duplicate_of')
+
+    remaining = op.get_bind().execute(sa.text("SELECT COUNT(*) FROM tolls_paid_duplicates")).scalar()
+    if not remaining:
+        op.drop_table('tolls_paid_duplicates')
@@ -0,0 +1,44 @@
+"""add c2b_payments table
+
+Revision ID: 7a2d4e8b1f60
+Revises: 1c6e9a3f5d27
+Create Date: 2026-10-17 17:42:09.381552
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7a2d4e8b1f60'
+down_revision = '1c6e9a3f5d27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('c2b_payments',
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('trans_id', sa.String(length=32), nullable=False),
+    sa.Column('bill_ref_number', sa.String(length=64), nullable=True),
+    sa.Column('amount', sa.Integer(), nullable=False),
+    sa.Column('msisdn', sa.String(length=20), nullable=True),
+    sa.Column('business_short_code', sa.String(length=20), nullable=True),
+    sa.Column('transaction_type', sa.String(length=32), nullable=True),
+    sa.Column('trans_time', sa.DateTime(), nullable=True),
+    sa.Column('payment_id', sa.UUID(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['payment_id'], ['tolls_paid.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('c2b_payments', schema=None) as batch_op:
+        batch_op.create_index('ix_c2b_payments_trans_id', ['trans_id'], unique=True)
+        batch_op.create_index('ix_c2b_payments_bill_ref_number', ['bill_ref_number'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('c2b_payments', schema=None) as batch_op:
+        batch_op.drop_index('ix_c2b_payments_bill_ref_number')
+        batch_op.drop_index('ix_c2b_payments_trans_id')
+
+    op.drop_table('c2b_payments')
@@ -0,0 +1,48 @@
+"""add toll_entries hot path indexes
+
+Revision ID: 8d3f6a1c0b52
+Revises: 5b1e7c2a9d40
+Create Date: 2026-10-17 10:03:17.554920
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d3f6a1c0b52'
+down_revision = '5b1e7c2a9d40'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # c39844654dd2 dropped toll_entries.zone_id although the model still maps it
+    columns = [c['name'] for c in sa.inspect(op.get_bind()).get_columns('toll_entries')]
+    if 'zone_id' not in columns:
+        with op.batch_alter_table('toll_entries', schema=None) as batch_op:
+            batch_op.add_column(sa.Column('zone_id', sa.UUID(), nullable=True))
+            batch_op.create_foreign_key(
+                'toll_entries_zone_id_fkey', 'toll_zones', ['zone_id'], ['zone_id']
+            )
+
+    # Replaces idx_driver_zone_active / ix_toll_entries_* dropped in c39844654dd2
+    with op.batch_alter_table('toll_entries', schema=None) as batch_op:
+        batch_op.create_index(
+            'ix_toll_entries_open',
+            ['user_id', 'zone_id', sa.text('entry_time DESC')],
+            unique=False,
+            postgresql_where=sa.text('exit_time IS NULL'),
+            sqlite_where=sa.text('exit_time IS NULL')
+        )
+        batch_op.create_index(
+            'ix_toll_entries_user_zone_exit',
+            ['user_id', 'zone_id', sa.text('exit_time DESC')],
+            unique=False
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('toll_entries', schema=None) as batch_op:
+        batch_op.drop_index('ix_toll_entries_user_zone_exit')
+        batch_op.drop_index('ix_toll_entries_open')
@@ -0,0 +1,27 @@
+"""add tolls_paid history indexes
+
+Revision ID: 9e4b6c1d2a73
+Revises: 7a2d4e8b1f60
+Create Date: 2026-10-17 18:21:47.905316
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '9e4b6c1d2a73'
+down_revision = '7a2d4e8b1f60'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('tolls_paid', schema=None) as batch_op:
+        batch_op.create_index('ix_tolls_paid_created_at_id', ['created_at', 'id'], unique=False)
+        batch_op.create_index('ix_tolls_paid_status_created_at_id', ['status', 'created_at', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('tolls_paid', schema=None) as batch_op:
+        batch_op.drop_index('ix_tolls_paid_status_created_at_id')
+        batch_op.drop_index('ix_tolls_paid_created_at_id')
@@ -0,0 +1,30 @@
+"""add toll_entries user entry_time index
+
+Revision ID: b58e2f7c4d19
+Revises: 9e4b6c1d2a73
+Create Date: 2026-10-17 18:55:12.470893
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b58e2f7c4d19'
+down_revision = '9e4b6c1d2a73'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('toll_entries', schema=None) as batch_op:
+        batch_op.create_index(
+            'ix_toll_entries_user_entry_time',
+            ['user_id', sa.text('entry_time DESC'), sa.text('entry_id DESC')],
+            unique=False
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('toll_entries', schema=None) as batch_op:
+        batch_op.drop_index('ix_toll_entries_user_entry_time')
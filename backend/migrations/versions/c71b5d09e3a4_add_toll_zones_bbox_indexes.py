@@ -0,0 +1,39 @@
+"""add toll_zones bbox indexes
+
+Revision ID: c71b5d09e3a4
+Revises: a4c92e7f1d68
+Create Date: 2026-10-17 11:26:45.903172
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c71b5d09e3a4'
+down_revision = 'a4c92e7f1d68'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('toll_zones', schema=None) as batch_op:
+        batch_op.create_index('ix_toll_zones_bbox_lat', ['min_lat', 'max_lat'], unique=False)
+        batch_op.create_index('ix_toll_zones_bbox_lng', ['min_lng', 'max_lng'], unique=False)
+
+    if op.get_bind().dialect.name == 'postgresql':
+        op.create_index(
+            'ix_toll_zones_bbox_gist',
+            'toll_zones',
+            [sa.text('box(point(min_lng, min_lat), point(max_lng, max_lat))')],
+            postgresql_using='gist'
+        )
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.drop_index('ix_toll_zones_bbox_gist', table_name='toll_zones')
+
+    with op.batch_alter_table('toll_zones', schema=None) as batch_op:
+        batch_op.drop_index('ix_toll_zones_bbox_lng')
+        batch_op.drop_index('ix_toll_zones_bbox_lat')
@@ -0,0 +1,70 @@
+"""add zone rollups
+
+Revision ID: d41a7f3e8c25
+Revises: b58e2f7c4d19
+Create Date: 2026-10-17 19:34:26.118604
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd41a7f3e8c25'
+down_revision = 'b58e2f7c4d19'
+branch_labels = None
+depends_on = None
+
+
+def rollup_columns():
+    return [
+        sa.Column('zone_id', sa.UUID(), nullable=False),
+        sa.Column('bucket_start', sa.DateTime(), nullable=False),
+        sa.Column('entries', sa.Integer(), nullable=False),
+        sa.Column('payments_completed', sa.Integer(), nullable=False),
+        sa.Column('payments_failed', sa.Integer(), nullable=False),
+        sa.Column('amount_completed', sa.BigInteger(), nullable=False),
+        sa.Column('amount_failed', sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint('zone_id', 'bucket_start')
+    ]
+
+
+def upgrade():
+    op.create_table('zone_hourly_rollups', *rollup_columns())
+    op.create_index('ix_zone_hourly_rollups_bucket_start', 'zone_hourly_rollups', ['bucket_start'], unique=False)
+
+    op.create_table('zone_daily_rollups', *rollup_columns())
+    op.create_index('ix_zone_daily_rollups_bucket_start', 'zone_daily_rollups', ['bucket_start'], unique=False)
+
+    op.create_table('rollup_watermarks',
+    sa.Column('name', sa.String(length=64), nullable=False),
+    sa.Column('value', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+    with op.batch_alter_table('tolls_paid', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+    op.execute("UPDATE tolls_paid SET updated_at = created_at")
+
+    with op.batch_alter_table('tolls_paid', schema=None) as batch_op:
+        batch_op.create_index('ix_tolls_paid_updated_at', ['updated_at'], unique=False)
+
+    with op.batch_alter_table('toll_entries', schema=None) as batch_op:
+        batch_op.create_index('ix_toll_entries_created_at', ['created_at'], unique=False)
+        batch_op.create_index('ix_toll_entries_zone_entry_time', ['zone_id', 'entry_time'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('toll_entries', schema=None) as batch_op:
+        batch_op.drop_index('ix_toll_entries_zone_entry_time')
+        batch_op.drop_index('ix_toll_entries_created_at')
+
+    with op.batch_alter_table('tolls_paid', schema=None) as batch_op:
+        batch_op.drop_index('ix_tolls_paid_updated_at')
+        batch_op.drop_column('updated_at')
+
+    op.drop_table('rollup_watermarks')
+    op.drop_index('ix_zone_daily_rollups_bucket_start', table_name='zone_daily_rollups')
+    op.drop_table('zone_daily_rollups')
+    op.drop_index('ix_zone_hourly_rollups_bucket_start', table_name='zone_hourly_rollups')
+    op.drop_table('zone_hourly_rollups')
@@ -0,0 +1,67 @@
+"""unique tolls_paid checkout_request_id
+
+Revision ID: e25a8f4c7b19
+Revises: c71b5d09e3a4
+Create Date: 2026-10-17 14:12:08.318406
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e25a8f4c7b19'
+down_revision = 'c71b5d09e3a4'
+branch_labels = None
+depends_on = None
+
+
+ARCHIVE_TABLE = 'tolls_paid_duplicates'
+
+
+def upgrade():
+    bind = op.get_bind()
+
+    # Duplicate callbacks may already have inserted extra rows; keep the
+    # completed one (or the newest) for each CheckoutRequestID and move
+    # the rest to tolls_paid_duplicates so they can still be reviewed
+    duplicates = bind.execute(sa.text(
+        "SELECT checkout_request_id FROM tolls_paid "
+        "WHERE checkout_request_id IS NOT NULL "
+        "GROUP BY checkout_request_id HAVING COUNT(*) > 1"
+    )).scalars().all()
+
+    if duplicates:
+        bind.execute(sa.text(
+            f"CREATE TABLE {ARCHIVE_TABLE} AS SELECT * FROM tolls_paid WHERE 1 = 0"
+        ))
+
+    archived = 0
+    for checkout_request_id in duplicates:
+        ids = bind.execute(sa.text(
+            "SELECT id FROM tolls_paid WHERE checkout_request_id = :checkout "
+            "ORDER BY CASE WHEN status = 'COMPLETED' THEN 0 ELSE 1 END, created_at DESC"
+        ), {"checkout": checkout_request_id}).scalars().all()
+        for duplicate_id in ids[1:]:
+            bind.execute(sa.text(
+                f"INSERT INTO {ARCHIVE_TABLE} SELECT * FROM tolls_paid WHERE id = :id"
+            ), {"id": duplicate_id})
+            bind.execute(sa.text("DELETE FROM tolls_paid WHERE id = :id"), {"id": duplicate_id})
+            archived += 1
+
+    if archived:
+        print(f"⚠️  Moved {archived} duplicate tolls_paid row(s) to {ARCHIVE_TABLE}")
+
+    with op.batch_alter_table('tolls_paid', schema=None) as batch_op:
+        batch_op.create_index('ix_tolls_paid_checkout_request_id', ['checkout_request_id'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('tolls_paid', schema=None) as batch_op:
+        batch_op.drop_index('ix_tolls_paid_checkout_request_id')
+
+    # Put archived duplicates back where they came from
+    bind = op.get_bind()
+    if sa.inspect(bind).has_table(ARCHIVE_TABLE):
+        bind.execute(sa.text(f"INSERT INTO tolls_paid SELECT * FROM {ARCHIVE_TABLE}"))
+        op.drop_table(ARCHIVE_TABLE)
@@ -0,0 +1,47 @@
+"""add zone_changes log
+
+Revision ID: e6c3b9a5f812
+Revises: d41a7f3e8c25
+Create Date: 2026-10-17 20:12:03.552917
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e6c3b9a5f812'
+down_revision = 'd41a7f3e8c25'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('zone_changes',
+    sa.Column('seq', sa.BigInteger(), nullable=False),
+    sa.Column('zone_id', sa.UUID(), nullable=False),
+    sa.Column('op', sa.String(length=10), nullable=False),
+    sa.Column('changed_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('seq', 'zone_id')
+    )
+
+    # Start the log with every existing zone under a fresh version, so a
+    # client syncing from before it gets all zones and later deltas are complete
+    op.execute("""
+        INSERT INTO zone_set_version (id, version, updated_at)
+        SELECT 1, 0, CURRENT_TIMESTAMP
+        WHERE NOT EXISTS (SELECT 1 FROM zone_set_version WHERE id = 1)
+    """)
+    op.execute("""
+        UPDATE zone_set_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+        WHERE id = 1
+    """)
+    op.execute("""
+        INSERT INTO zone_changes (seq, zone_id, op, changed_at)
+        SELECT (SELECT version FROM zone_set_version WHERE id = 1), zone_id, 'upsert', CURRENT_TIMESTAMP
+        FROM toll_zones
+    """)
+
+
+def downgrade():
+    op.drop_table('zone_changes')
@@ -0,0 +1,32 @@
+"""add tolls_paid pending index
+
+Revision ID: f3b7d2e91a06
+Revises: e25a8f4c7b19
+Create Date: 2026-10-17 15:40:52.127733
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3b7d2e91a06'
+down_revision = 'e25a8f4c7b19'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('tolls_paid', schema=None) as batch_op:
+        batch_op.create_index(
+            'ix_tolls_paid_pending',
+            ['created_at', 'id'],
+            unique=False,
+            postgresql_where=sa.text("status = 'PENDING'"),
+            sqlite_where=sa.text("status = 'PENDING'")
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('tolls_paid', schema=None) as batch_op:
+        batch_op.drop_index('ix_tolls_paid_pending')
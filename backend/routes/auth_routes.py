@@ -14,6 +14,7 @@ def register():
         data = request.get_json()
         username = data.get("username")
         password = data.get("password")
+        phone = data.get("phone")  # Optional: enables automatic toll charges
 
         if not username or not password:
             return jsonify({"error": "Username and password are required"}), 400
@@ -28,7 +29,8 @@ def register():
         new_user = User(
             user_id=uuid.uuid4(),
             username=username,
-            password_hash=password_hash
+            password_hash=password_hash,
+            phone_number=phone
         )
 
         db.session.add(new_user)
@@ -38,7 +40,8 @@ def register():
             "message": "User registered successfully",
             "user": {
                 "user_id": str(new_user.user_id),
-                "username": new_user.username
+                "username": new_user.username,
+                "phone_number": new_user.phone_number
             }
         }), 201
 
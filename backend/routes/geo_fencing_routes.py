@@ -1,20 +1,35 @@
 # backend/routes/geo_fencing_routes.py
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from datetime import datetime, timezone
+from dateutil import parser as date_parser
 import uuid
-from db import db, TollZone
+from db import db
 from services.geo_service import GeoFencingService
+from services.zone_index import zone_index_cache
+from services.zone_payload import get_zone_payload, zone_set_response
 
 geo_fencing_bp = Blueprint("geo_fencing_bp", __name__)
 
 @geo_fencing_bp.route("/check-zones", methods=["GET"])
 def check_zones_browser():
-    zones = TollZone.query.all()
+    """Every zone with its polygon; supports If-None-Match / If-Modified-Since"""
+    payload = get_zone_payload()
+    return zone_set_response(payload.check_zones, payload)
+
+
+@geo_fencing_bp.route("/geo-index/stats", methods=["GET"])
+def geo_index_stats():
+    """Report this worker's zone index version and coverage-grid hit rate"""
+    index = GeoFencingService.get_cached_zone_index()
 
     return jsonify({
         "success": True,
-        "count": len(zones),
-        "zones": [zone.to_dict() for zone in zones]
+        "cached": index is not None,
+        "zone_count": len(index) if index is not None else None,
+        "zone_set_version": zone_index_cache.version,
+        "background_builds": zone_index_cache.background_builds,
+        "grid": index.grid.stats() if index is not None and index.grid else None
     }), 200
 
 
@@ -54,20 +69,8 @@ def check_location():
             longitude=float(longitude)
         )
         
-        # Format response
-        response = {
-            "success": True,
-            "in_zone": result["in_zone"],
-            "should_trigger_payment": result["should_trigger_payment"],
-            "message": result["message"]
-        }
-        
-        if result["zone"]:
-            response["zone"] = {
-                "zone_id": str(result["zone"].zone_id),
-                "zone_name": result["zone"].zone_name,
-                "charge_amount": result["zone"].charge_amount
-            }
+        response = {"success": True}
+        response.update(format_zone_result(result))
         
         return jsonify(response), 200
         
@@ -81,6 +84,84 @@ def check_location():
         }), 500
 
 
+@geo_fencing_bp.route("/check-location/batch", methods=["POST"])
+@jwt_required()
+def check_location_batch():
+    """
+    Classify a buffer of the signed-in driver's fixes in one request
+
+    Body:
+    {
+        "fixes": [
+            {"driver_id": "<uuid>", "latitude": -1.217, "longitude": 36.889,
+             "timestamp": "2026-01-15T18:47:58Z"},
+            ...
+        ]
+    }
+
+    driver_id is optional; a fix for any driver other than the one in the
+    JWT gets an error result and is not recorded.
+    """
+    try:
+        try:
+            current_user_id = uuid.UUID(get_jwt_identity())
+        except (ValueError, AttributeError, TypeError):
+            return jsonify({
+                "success": False,
+                "error": "Invalid user ID format"
+            }), 400
+
+        data = request.get_json()
+        fixes = data.get("fixes") if isinstance(data, dict) else None
+
+        if not isinstance(fixes, list) or not fixes:
+            return jsonify({
+                "success": False,
+                "error": "fixes must be a non-empty list"
+            }), 400
+
+        max_fixes = current_app.config.get("LOCATION_BATCH_MAX_FIXES", 5000)
+        if len(fixes) > max_fixes:
+            return jsonify({
+                "success": False,
+                "error": f"At most {max_fixes} fixes per batch"
+            }), 413
+
+        # Validate each fix; invalid ones get an error result in place
+        results = [None] * len(fixes)
+        valid_positions = []
+        valid_fixes = []
+        for i, raw in enumerate(fixes):
+            fix, error = parse_fix(raw, current_user_id)
+            if error:
+                results[i] = {"success": False, "error": error}
+            else:
+                valid_positions.append(i)
+                valid_fixes.append(fix)
+
+        checked = GeoFencingService.check_zone_entries(valid_fixes)
+        for i, result in zip(valid_positions, checked):
+            formatted = {"success": True}
+            formatted.update(format_zone_result(result))
+            results[i] = formatted
+
+        return jsonify({
+            "success": True,
+            "count": len(results),
+            "results": results
+        }), 200
+
+    except Exception as e:
+        import traceback
+        db.session.rollback()
+        print(f" Error in check_location_batch: {str(e)}")
+        print(traceback.format_exc())
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+
 @geo_fencing_bp.route("/exit-zone", methods=["POST"])
 @jwt_required()
 def exit_zone():
@@ -98,7 +179,18 @@ def exit_zone():
                 "error": "Invalid user ID format"
             }), 400
         
-        success = GeoFencingService.record_zone_exit(current_user_id)
+        # Optional: which zone is being left
+        data = request.get_json(silent=True) or {}
+        zone_id = data.get("zone_id")
+        try:
+            zone_id = uuid.UUID(zone_id) if zone_id else None
+        except (ValueError, AttributeError, TypeError):
+            return jsonify({
+                "success": False,
+                "error": "Invalid zone ID format"
+            }), 400
+
+        success = GeoFencingService.record_zone_exit(current_user_id, zone_id)
         
         if success:
             return jsonify({
@@ -118,4 +210,89 @@ def exit_zone():
         return jsonify({
             "success": False,
             "error": str(e)
-        }), 500
\ No newline at end of file
+        }), 500
+
+
+# --------------------------------------------------
+# Helpers
+# --------------------------------------------------
+def format_zone_result(result):
+    """Shape a GeoFencingService result for a JSON response"""
+    response = {
+        "in_zone": result["in_zone"],
+        "should_trigger_payment": result["should_trigger_payment"],
+        "message": result["message"]
+    }
+
+    if result.get("payment_id"):
+        # Charge queued server-side; poll /payments/status/<payment_id>
+        response["payment_id"] = str(result["payment_id"])
+
+    if result["zone"]:
+        response["zone"] = {
+            "zone_id": str(result["zone"].zone_id),
+            "zone_name": result["zone"].zone_name,
+            "charge_amount": result["zone"].charge_amount
+        }
+
+    if result.get("events"):
+        response["events"] = [format_zone_event(event) for event in result["events"]]
+
+    return response
+
+
+def format_zone_event(event):
+    """Shape a trajectory ZoneEvent for a JSON response"""
+    return {
+        "type": event.type,
+        "zone_id": str(event.zone.zone_id),
+        "zone_name": event.zone.zone_name,
+        "entered_at": event.entered_at.isoformat() if event.entered_at else None,
+        "exited_at": event.exited_at.isoformat() if event.exited_at else None
+    }
+
+
+def parse_fix(raw, driver_id):
+    """
+    Validate one batch fix against the signed-in driver
+
+    Returns:
+        tuple: (fix dict, None) when valid, (None, error message) otherwise
+    """
+    if not isinstance(raw, dict):
+        return None, "Each fix must be an object"
+
+    latitude = raw.get("latitude")
+    longitude = raw.get("longitude")
+    is_valid, error = GeoFencingService.validate_coordinates(latitude, longitude)
+    if not is_valid:
+        return None, error
+
+    if raw.get("driver_id") is not None:
+        try:
+            fix_driver_id = uuid.UUID(str(raw["driver_id"]))
+        except ValueError:
+            return None, "Invalid driver_id format"
+        # Never record entries (or queue charges) against another driver
+        if fix_driver_id != driver_id:
+            return None, "driver_id does not match the signed-in driver"
+
+    timestamp = raw.get("timestamp")
+    try:
+        if timestamp is None:
+            at = datetime.utcnow()
+        elif isinstance(timestamp, (int, float)):
+            at = datetime.fromtimestamp(timestamp, tz=timezone.utc).replace(tzinfo=None)
+        else:
+            at = date_parser.isoparse(timestamp)
+            if at.tzinfo is not None:
+                at = at.astimezone(timezone.utc).replace(tzinfo=None)
+    except (ValueError, TypeError, OverflowError):
+        return None, "Invalid timestamp"
+
+    return {
+        "driver_id": driver_id,
+        "latitude": float(latitude),
+        "longitude": float(longitude),
+        "timestamp": at
+    }, None
@@ -1,50 +1,109 @@
 # backend/routes/mpesa_routes.py
-from flask import Blueprint, request, jsonify
-import json
+from flask import Blueprint, request, jsonify, current_app
+from flask_jwt_extended import jwt_required, verify_jwt_in_request, get_jwt_identity
 import uuid
 from datetime import datetime
 from services.mpesa_service import MpesaService
+from services.mpesa_http import mpesa_http
+from services.resilience import DependencyUnavailable
+from services.stk_dispatcher import stk_dispatcher, DispatcherBusy
+from services.stk_callbacks import parse_stk_callback, apply_stk_callbacks, stk_callback_writer
+from services.c2b_confirmations import parse_c2b_confirmation, c2b_confirmation_writer
+from services.charge_pipeline import charge_pipeline
 from services.config import MpesaConfig
-from db import db, TollPaid, TollZone
+from sqlalchemy import or_
+from db import db, TollEntry, TollPaid, C2BPayment
 
 mpesa_bp = Blueprint("mpesa", __name__, url_prefix="/payments")
 
 
 @mpesa_bp.route('/stk-push', methods=['POST'])
 def stk_push():
-    """Initiate STK Push payment"""
+    """
+    Queue an STK Push payment
+    
+    The payment is stored as PENDING and pushed to Daraja by a background
+    worker; poll /payments/status/<payment_id> for the outcome.
+    
+    Pass payment_id instead of amount to push a charge queued by a zone
+    entry (e.g. one left UNPAID for lack of a phone number, or FAILED).
+    A signed-in driver paying by amount for a zone they already have an
+    unpushed charge for pays that charge rather than a second one.
+    """
     try:
         data = request.get_json()
         phone = data.get("phone")
         amount = data.get("amount")
         zone_id = data.get("zone_id")  # Optional: pass zone_id from frontend
+        charge_id = data.get("payment_id")
 
-        if not phone or not amount:
-            return jsonify({"success": False, "error": "phone and amount are required"}), 400
+        if not phone or not (amount or charge_id):
+            return jsonify({"success": False, "error": "phone and amount (or payment_id) are required"}), 400
 
-        # Initiate STK push
-        response = MpesaService.stk_push(phone_number=phone, amount=amount)
-        
-        # If STK push initiated successfully, create a pending payment record
-        if response.get("ResponseCode") == "0":
-            checkout_request_id = response.get("CheckoutRequestID")
-            
-            # Create pending payment record
+        try:
+            zone_id = uuid.UUID(str(zone_id)) if zone_id else None
+            charge_id = uuid.UUID(str(charge_id)) if charge_id else None
+        except ValueError:
+            return jsonify({"success": False, "error": "zone_id and payment_id must be UUIDs"}), 400
+
+        if not charge_id and zone_id:
+            charge_id = queued_charge_for_caller(zone_id)
+
+        # Fail fast while Daraja is known to be down instead of queuing
+        if not mpesa_http.breaker.allows_request():
+            return jsonify({"success": False, "error": "M-Pesa is temporarily unavailable, try again shortly"}), 503
+
+        if charge_id:
+            toll_payment = db.session.get(TollPaid, charge_id)
+            if toll_payment is None:
+                return jsonify({"success": False, "error": "Payment not found"}), 404
+
+            # Claim the charge so a sweep or a second tap cannot push it again
+            claimed = TollPaid.query.filter(
+                TollPaid.id == toll_payment.id,
+                TollPaid.status.in_(PUSHABLE_STATUSES)
+            ).update({
+                TollPaid.status: "PENDING",
+                TollPaid.phone_number: phone,
+                TollPaid.checkout_request_id: None
+            }, synchronize_session=False)
+            db.session.commit()
+
+            if not claimed:
+                return jsonify({"success": False, "error": "Payment is already in progress or paid"}), 409
+
+            payment_id = toll_payment.id
+            amount = toll_payment.amount
+        else:
+            payment_id = uuid.uuid4()
             toll_payment = TollPaid(
-                id=uuid.uuid4(),
-                zone_id=uuid.UUID(zone_id) if zone_id else None,
+                id=payment_id,
+                zone_id=zone_id,
                 amount=int(amount),
-                checkout_request_id=checkout_request_id,
+                phone_number=phone,
                 status="PENDING",
                 created_at=datetime.utcnow()
             )
-            
             db.session.add(toll_payment)
             db.session.commit()
-            
-            print(f"✅ Created pending payment record: {checkout_request_id}")
-        
-        return jsonify({"success": True, "response": response}), 200
+
+        try:
+            stk_dispatcher.submit(
+                current_app._get_current_object(),
+                payment_id,
+                phone_number=phone,
+                amount=amount
+            )
+        except DispatcherBusy as e:
+            TollPaid.query.filter_by(id=payment_id).update({TollPaid.status: "FAILED"})
+            db.session.commit()
+            return jsonify({"success": False, "error": str(e)}), 503
+
+        return jsonify({
+            "success": True,
+            "payment_id": str(payment_id),
+            "status": "queued"
+        }), 202
 
     except Exception as e:
         db.session.rollback()
@@ -52,90 +111,53 @@ def stk_push():
         return jsonify({"success": False, "error": str(e)}), 500
 
 
+@mpesa_bp.route("/status/<reference>", methods=["GET"])
+def payment_status(reference):
+    """
+    Report the progress of a payment by payment id or CheckoutRequestID
+    
+    Status is one of: queued (not yet sent to Daraja), pending (waiting for
+    the customer, or for the outcome of a push Daraja may have received),
+    paid, failed, unpaid (charged on zone entry but no phone number on
+    file; push it with /payments/stk-push).
+    """
+    try:
+        try:
+            criteria = TollPaid.id == uuid.UUID(reference)
+        except ValueError:
+            criteria = TollPaid.checkout_request_id == reference
+
+        row = db.session.query(
+            TollPaid.id, TollPaid.status, TollPaid.checkout_request_id
+        ).filter(criteria).first()
+
+        if row is None:
+            return jsonify({"success": False, "error": "Payment not found"}), 404
+
+        return jsonify({
+            "success": True,
+            "payment_id": str(row.id),
+            "status": payment_progress(row.status, row.checkout_request_id),
+            "checkout_request_id": row.checkout_request_id
+        }), 200
+
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
 @mpesa_bp.route("/stk/callback", methods=["POST"])
 def stk_callback():
     """Handle M-Pesa STK Push callback"""
     try:
-        data = request.get_json(force=True)
-        callback_data = data.get("Body", {}).get("stkCallback", {})
-        
-        result_code = callback_data.get("ResultCode")
-        checkout_request_id = callback_data.get("CheckoutRequestID")
-        result_desc = callback_data.get("ResultDesc")
-        
-        print("\n========== STK CALLBACK RECEIVED ==========")
-        print(json.dumps(data, indent=2))
-        print("==========================================")
-        
-        # Find the payment record by CheckoutRequestID
-        payment = TollPaid.query.filter_by(
-            checkout_request_id=checkout_request_id
-        ).first()
-        
-        if result_code == 0:
-            # Payment successful
-            print("✅ PAYMENT SUCCESSFUL")
-            
-            # Extract payment details from callback
-            callback_metadata = callback_data.get("CallbackMetadata", {})
-            items = callback_metadata.get("Item", [])
-            
-            # Parse metadata
-            mpesa_receipt = None
-            phone_number = None
-            transaction_date = None
-            amount = None
-            
-            for item in items:
-                name = item.get("Name")
-                value = item.get("Value")
-                
-                if name == "MpesaReceiptNumber":
-                    mpesa_receipt = value
-                elif name == "PhoneNumber":
-                    phone_number = str(value)
-                elif name == "TransactionDate":
-                    transaction_date = value
-                elif name == "Amount":
-                    amount = value
-            
-            # Update existing payment record or create new one
-            if payment:
-                payment.status = "COMPLETED"
-                payment.mpesa_receipt_number = mpesa_receipt  # Store receipt number
-                payment.phone_number = phone_number  # Store phone number
-                print(f"✅ Updated payment record: {checkout_request_id}")
-                print(f"   Receipt: {mpesa_receipt}")
-                print(f"   Phone: {phone_number}")
-                print(f"   Amount: {amount}")
-            else:
-                # Create new record if it doesn't exist
-                payment = TollPaid(
-                    id=uuid.uuid4(),
-                    zone_id=None,
-                    amount=int(amount) if amount else 0,
-                    checkout_request_id=checkout_request_id,
-                    mpesa_receipt_number=mpesa_receipt,  # Store receipt number
-                    phone_number=phone_number,  # Store phone number
-                    status="COMPLETED",
-                    created_at=datetime.utcnow()
-                )
-                db.session.add(payment)
-                print(f"✅ Created new payment record: {checkout_request_id}")
-                print(f"   Receipt: {mpesa_receipt}")
-            
-            # IMPORTANT: Commit the changes
-            db.session.commit()
-            print("✅ Database changes committed successfully")
-            
+        callback = parse_stk_callback(request.get_json(force=True))
+
+        if MpesaConfig.STK_CALLBACK_MODE == "batched":
+            stk_callback_writer.submit(current_app._get_current_object(), callback)
         else:
-            # Payment failed or cancelled
-            print(f"❌ PAYMENT FAILED: {result_desc}")
-            
-            if payment:
-                payment.status = "FAILED"
-                db.session.commit()
-                print(f"✅ Updated payment status to FAILED: {checkout_request_id}")
+            print(f"📩 STK callback {callback.checkout_request_id}: "
+                  f"{callback.result_code} {callback.result_desc}")
+            apply_stk_callbacks([callback])
+            db.session.commit()
         
         # Always return success to M-Pesa
         return jsonify({"ResultCode": 0, "ResultDesc": "Accepted"}), 200
@@ -167,31 +189,34 @@ def simulate_c2b():
         )
         return jsonify({"success": True, "response": response}), 200
 
+    except DependencyUnavailable as e:
+        return jsonify({"success": False, "error": str(e)}), 503
+
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
 
 @mpesa_bp.route("/c2b/validate", methods=["POST"])
 def c2b_validate():
-    """Validate C2B payment before processing"""
-    try:
-        data = request.get_json()
-        print(f"\n C2B Validation: {json.dumps(data, indent=2)}\n")
-        return jsonify({"ResultCode": 0, "ResultDesc": "Accepted"})
-        
-    except Exception as e:
-        print(f"Validation error: {str(e)}")
-        return jsonify({"ResultCode": 1, "ResultDesc": "Rejected"})
+    """Validate C2B payment before processing (every payment is accepted)"""
+    return jsonify({"ResultCode": 0, "ResultDesc": "Accepted"})
 
 
 @mpesa_bp.route("/c2b/confirm", methods=["POST"])
 def c2b_confirm():
-    """Confirm C2B payment"""
+    """
+    Confirm C2B payment
+    
+    The confirmation is acknowledged at once and stored in c2b_payments by
+    a background batch writer, which also settles the charge named by its
+    BillRefNumber.
+    """
     try:
-        data = request.get_json(force=True)
-        print("\n========== C2B PAYMENT CONFIRMED ==========")
-        print(json.dumps(data, indent=2))
-        print("==========================================")
+        confirmation = parse_c2b_confirmation(request.get_json(force=True))
+        if confirmation.trans_id:
+            c2b_confirmation_writer.submit(current_app._get_current_object(), confirmation)
+        else:
+            print("❌ C2B confirmation without TransID ignored")
                 
         return jsonify({"ResultCode": 0, "ResultDesc": "Accepted"})
 
@@ -200,27 +225,117 @@ def c2b_confirm():
         return jsonify({"ResultCode": 0, "ResultDesc": "Accepted"})
 
 
+@mpesa_bp.route("/c2b/payments/<reference>", methods=["GET"])
+@jwt_required()
+def c2b_payments(reference):
+    """
+    List the signed-in driver's stored C2B payments by TransID or
+    BillRefNumber
+
+    Only confirmations for the driver's own charges (settled, or naming one
+    as BillRefNumber) are returned, since they carry the payer's MSISDN.
+    """
+    try:
+        try:
+            driver_id = uuid.UUID(get_jwt_identity())
+        except (ValueError, AttributeError, TypeError):
+            return jsonify({"success": False, "error": "Invalid user ID format"}), 400
+
+        rows = C2BPayment.query.filter(or_(
+            C2BPayment.trans_id == reference,
+            C2BPayment.bill_ref_number == reference
+        )).order_by(C2BPayment.created_at).limit(100).all()
+
+        charge_ids = {charge_of(row) for row in rows} - {None}
+        owned = {
+            payment_id for (payment_id,) in db.session.query(TollEntry.payment_id).filter(
+                TollEntry.user_id == driver_id,
+                TollEntry.payment_id.in_(charge_ids)
+            ).distinct()
+        } if charge_ids else set()
+
+        return jsonify({
+            "success": True,
+            "payments": [{
+                "trans_id": row.trans_id,
+                "bill_ref_number": row.bill_ref_number,
+                "amount": row.amount,
+                "msisdn": row.msisdn,
+                "trans_time": row.trans_time.isoformat() if row.trans_time else None,
+                "payment_id": str(row.payment_id) if row.payment_id else None
+            } for row in rows if charge_of(row) in owned]
+        }), 200
+
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
 @mpesa_bp.route("/register-c2b", methods=["POST"])
 def register_c2b():
     """Register C2B validation and confirmation URLs"""
     try:
-        import requests
-        access_token = MpesaService.get_access_token()
-        
-        payload = {
-            "ShortCode": MpesaConfig.C2B_SHORTCODE,
-            "ResponseType": "Completed",
-            "ConfirmationURL": f"{MpesaConfig.BASE_URL}c2b/confirm",
-            "ValidationURL": f"{MpesaConfig.BASE_URL}c2b/validate"
-        }
-
-        response = requests.post(
-            MpesaConfig.C2B_REGISTER_URL,
-            json=payload,
-            headers={"Authorization": f"Bearer {access_token}"}
-        )
+        response = MpesaService.register_c2b_urls()
+        return jsonify({"success": True, "response": response})
 
-        return jsonify({"success": True, "response": response.json()})
+    except DependencyUnavailable as e:
+        return jsonify({"success": False, "error": str(e)}), 503
 
     except Exception as e:
-        return jsonify({"success": False, "error": str(e)}), 500
\ No newline at end of file
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@mpesa_bp.route("/stats", methods=["GET"])
+def mpesa_stats():
+    """Expose M-Pesa client counters for this worker"""
+    return jsonify({
+        "success": True,
+        "oauth_token": MpesaService.token_cache_stats(),
+        "http": mpesa_http.stats(),
+        "stk_push": stk_dispatcher.stats(),
+        "stk_callbacks": stk_callback_writer.stats(),
+        "c2b_confirmations": c2b_confirmation_writer.stats(),
+        "auto_charges": charge_pipeline.stats()
+    }), 200
+
+
+# -----------------------------
+# Helpers
+# -----------------------------
+# Charges a client may (re)push by payment_id
+PUSHABLE_STATUSES = ("QUEUED", "UNPAID", "FAILED")
+
+
+def charge_of(c2b_payment):
+    """The charge a C2B payment settled, or the one its BillRefNumber names"""
+    if c2b_payment.payment_id:
+        return c2b_payment.payment_id
+    try:
+        return uuid.UUID(c2b_payment.bill_ref_number)
+    except (TypeError, ValueError):
+        return None
+
+
+def queued_charge_for_caller(zone_id):
+    """
+    The signed-in driver's unpushed charge for a zone, or None when the request carries no JWT or there is no such charge
+    """
+    if not verify_jwt_in_request(optional=True):
+        return None
+    try:
+        driver_id = uuid.UUID(get_jwt_identity())
+    except (ValueError, AttributeError, TypeError):
+        return None
+    return charge_pipeline.open_charge(driver_id, zone_id)
+
+
+def payment_progress(status, checkout_request_id):
+    """Map a TollPaid status onto the states the payment screen polls for"""
+    if status == "COMPLETED":
+        return "paid"
+    if status == "FAILED":
+        return "failed"
+    if status == "UNPAID":
+        return "unpaid"
+    if status == "UNKNOWN":
+        return "pending"
+    return "pending" if checkout_request_id else "queued"
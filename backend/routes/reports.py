@@ -0,0 +1,83 @@
+# backend/routes/reports.py
+import uuid
+from datetime import datetime, timedelta
+from flask import Blueprint, jsonify, request, current_app
+from db import db, TollZone, ZoneHourlyRollup, ZoneDailyRollup, RollupWatermark
+from services.zone_rollups import METRICS, ZoneRollups
+
+reports_bp = Blueprint("reports_bp", __name__)
+
+GRANULARITIES = {
+    "hour": (ZoneHourlyRollup, timedelta(days=1)),
+    "day": (ZoneDailyRollup, timedelta(days=30))
+}
+
+
+@reports_bp.route("/reports/zones", methods=["GET"])
+def zone_report():
+    """
+    Per-zone traffic and revenue, read from the rollup tables only
+
+    Query params (all optional):
+        granularity: hour or day (default day)
+        from/to:     ISO dates or datetimes; from inclusive, to exclusive
+                     (default: the last day of hours or 30 days)
+        zone_id:     UUID of the toll zone
+    """
+    granularity = request.args.get("granularity", "day")
+    if granularity not in GRANULARITIES:
+        return jsonify({"success": False, "error": "granularity must be hour or day"}), 400
+    model, default_span = GRANULARITIES[granularity]
+
+    try:
+        end = parse_datetime(request.args.get("to")) or datetime.utcnow()
+        start = parse_datetime(request.args.get("from")) or end - default_span
+        zone_id = uuid.UUID(request.args["zone_id"]) if request.args.get("zone_id") else None
+    except ValueError as e:
+        return jsonify({"success": False, "error": f"Invalid parameter: {str(e)}"}), 400
+
+    query = db.session.query(model, TollZone.zone_name).outerjoin(
+        TollZone, TollZone.zone_id == model.zone_id
+    ).filter(
+        model.bucket_start >= start,
+        model.bucket_start < end
+    )
+    if zone_id is not None:
+        query = query.filter(model.zone_id == zone_id)
+
+    max_buckets = current_app.config.get("REPORT_MAX_BUCKETS", 10000)
+    rows = query.order_by(model.bucket_start, model.zone_id).limit(max_buckets + 1).all()
+    if len(rows) > max_buckets:
+        return jsonify({"success": False, "error": "Too many buckets, narrow the range or use granularity=day"}), 400
+
+    buckets = []
+    totals = {}
+    for bucket, zone_name in rows:
+        counts = {name: getattr(bucket, name) for name in METRICS}
+        buckets.append({
+            "zone_id": str(bucket.zone_id),
+            "zone_name": zone_name,
+            "bucket_start": bucket.bucket_start.isoformat(),
+            **counts
+        })
+
+        zone_total = totals.setdefault(str(bucket.zone_id), {"zone_name": zone_name, **dict.fromkeys(METRICS, 0)})
+        for name, value in counts.items():
+            zone_total[name] += value
+
+    watermark = db.session.get(RollupWatermark, ZoneRollups.WATERMARK)
+
+    return jsonify({
+        "success": True,
+        "granularity": granularity,
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        # Rollups include source rows up to this time
+        "as_of": watermark.value.isoformat() if watermark else None,
+        "buckets": buckets,
+        "totals": totals
+    }), 200
+
+
+def parse_datetime(value):
+    return datetime.fromisoformat(value) if value else None
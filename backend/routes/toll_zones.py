@@ -1,6 +1,9 @@
 # backend/routes/toll_zones.py
 from flask import Blueprint, request, jsonify
-from db import db, TollZone
+from sqlalchemy import func
+from db import db, TollZone, TollEntry, ZoneChange, ZoneSetVersion
+from services.geo_service import GeoFencingService
+from services.zone_payload import get_zone_payload, zone_set_response
 
 toll_zones_bp = Blueprint("toll_zones_bp", __name__)
 
@@ -9,12 +12,9 @@ toll_zones_bp = Blueprint("toll_zones_bp", __name__)
 # --------------------------------
 @toll_zones_bp.route("/toll-zones", methods=["GET"])
 def get_toll_zones():
-    zones = TollZone.query.all()
-
-    return jsonify({
-        "success": True,
-        "data": [zone.to_dict() for zone in zones]
-    }), 200
+    """Every zone with its polygon; supports If-None-Match / If-Modified-Since"""
+    payload = get_zone_payload()
+    return zone_set_response(payload.toll_zones, payload)
 
 
 # --------------------------------
@@ -41,11 +41,13 @@ def create_toll_zone():
     try:
         new_zone = TollZone(
             zone_name=data["zone_name"],
-            charge_amount=int(data["charge_amount"]),
-            polygon_coords=data["polygon_coords"]
+            charge_amount=int(data["charge_amount"])
         )
+        GeoFencingService.store_zone_geometry(new_zone, data["polygon_coords"])
 
         db.session.add(new_zone)
+        db.session.flush()
+        ZoneChange.record([new_zone.zone_id])
         db.session.commit()
 
         return jsonify({
@@ -54,6 +56,13 @@ def create_toll_zone():
             "zone": new_zone.to_dict()
         }), 201
 
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 400
+
     except Exception as e:
         db.session.rollback()
         return jsonify({
@@ -91,8 +100,9 @@ def update_toll_zone(zone_id):
             zone.charge_amount = int(data["charge_amount"])
 
         if "polygon_coords" in data:
-            zone.polygon_coords = data["polygon_coords"]
+            GeoFencingService.store_zone_geometry(zone, data["polygon_coords"])
 
+        ZoneChange.record([zone.zone_id])
         db.session.commit()
 
         return jsonify({
@@ -101,9 +111,122 @@ def update_toll_zone(zone_id):
             "zone": zone.to_dict()
         }), 200
 
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 400
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+
+# --------------------------------
+# DELETE a toll zone
+# --------------------------------
+@toll_zones_bp.route("/toll-zones/<uuid:zone_id>", methods=["DELETE"])
+def delete_toll_zone(zone_id):
+    zone = TollZone.query.filter_by(zone_id=zone_id).first()
+
+    if not zone:
+        return jsonify({
+            "success": False,
+            "error": "Toll zone not found"
+        }), 404
+
+    # Entries keep their zone for history and billing
+    if db.session.query(TollEntry.entry_id).filter_by(zone_id=zone_id).first():
+        return jsonify({
+            "success": False,
+            "error": "Toll zone has recorded entries and cannot be deleted"
+        }), 409
+
+    try:
+        db.session.delete(zone)
+        ZoneChange.record([zone_id], op="delete")
+        db.session.commit()
+
+        return jsonify({
+            "success": True,
+            "message": "Toll zone deleted successfully"
+        }), 200
+
     except Exception as e:
         db.session.rollback()
         return jsonify({
             "success": False,
             "error": str(e)
-        }), 500
\ No newline at end of file
+        }), 500
+
+
+# --------------------------------
+# Zone changes since a sequence number
+# --------------------------------
+@toll_zones_bp.route("/toll-zones/changes", methods=["GET"])
+def get_toll_zone_changes():
+    """
+    Delta sync for clients that keep a local zone cache
+
+    ?since=N returns the current state of every zone created or updated
+    after sequence N and the ids of zones deleted since, plus the sequence
+    to pass next time. Without since, or when the log no longer reaches
+    back to N, the response is a full snapshot instead ("snapshot": true):
+    the client replaces its cache with "upserts".
+    """
+    since = request.args.get("since")
+    try:
+        since = int(since) if since is not None else None
+    except ValueError:
+        return jsonify({"success": False, "error": "since must be an integer"}), 400
+
+    # Read the sequence first: zones read afterwards are at least this new,
+    # and replaying a change the client already has is harmless
+    seq = ZoneSetVersion.current()
+
+    if since is None or since > seq or since < oldest_replayable_seq(seq):
+        zones = TollZone.query.order_by(TollZone.zone_id).all()
+        return jsonify({
+            "success": True,
+            "snapshot": True,
+            "seq": seq,
+            "upserts": [zone.to_dict() for zone in zones],
+            "deletes": []
+        }), 200
+
+    latest = db.session.query(
+        ZoneChange.zone_id, func.max(ZoneChange.seq).label("seq")
+    ).filter(
+        ZoneChange.seq > since,
+        ZoneChange.seq <= seq
+    ).group_by(ZoneChange.zone_id).subquery()
+
+    changes = db.session.query(ZoneChange.zone_id, ZoneChange.op).join(
+        latest, (ZoneChange.zone_id == latest.c.zone_id) & (ZoneChange.seq == latest.c.seq)
+    ).all()
+
+    changed_ids = [change.zone_id for change in changes if change.op != "delete"]
+    zones = TollZone.query.filter(TollZone.zone_id.in_(changed_ids)).all() if changed_ids else []
+    found = {zone.zone_id for zone in zones}
+
+    return jsonify({
+        "success": True,
+        "snapshot": False,
+        "seq": seq,
+        "upserts": [zone.to_dict() for zone in zones],
+        # Deleted since, including zones updated and then deleted after seq was read
+        "deletes": [str(change.zone_id) for change in changes if change.zone_id not in found]
+    }), 200
+
+
+def oldest_replayable_seq(seq):
+    """
+    Smallest since a delta can be served from: the log must reach back to
+    since + 1, and it may be pruned from the front
+    """
+    oldest = db.session.query(func.min(ZoneChange.seq)).scalar()
+    return (oldest - 1) if oldest is not None else seq
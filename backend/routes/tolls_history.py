@@ -1,27 +1,257 @@
 # backend/routes/tolls_history.py
-from flask import Blueprint, jsonify
-from db import db, TollPaid, TollZone
+import base64
+import json
+import uuid
+from datetime import datetime
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy import and_, or_
+from db import db, TollEntry, TollPaid, TollZone
 
 tolls_history_bp = Blueprint("tolls_history_bp", __name__)
 
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+# Rows fetched per round trip while streaming NDJSON
+STREAM_BATCH_SIZE = 1000
+
+
 @tolls_history_bp.route("/tolls-history", methods=["GET"])
 def get_tolls_history():
-    tolls = TollPaid.query.order_by(TollPaid.created_at.desc()).all()
+    """
+    Payments, newest first, with their zone name
+
+    Query params (all optional):
+        status:  e.g. COMPLETED, PENDING, FAILED
+        zone_id: UUID of the toll zone
+        from/to: ISO dates or datetimes; from is inclusive, to exclusive
+        limit:   page size (default 50, max 500)
+        cursor:  next_cursor from the previous page
+        format:  "ndjson" streams every matching row, one JSON object per line
+    """
+    try:
+        filters = history_filters(request.args)
+        after = decode_cursor(request.args.get("cursor"))
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
 
-    results = []
-    for toll in tolls:
-        zone = TollZone.query.filter_by(zone_id=toll.zone_id).first()
+    if request.args.get("format") == "ndjson":
+        def generate():
+            last = after
+            while True:
+                rows = history_page(filters, last, STREAM_BATCH_SIZE)
+                for row in rows:
+                    yield json.dumps(format_history_row(row)) + "\n"
+                if len(rows) < STREAM_BATCH_SIZE:
+                    return
+                last = (rows[-1].created_at, rows[-1].id)
 
-        results.append({
-            "id": str(toll.id),
-            "zone_name": zone.zone_name if zone else None,
-            "amount": toll.amount,
-            "status": toll.status,
-            "checkout_request_id": toll.checkout_request_id,
-            "created_at": toll.created_at.isoformat()
-        })
+        return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+    try:
+        limit = page_size(request.args)
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
+    # One extra row tells us whether another page exists
+    rows = history_page(filters, after, limit + 1)
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
 
     return jsonify({
         "success": True,
-        "data": results
-    }), 200
\ No newline at end of file
+        "data": [format_history_row(row) for row in rows],
+        "next_cursor": next_cursor
+    }), 200
+
+
+@tolls_history_bp.route("/my-trips", methods=["GET"])
+@jwt_required()
+def get_driver_trips():
+    """
+    The signed-in driver's zone passages, newest first, with the zone and
+    the charge covering each one (if any)
+
+    Query params (all optional):
+        zone_id: UUID of the toll zone
+        from/to: ISO dates or datetimes on entry_time; from inclusive, to exclusive
+        limit:   page size (default 50, max 500)
+        cursor:  next_cursor from the previous page
+    """
+    try:
+        driver_id = uuid.UUID(get_jwt_identity())
+    except (ValueError, AttributeError, TypeError):
+        return jsonify({"success": False, "error": "Invalid user ID format"}), 400
+
+    try:
+        filters = trip_filters(request.args)
+        after = decode_cursor(request.args.get("cursor"))
+        limit = page_size(request.args)
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
+    rows = trips_page(driver_id, filters, after, limit + 1)
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].entry_time, rows[-1].entry_id)
+
+    return jsonify({
+        "success": True,
+        "data": [format_trip_row(row) for row in rows],
+        "next_cursor": next_cursor
+    }), 200
+
+
+# -----------------------------
+# Helpers
+# -----------------------------
+def history_filters(args):
+    """Build WHERE clauses from the query string; raises ValueError on bad input"""
+    filters = []
+
+    if args.get("status"):
+        filters.append(TollPaid.status == args["status"].upper())
+
+    if args.get("zone_id"):
+        try:
+            filters.append(TollPaid.zone_id == uuid.UUID(args["zone_id"]))
+        except ValueError:
+            raise ValueError("zone_id must be a UUID")
+
+    if args.get("from"):
+        filters.append(TollPaid.created_at >= parse_datetime(args["from"], "from"))
+
+    if args.get("to"):
+        filters.append(TollPaid.created_at < parse_datetime(args["to"], "to"))
+
+    return filters
+
+
+def parse_datetime(value, name):
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"{name} must be an ISO date or datetime")
+
+
+def history_page(filters, after, limit):
+    """
+    One page ordered by (created_at, id) descending, starting after the
+    (created_at, id) key of the previous page
+    """
+    query = db.session.query(
+        TollPaid.id, TollPaid.amount, TollPaid.status, TollPaid.checkout_request_id,
+        TollPaid.created_at, TollZone.zone_name
+    ).outerjoin(
+        TollZone, TollZone.zone_id == TollPaid.zone_id
+    ).filter(*filters)
+
+    if after is not None:
+        created_at, payment_id = after
+        query = query.filter(or_(
+            TollPaid.created_at < created_at,
+            and_(TollPaid.created_at == created_at, TollPaid.id < payment_id)
+        ))
+
+    return query.order_by(TollPaid.created_at.desc(), TollPaid.id.desc()).limit(limit).all()
+
+
+def trip_filters(args):
+    """WHERE clauses for /my-trips; raises ValueError on bad input"""
+    filters = []
+
+    if args.get("zone_id"):
+        try:
+            filters.append(TollEntry.zone_id == uuid.UUID(args["zone_id"]))
+        except ValueError:
+            raise ValueError("zone_id must be a UUID")
+
+    if args.get("from"):
+        filters.append(TollEntry.entry_time >= parse_datetime(args["from"], "from"))
+
+    if args.get("to"):
+        filters.append(TollEntry.entry_time < parse_datetime(args["to"], "to"))
+
+    return filters
+
+
+def trips_page(driver_id, filters, after, limit):
+    """
+    One page of a driver's entries ordered by (entry_time, entry_id)
+    descending; walks ix_toll_entries_user_entry_time, so the cost of a
+    page does not grow with the driver's history
+    """
+    query = db.session.query(
+        TollEntry.entry_id, TollEntry.entry_time, TollEntry.exit_time, TollEntry.payment_id,
+        TollZone.zone_id, TollZone.zone_name, TollZone.charge_amount,
+        TollPaid.amount.label("payment_amount"), TollPaid.status.label("payment_status"),
+        TollPaid.mpesa_receipt_number
+    ).join(
+        TollZone, TollZone.zone_id == TollEntry.zone_id
+    ).outerjoin(
+        TollPaid, TollPaid.id == TollEntry.payment_id
+    ).filter(TollEntry.user_id == driver_id, *filters)
+
+    if after is not None:
+        entry_time, entry_id = after
+        query = query.filter(or_(
+            TollEntry.entry_time < entry_time,
+            and_(TollEntry.entry_time == entry_time, TollEntry.entry_id < entry_id)
+        ))
+
+    return query.order_by(TollEntry.entry_time.desc(), TollEntry.entry_id.desc()).limit(limit).all()
+
+
+def page_size(args):
+    try:
+        return min(max(int(args.get("limit", DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+    except ValueError:
+        raise ValueError("limit must be an integer")
+
+
+def format_history_row(row):
+    return {
+        "id": str(row.id),
+        "zone_name": row.zone_name,
+        "amount": row.amount,
+        "status": row.status,
+        "checkout_request_id": row.checkout_request_id,
+        "created_at": row.created_at.isoformat() if row.created_at else None
+    }
+
+
+def format_trip_row(row):
+    return {
+        "entry_id": str(row.entry_id),
+        "zone_id": str(row.zone_id),
+        "zone_name": row.zone_name,
+        "charge_amount": row.charge_amount,
+        "entry_time": row.entry_time.isoformat(),
+        "exit_time": row.exit_time.isoformat() if row.exit_time else None,
+        "payment": {
+            "payment_id": str(row.payment_id),
+            "amount": row.payment_amount,
+            "status": row.payment_status,
+            "mpesa_receipt_number": row.mpesa_receipt_number
+        } if row.payment_id else None
+    }
+
+
+def encode_cursor(timestamp, row_id):
+    """Opaque cursor for a (timestamp, uuid) keyset position"""
+    raw = f"{timestamp.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Return the (timestamp, uuid) key in an opaque cursor, or None"""
+    if not cursor:
+        return None
+    try:
+        timestamp, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(timestamp), uuid.UUID(row_id)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor")
@@ -0,0 +1,169 @@
+"""
+Batch Writer
+File: backend/services/batch_writer.py
+
+Responsibilities:
+- Buffer records handed over by request handlers on an in-process queue
+- Apply them in batches from a background thread with one commit per batch
+- Fall back to per-record commits when a batch fails, so one bad record
+  does not drop the rest
+"""
+
+import atexit
+import os
+import queue
+import threading
+import time
+from db import db
+
+
+class BatchWriter:
+    """
+    Group-commit writer for one kind of record.
+
+    apply_batch(records) adds or updates rows in db.session without
+    committing; the writer commits. A batch is written once batch_size
+    records are waiting or flush_seconds after its first record arrived,
+    whichever comes first. When the queue is full, submit applies the
+    record in the caller's thread instead of dropping it.
+    """
+
+    def __init__(self, name, apply_batch, batch_size=100, flush_seconds=0.2, max_queue=10000):
+        self.name = name
+        self.apply_batch = apply_batch
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.max_queue = max_queue
+
+        self._lock = threading.Lock()
+        self._queue = None
+        self._thread = None
+        self._pid = None
+
+        self.batches = 0
+        self.records = 0
+        self.largest_batch = 0
+        self.failed_records = 0
+        self.overflow_writes = 0
+
+    def submit(self, app, record):
+        """
+        Queue a record for the next batch
+
+        Args:
+            app: Flask app the batch should be written under
+            record: Anything apply_batch accepts in its list
+        """
+        self._ensure_started()
+
+        try:
+            self._queue.put_nowait((app, record))
+        except queue.Full:
+            self.overflow_writes += 1
+            self._write([(app, record)])
+
+    def flush(self):
+        """Block until every queued record has been written"""
+        if self._queue is not None and self._pid == os.getpid():
+            self._queue.join()
+
+    def stats(self):
+        return {
+            "batch_size": self.batch_size,
+            "flush_seconds": self.flush_seconds,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "batches": self.batches,
+            "records": self.records,
+            "largest_batch": self.largest_batch,
+            "failed_records": self.failed_records,
+            "overflow_writes": self.overflow_writes
+        }
+
+    def shutdown(self):
+        """Write what is queued and stop the background thread"""
+        with self._lock:
+            if self._queue is not None and self._pid == os.getpid():
+                self._queue.put(None)
+                self._thread.join()
+            self._queue = None
+            self._thread = None
+            self._pid = None
+
+    def _ensure_started(self):
+        if self._pid == os.getpid():
+            return
+
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+
+            self._queue = queue.Queue(maxsize=self.max_queue)
+            self._thread = threading.Thread(
+                target=self._run, args=(self._queue,), name=f"batch-writer-{self.name}", daemon=True
+            )
+            self._thread.start()
+            self._pid = os.getpid()
+            atexit.register(self.shutdown)
+
+    def _run(self, items):
+        while True:
+            batch = []
+            taken = 0
+            stopping = False
+            deadline = None
+
+            while len(batch) < self.batch_size:
+                if deadline is None:
+                    item = items.get()
+                    deadline = time.monotonic() + self.flush_seconds
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = items.get(timeout=remaining)
+                    except queue.Empty:
+                        break
+
+                taken += 1
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            if batch:
+                self._write(batch)
+            for _ in range(taken):
+                items.task_done()
+            if stopping:
+                return
+
+    def _write(self, batch):
+        by_app = {}
+        for app, record in batch:
+            by_app.setdefault(app, []).append(record)
+
+        for app, records in by_app.items():
+            with app.app_context():
+                try:
+                    if not self._commit(records):
+                        # Isolate the record(s) that broke the batch
+                        for record in records:
+                            if not self._commit([record]):
+                                self.failed_records += 1
+                finally:
+                    db.session.remove()
+
+        self.batches += 1
+        self.records += len(batch)
+        self.largest_batch = max(self.largest_batch, len(batch))
+
+    def _commit(self, records):
+        try:
+            self.apply_batch(records)
+            db.session.commit()
+            return True
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ {self.name} batch of {len(records)} failed: {str(e)}")
+            return False
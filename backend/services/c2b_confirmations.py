@@ -0,0 +1,194 @@
+"""
+C2B Confirmation Ingestion
+File: backend/services/c2b_confirmations.py
+
+Responsibilities:
+- Parse Daraja C2B (paybill) confirmations into compact records
+- Store a batch of records in c2b_payments with one insert, ignoring repeats
+- Settle the toll charge a confirmation's BillRefNumber points at
+- Own the process-wide batch writer the confirmation webhook submits to
+"""
+
+import uuid
+from collections import namedtuple
+from datetime import datetime
+from sqlalchemy import bindparam, or_
+from db import db, TollPaid, C2BPayment
+from .batch_writer import BatchWriter
+from .config import MpesaConfig
+
+
+C2BConfirmation = namedtuple("C2BConfirmation", [
+    "trans_id", "bill_ref_number", "amount", "msisdn",
+    "business_short_code", "transaction_type", "trans_time"
+])
+
+
+def parse_c2b_confirmation(data):
+    """
+    Extract the fields we store from a Daraja C2B confirmation body
+
+    Args:
+        data: Parsed JSON body (TransID, TransAmount, BillRefNumber, ...)
+
+    Returns:
+        C2BConfirmation
+    """
+    data = data or {}
+
+    try:
+        trans_time = datetime.strptime(str(data.get("TransTime")), "%Y%m%d%H%M%S")
+    except ValueError:
+        trans_time = None
+
+    try:
+        amount = int(float(data.get("TransAmount") or 0))
+    except (TypeError, ValueError):
+        amount = 0
+
+    bill_ref_number = (data.get("BillRefNumber") or "").strip() or None
+
+    return C2BConfirmation(
+        trans_id=data.get("TransID"),
+        bill_ref_number=bill_ref_number,
+        amount=amount,
+        msisdn=str(data["MSISDN"]) if data.get("MSISDN") else None,
+        business_short_code=str(data["BusinessShortCode"]) if data.get("BusinessShortCode") else None,
+        transaction_type=data.get("TransactionType"),
+        trans_time=trans_time
+    )
+
+
+# Charges nobody is collecting right now. A PENDING (or UNKNOWN) charge has
+# an STK push out that may still take the money, so a paybill payment for
+# it is stored unmatched rather than risk charging the driver twice.
+SETTLEABLE_STATUSES = ("QUEUED", "UNPAID", "FAILED")
+
+
+def apply_c2b_confirmations(confirmations):
+    """
+    Store confirmations in c2b_payments without committing
+
+    A BillRefNumber that is the id of a charge in SETTLEABLE_STATUSES (the
+    payment_id the app shows) settles that charge when the amount covers
+    it: the charge is COMPLETED with the TransID as its receipt and the
+    confirmation keeps a link to it. Any other confirmation is stored
+    unmatched. Repeated TransIDs, within the batch or already stored, are
+    ignored.
+
+    Returns:
+        int: Number of charges settled
+    """
+    latest = {}
+    for confirmation in confirmations:
+        if confirmation.trans_id:
+            latest.setdefault(confirmation.trans_id, confirmation)
+    if not latest:
+        return 0
+
+    now = datetime.utcnow()
+    rows = [{
+        "id": uuid.uuid4(),
+        "trans_id": confirmation.trans_id,
+        "bill_ref_number": confirmation.bill_ref_number,
+        "amount": confirmation.amount,
+        "msisdn": confirmation.msisdn,
+        "business_short_code": confirmation.business_short_code,
+        "transaction_type": confirmation.transaction_type,
+        "trans_time": confirmation.trans_time,
+        "payment_id": None,
+        "created_at": now
+    } for confirmation in latest.values()]
+
+    stored = set(db.session.execute(_insert_ignoring_repeats(rows)).scalars())
+    fresh = [latest[trans_id] for trans_id in stored]
+    charges = _referenced_charges(fresh)
+
+    settle = []
+    for confirmation in fresh:
+        charge = charges.get(confirmation.bill_ref_number)
+        if charge is not None and charge.status in SETTLEABLE_STATUSES and confirmation.amount >= charge.amount:
+            settle.append({
+                "b_id": charge.id,
+                "b_receipt": confirmation.trans_id,
+                "b_phone": confirmation.msisdn
+            })
+    if not settle:
+        return 0
+
+    # The status may have moved since it was read (a push claimed the
+    # charge, or two confirmations in the batch point at it), so the guard
+    # is repeated in the UPDATE and the links follow what it actually did
+    paid = TollPaid.__table__
+    db.session.execute(
+        paid.update().where(
+            paid.c.id == bindparam("b_id"),
+            # Not in_(): expanding parameters cannot be used with executemany
+            or_(*(paid.c.status == status for status in SETTLEABLE_STATUSES))
+        ).values(
+            status="COMPLETED",
+            mpesa_receipt_number=bindparam("b_receipt"),
+            phone_number=bindparam("b_phone")
+        ),
+        settle
+    )
+
+    settled = db.session.query(TollPaid.id, TollPaid.mpesa_receipt_number).filter(
+        TollPaid.id.in_([row["b_id"] for row in settle]),
+        TollPaid.status == "COMPLETED"
+    ).all()
+    links = [{"b_trans_id": receipt, "b_payment_id": charge_id} for charge_id, receipt in settled
+             if receipt in stored]
+    if links:
+        payments = C2BPayment.__table__
+        db.session.execute(
+            payments.update().where(
+                payments.c.trans_id == bindparam("b_trans_id")
+            ).values(payment_id=bindparam("b_payment_id")),
+            links
+        )
+    return len(links)
+
+
+def _referenced_charges(confirmations):
+    """One IN query for the charges whose id appears as a BillRefNumber"""
+    refs = {}
+    for confirmation in confirmations:
+        try:
+            refs[uuid.UUID(confirmation.bill_ref_number)] = confirmation.bill_ref_number
+        except (TypeError, ValueError):
+            continue
+    if not refs:
+        return {}
+
+    rows = db.session.query(
+        TollPaid.id, TollPaid.amount, TollPaid.status
+    ).filter(TollPaid.id.in_(list(refs))).all()
+    return {refs[row.id]: row for row in rows}
+
+
+def _insert_ignoring_repeats(rows):
+    """
+    INSERT ... ON CONFLICT (trans_id) DO NOTHING for the active dialect,
+    returning the TransIDs actually inserted
+    """
+    dialect = db.session.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f"No upsert for dialect {dialect}")
+
+    table = C2BPayment.__table__
+    return insert(table).values(rows).on_conflict_do_nothing(
+        index_elements=[table.c.trans_id]
+    ).returning(table.c.trans_id)
+
+
+c2b_confirmation_writer = BatchWriter(
+    "c2b-confirmations",
+    apply_c2b_confirmations,
+    batch_size=MpesaConfig.C2B_CONFIRM_BATCH_SIZE,
+    flush_seconds=MpesaConfig.C2B_CONFIRM_FLUSH_SECONDS
+)
@@ -0,0 +1,190 @@
+"""
+Automatic Charge Pipeline
+File: backend/services/charge_pipeline.py
+
+Responsibilities:
+- Turn each new TollEntry into a QUEUED charge linked to the entry
+- Dispatch due charges to the STK push workers from a background sweeper
+"""
+
+import os
+import threading
+import time
+from datetime import datetime
+from db import db, TollPaid, TollEntry, User
+from .mpesa_http import mpesa_http
+from .stk_dispatcher import stk_dispatcher, DispatcherBusy
+
+
+class ChargePipeline:
+    """
+    Server-side replacement for the client's follow-up /payments/stk-push.
+
+    A charge moves QUEUED -> PENDING when it is handed to the dispatcher
+    (the dispatcher and callbacks take it from there), or QUEUED -> UNPAID
+    when the driver has no phone number on file. UNPAID and FAILED charges
+    can still be pushed by the client with /payments/stk-push {payment_id}.
+
+    Every state change is a conditional UPDATE on the current status, so
+    several workers can sweep the same table without pushing twice.
+    """
+
+    def __init__(self, batch_size=100):
+        self.batch_size = batch_size
+
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+        self.queued = 0
+        self.dispatched = 0
+        self.unpaid = 0
+        self.deferred = 0
+        self.sweeps = 0
+
+    def add_entry(self, entry, zone, at=None):
+        """
+        Queue a charge for a new entry, linked to it. One charge per entry:
+        the geofence rules (open entry, grace period) already keep a driver
+        from being charged twice for one visit, and a charge never spans
+        zones, so per-zone revenue stays exact. Runs in the caller's
+        session and does not commit.
+
+        Args:
+            entry: The TollEntry just added to the session
+            zone: Its TollZone (for the charge amount)
+            at: When the charge was incurred (defaults to now)
+
+        Returns:
+            UUID: The id of the charge covering the entry
+        """
+        charge = TollPaid(
+            zone_id=zone.zone_id,
+            amount=zone.charge_amount,
+            status="QUEUED",
+            created_at=at or datetime.utcnow()
+        )
+        db.session.add(charge)
+        db.session.flush()
+        entry.payment_id = charge.id
+        self.queued += 1
+        return charge.id
+
+    @staticmethod
+    def open_charge(driver_id, zone_id):
+        """
+        The id of the driver's newest charge for a zone that has not been
+        pushed yet (QUEUED or UNPAID), or None
+        """
+        row = db.session.query(TollPaid.id).join(
+            TollEntry, TollEntry.payment_id == TollPaid.id
+        ).filter(
+            TollEntry.user_id == driver_id,
+            TollPaid.zone_id == zone_id,
+            TollPaid.status.in_(("QUEUED", "UNPAID"))
+        ).order_by(TollPaid.created_at.desc()).first()
+        return row.id if row is not None else None
+
+    def dispatch_due(self, app):
+        """
+        Push every QUEUED charge. Must run inside an app context.
+
+        Returns:
+            int: Number of charges handed to the STK push workers
+        """
+        # Leave charges QUEUED while Daraja is down; the next sweep retries
+        if not mpesa_http.breaker.allows_request():
+            return 0
+
+        due = db.session.query(
+            TollPaid.id, TollPaid.amount, TollPaid.created_at, User.phone_number
+        ).join(
+            TollEntry, TollEntry.payment_id == TollPaid.id
+        ).join(
+            User, User.user_id == TollEntry.user_id
+        ).filter(
+            TollPaid.status == "QUEUED"
+        ).distinct().order_by(TollPaid.created_at).limit(self.batch_size).all()
+
+        claimed = []
+        for charge in due:
+            status = "PENDING" if charge.phone_number else "UNPAID"
+            won = TollPaid.query.filter(
+                TollPaid.id == charge.id,
+                TollPaid.status == "QUEUED"
+            ).update(
+                {TollPaid.status: status, TollPaid.phone_number: charge.phone_number},
+                synchronize_session=False
+            )
+            if not won:
+                continue
+            if charge.phone_number:
+                claimed.append(charge)
+            else:
+                self.unpaid += 1
+        db.session.commit()
+
+        dispatched = 0
+        for i, charge in enumerate(claimed):
+            try:
+                stk_dispatcher.submit(app, charge.id, phone_number=charge.phone_number, amount=charge.amount)
+            except DispatcherBusy:
+                # Hand the rest back to the next sweep
+                rest = [c.id for c in claimed[i:]]
+                TollPaid.query.filter(
+                    TollPaid.id.in_(rest),
+                    TollPaid.status == "PENDING",
+                    TollPaid.checkout_request_id.is_(None)
+                ).update({TollPaid.status: "QUEUED"}, synchronize_session=False)
+                db.session.commit()
+                self.deferred += len(rest)
+                break
+            dispatched += 1
+
+        self.dispatched += dispatched
+        return dispatched
+
+    def ensure_sweeper(self, app):
+        """Start this process's sweeper unless AUTO_CHARGE_SWEEP_SECONDS is 0"""
+        interval = app.config.get("AUTO_CHARGE_SWEEP_SECONDS", 0)
+        if not interval or self._pid == os.getpid():
+            return
+
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._thread = threading.Thread(
+                target=self._run, args=(app, interval), name="charge-sweeper", daemon=True
+            )
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def stats(self):
+        return {
+            "queued": self.queued,
+            "dispatched": self.dispatched,
+            "unpaid": self.unpaid,
+            "deferred": self.deferred,
+            "sweeps": self.sweeps,
+            "sweeper_running": self._pid == os.getpid()
+        }
+
+    def reset(self):
+        self.queued = self.dispatched = 0
+        self.unpaid = self.deferred = self.sweeps = 0
+
+    def _run(self, app, interval):
+        while True:
+            time.sleep(interval)
+            with app.app_context():
+                try:
+                    self.dispatch_due(app)
+                    self.sweeps += 1
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"❌ Automatic charge sweep failed: {str(e)}")
+                finally:
+                    db.session.remove()
+
+
+charge_pipeline = ChargePipeline()
@@ -21,11 +21,53 @@ class MpesaConfig:
     # Callback Base URL (from ngrok)
     BASE_URL = os.getenv("BASE_URL", "http://localhost:5000/payments/").rstrip("/") + "/"
     
-    # M-Pesa API URLs (Sandbox)
-    OAUTH_URL = "https://sandbox.safaricom.co.ke/oauth/v1/generate?grant_type=client_credentials"
-    STK_PUSH_URL = "https://sandbox.safaricom.co.ke/mpesa/stkpush/v1/processrequest"
-    C2B_REGISTER_URL = "https://sandbox.safaricom.co.ke/mpesa/c2b/v2/registerurl"
-    C2B_SIMULATE_URL = "https://sandbox.safaricom.co.ke/mpesa/c2b/v1/simulate"
+    # Refresh the cached OAuth token this many seconds before it expires
+    TOKEN_REFRESH_MARGIN_SECONDS = int(os.getenv("MPESA_TOKEN_REFRESH_MARGIN_SECONDS", "60"))
+    
+    # HTTP client: pooled keep-alive connections, timeouts in seconds
+    HTTP_POOL_SIZE = int(os.getenv("MPESA_HTTP_POOL_SIZE", "10"))
+    HTTP_CONNECT_TIMEOUT = float(os.getenv("MPESA_HTTP_CONNECT_TIMEOUT", "5"))
+    HTTP_READ_TIMEOUT = float(os.getenv("MPESA_HTTP_READ_TIMEOUT", "30"))
+    HTTP_MAX_RETRIES = int(os.getenv("MPESA_HTTP_MAX_RETRIES", "2"))
+    HTTP_BACKOFF_SECONDS = float(os.getenv("MPESA_HTTP_BACKOFF_SECONDS", "0.5"))
+    
+    # Circuit breaker and bulkhead around all Daraja calls (per process)
+    BREAKER_FAILURE_THRESHOLD = int(os.getenv("MPESA_BREAKER_FAILURE_THRESHOLD", "5"))
+    BREAKER_RESET_SECONDS = float(os.getenv("MPESA_BREAKER_RESET_SECONDS", "30"))
+    BULKHEAD_MAX_CONCURRENT = int(os.getenv("MPESA_BULKHEAD_MAX_CONCURRENT", "8"))
+    BULKHEAD_WAIT_SECONDS = float(os.getenv("MPESA_BULKHEAD_WAIT_SECONDS", "0"))
+    
+    # Background STK push workers per process and their queue bound
+    STK_PUSH_WORKERS = int(os.getenv("MPESA_STK_PUSH_WORKERS", "4"))
+    STK_PUSH_QUEUE_SIZE = int(os.getenv("MPESA_STK_PUSH_QUEUE_SIZE", "200"))
+    # Pushes that never reached Daraja (breaker open, no token) are retried this often
+    STK_PUSH_REQUEUE_SECONDS = float(os.getenv("MPESA_STK_PUSH_REQUEUE_SECONDS", "10"))
+    STK_PUSH_MAX_REQUEUES = int(os.getenv("MPESA_STK_PUSH_MAX_REQUEUES", "5"))
+    
+    # STK callback ingestion: "sync" commits each callback in the request,
+    # "batched" acknowledges at once and group-commits in the background
+    STK_CALLBACK_MODE = os.getenv("MPESA_STK_CALLBACK_MODE", "sync").lower()
+    STK_CALLBACK_BATCH_SIZE = int(os.getenv("MPESA_STK_CALLBACK_BATCH_SIZE", "200"))
+    STK_CALLBACK_FLUSH_SECONDS = float(os.getenv("MPESA_STK_CALLBACK_FLUSH_SECONDS", "0.2"))
+    
+    # C2B confirmations are always acknowledged at once and group-committed
+    C2B_CONFIRM_BATCH_SIZE = int(os.getenv("MPESA_C2B_CONFIRM_BATCH_SIZE", "200"))
+    C2B_CONFIRM_FLUSH_SECONDS = float(os.getenv("MPESA_C2B_CONFIRM_FLUSH_SECONDS", "0.2"))
+    
+    # Reconciler for PENDING payments whose callback never arrived
+    RECONCILE_AFTER_SECONDS = int(os.getenv("MPESA_RECONCILE_AFTER_SECONDS", "300"))
+    RECONCILE_BATCH_SIZE = int(os.getenv("MPESA_RECONCILE_BATCH_SIZE", "100"))
+    RECONCILE_CONCURRENCY = int(os.getenv("MPESA_RECONCILE_CONCURRENCY", "4"))
+    RECONCILE_QUERIES_PER_SECOND = float(os.getenv("MPESA_RECONCILE_QUERIES_PER_SECOND", "5"))
+    RECONCILE_INTERVAL_SECONDS = int(os.getenv("MPESA_RECONCILE_INTERVAL_SECONDS", "60"))
+    
+    # M-Pesa API URLs (Sandbox by default; point at a local stand-in for load tests)
+    API_BASE_URL = os.getenv("MPESA_API_BASE_URL", "https://sandbox.safaricom.co.ke").rstrip("/")
+    OAUTH_URL = f"{API_BASE_URL}/oauth/v1/generate?grant_type=client_credentials"
+    STK_PUSH_URL = f"{API_BASE_URL}/mpesa/stkpush/v1/processrequest"
+    STK_QUERY_URL = f"{API_BASE_URL}/mpesa/stkpushquery/v1/query"
+    C2B_REGISTER_URL = f"{API_BASE_URL}/mpesa/c2b/v2/registerurl"
+    C2B_SIMULATE_URL = f"{API_BASE_URL}/mpesa/c2b/v1/simulate"
     
     @classmethod
     def validate(cls):
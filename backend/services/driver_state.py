@@ -0,0 +1,161 @@
+"""
+Driver Geofence State
+File: backend/services/driver_state.py
+
+Responsibilities:
+- Track, per driver, the zones they are inside and their grace-period expiries
+- Warm from toll_entries once per process, then answer repeat pings from memory
+- Stay consistent with the database by writing through on every transition
+"""
+
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import or_
+from db import TollEntry
+
+
+GRACE_PERIOD = timedelta(minutes=30)
+
+
+class DriverState:
+    """
+    Geofence state for one driver.
+
+    open_entries:  {zone_id: entry_time} for entries without an exit
+    grace_until:   {zone_id: datetime} before which re-entry is not charged
+    last_event_at: latest entry or exit time known for the driver, or None
+    """
+
+    __slots__ = ("open_entries", "grace_until", "last_event_at", "loaded_at")
+
+    def __init__(self, loaded_at):
+        self.open_entries = {}
+        self.grace_until = {}
+        self.last_event_at = None
+        self.loaded_at = loaded_at
+
+    def is_inside(self, zone_id):
+        return zone_id in self.open_entries
+
+    def in_grace_period(self, zone_id, at):
+        expiry = self.grace_until.get(zone_id)
+        return expiry is not None and at < expiry
+
+    def enter(self, zone_id, at):
+        self.open_entries[zone_id] = at
+        self._saw(at)
+
+    def exit(self, zone_id, at, grace_period=GRACE_PERIOD):
+        self.open_entries.pop(zone_id, None)
+        self.grace_until[zone_id] = at + grace_period
+        self._saw(at)
+
+    def apply_entry(self, entry, grace_period=GRACE_PERIOD):
+        """Fold a TollEntry row into the state"""
+        if entry.exit_time is None:
+            self.open_entries[entry.zone_id] = entry.entry_time
+            self._saw(entry.entry_time)
+            return
+
+        self._saw(entry.exit_time)
+        expiry = entry.exit_time + grace_period
+        if expiry > self.grace_until.get(entry.zone_id, datetime.min):
+            self.grace_until[entry.zone_id] = expiry
+
+    def _saw(self, at):
+        if at is not None and (self.last_event_at is None or at > self.last_event_at):
+            self.last_event_at = at
+
+
+class DriverStateStore:
+    """
+    Process-wide map of driver_id -> DriverState.
+
+    The whole store is warmed with one query on first use. A driver's state
+    is re-read from the database once it is older than ttl_seconds, which
+    bounds drift when several workers write toll_entries for the same driver.
+    """
+
+    def __init__(self, grace_period=GRACE_PERIOD):
+        self.grace_period = grace_period
+        self._lock = threading.Lock()
+        self._states = {}
+        self._warmed_at = None
+
+    def get(self, driver_id, ttl_seconds):
+        """
+        Return the cached state for a driver, loading it when missing or stale
+
+        Args:
+            driver_id: UUID of the driver
+            ttl_seconds: Maximum age of a cached state before it is re-read
+
+        Returns:
+            DriverState
+        """
+        if self._warmed_at is None:
+            self.warm()
+
+        now = time.monotonic()
+        state = self._states.get(driver_id)
+        if state is not None and now - state.loaded_at < ttl_seconds:
+            return state
+
+        # Drivers absent from a fresh warm-up have no open or recent entries
+        if state is None and now - self._warmed_at < ttl_seconds:
+            state = DriverState(loaded_at=self._warmed_at)
+            self._states[driver_id] = state
+            return state
+
+        return self.reload(driver_id)
+
+    def reload(self, driver_id):
+        """Re-read one driver's open entries and recent exits from the database"""
+        loaded_at = time.monotonic()
+        state = DriverState(loaded_at=loaded_at)
+
+        for entry in self._relevant_entries(TollEntry.user_id == driver_id):
+            state.apply_entry(entry, self.grace_period)
+
+        self._states[driver_id] = state
+        return state
+
+    def warm(self):
+        """Load every driver with an open entry or a recent exit in one query"""
+        with self._lock:
+            if self._warmed_at is not None:
+                return
+
+            loaded_at = time.monotonic()
+            states = {}
+            for entry in self._relevant_entries():
+                state = states.get(entry.user_id)
+                if state is None:
+                    state = states[entry.user_id] = DriverState(loaded_at=loaded_at)
+                state.apply_entry(entry, self.grace_period)
+
+            self._states = states
+            self._warmed_at = loaded_at
+
+    def forget(self, driver_id):
+        """Drop a driver's cached state (e.g. after a failed commit)"""
+        self._states.pop(driver_id, None)
+
+    def reset(self):
+        with self._lock:
+            self._states = {}
+            self._warmed_at = None
+
+    def __len__(self):
+        return len(self._states)
+
+    def _relevant_entries(self, *criteria):
+        cutoff = datetime.utcnow() - self.grace_period
+        return TollEntry.query.filter(
+            or_(TollEntry.exit_time.is_(None), TollEntry.exit_time >= cutoff),
+            *criteria
+        ).all()
+
+
+driver_state_store = DriverStateStore()
@@ -5,14 +5,23 @@ Task: SCRUM-22 - Geo-fencing Logic
 
 Responsibilities:
 - Validate GPS coordinates
-- Detect zone entry using polygon
-- Prevent duplicate toll triggers
-- Record zone exit
+- Detect zone entry using polygon (via an STRtree spatial index)
+- Prevent duplicate toll triggers (from in-memory driver state)
+- Record zone exit (explicitly or from the driver's trajectory)
 """
 
 from datetime import datetime, timedelta
+from shapely import GEOSException, from_wkb
 from shapely.geometry import Point, Polygon
-from db import db, TollZone, TollPaid, TollEntry
+from shapely.geometry.polygon import orient
+from shapely.validation import explain_validity
+from flask import current_app
+from sqlalchemy import and_, or_
+from db import db, has_writes, TollZone, TollPaid, TollEntry, ZoneSetVersion
+from services.zone_index import ZoneIndex, ZoneSnapshot, zone_index_cache
+from services.driver_state import driver_state_store
+from services.trajectory import ENTRY, EXIT, PASS_THROUGH, trajectory_processor
+from services.charge_pipeline import charge_pipeline
 import json
 
 
@@ -29,7 +38,7 @@ class GeoFencingService:
         try:
             lat = float(latitude)
             lng = float(longitude)
-        except ValueError:
+        except (TypeError, ValueError):
             return False, "Latitude and longitude must be numbers"
 
         if lat < -90 or lat > 90:
@@ -41,10 +50,10 @@ class GeoFencingService:
         return True, None
 
     # --------------------------------------------------
-    # Point in Polygon Check
+    # Polygon Parsing
     # --------------------------------------------------
     @staticmethod
-    def is_point_in_polygon(lat, lng, polygon_coords):
+    def build_polygon(polygon_coords):
         """
         polygon_coords: Can be either:
         1. GeoJSON format: {"type": "Polygon", "coordinates": [[[lng, lat], ...]]}
@@ -76,15 +85,188 @@ class GeoFencingService:
                     coords = [(lng, lat) for lat, lng in coords]
                     print(f"⚠️  Auto-corrected reversed coordinates for polygon")
             
-            polygon = Polygon(coords)
-        else:
-            # Simple format: [{"lat": x, "lng": y}, ...]
-            coords = [(c["lng"], c["lat"]) for c in polygon_coords]
-            polygon = Polygon(coords)
-        
+            return Polygon(coords)
+
+        # Simple format: [{"lat": x, "lng": y}, ...]
+        coords = [(c["lng"], c["lat"]) for c in polygon_coords]
+        return Polygon(coords)
+
+    # --------------------------------------------------
+    # Canonical Zone Geometry
+    # --------------------------------------------------
+    @staticmethod
+    def normalize_polygon(polygon_coords):
+        """
+        Parse, validate and orient a zone polygon
+
+        Args:
+            polygon_coords: Any format accepted by build_polygon
+
+        Returns:
+            Polygon: Valid polygon with (lng, lat) axis order
+
+        Raises:
+            ValueError: If the coordinates do not describe a usable polygon
+        """
+        try:
+            polygon = GeoFencingService.build_polygon(polygon_coords)
+        except (ValueError, TypeError, KeyError, IndexError, GEOSException) as e:
+            raise ValueError(f"Invalid polygon_coords: {str(e)}")
+
+        if polygon.is_empty or polygon.area == 0:
+            raise ValueError("Invalid polygon_coords: polygon has no area")
+
+        min_lng, min_lat, max_lng, max_lat = polygon.bounds
+        if min_lat < -90 or max_lat > 90 or min_lng < -180 or max_lng > 180:
+            raise ValueError("Invalid polygon_coords: coordinates out of range")
+
+        if not polygon.is_valid:
+            raise ValueError(f"Invalid polygon_coords: {explain_validity(polygon)}")
+
+        return orient(polygon)
+
+    @staticmethod
+    def store_zone_geometry(zone, polygon_coords):
+        """
+        Normalize polygon_coords once and write the canonical forms onto the
+        zone: GeoJSON polygon_coords, WKB geometry and bbox columns
+        """
+        polygon = GeoFencingService.normalize_polygon(polygon_coords)
+        min_lng, min_lat, max_lng, max_lat = polygon.bounds
+
+        zone.polygon_coords = {
+            "type": "Polygon",
+            "coordinates": [[[lng, lat] for lng, lat in polygon.exterior.coords]]
+        }
+        zone.geometry_wkb = polygon.wkb
+        zone.min_lat = min_lat
+        zone.max_lat = max_lat
+        zone.min_lng = min_lng
+        zone.max_lng = max_lng
+        return polygon
+
+    @staticmethod
+    def zone_polygon(zone):
+        """Return a zone's polygon, from WKB when it has been normalized"""
+        if zone.geometry_wkb is not None:
+            return from_wkb(zone.geometry_wkb)
+        return GeoFencingService.build_polygon(zone.polygon_coords)
+
+    # --------------------------------------------------
+    # Point in Polygon Check
+    # --------------------------------------------------
+    @staticmethod
+    def is_point_in_polygon(lat, lng, polygon_coords):
+        """Check a single point against a polygon in any supported format"""
+        polygon = GeoFencingService.build_polygon(polygon_coords)
         point = Point(lng, lat)
         return polygon.contains(point) or polygon.touches(point)
 
+    # --------------------------------------------------
+    # Zone Index
+    # --------------------------------------------------
+    @staticmethod
+    def load_zone_snapshots(window=None):
+        """
+        Parse toll zones into detached ZoneSnapshot objects
+
+        Args:
+            window: Optional (min_lat, min_lng, max_lat, max_lng); only zones
+                    whose bounding box intersects it are loaded
+
+        Returns:
+            list: ZoneSnapshot objects
+        """
+        query = TollZone.query
+        if window is not None:
+            query = query.filter(GeoFencingService._bbox_intersects(*window))
+
+        return [
+            ZoneSnapshot(
+                zone_id=zone.zone_id,
+                zone_name=zone.zone_name,
+                charge_amount=zone.charge_amount,
+                polygon=GeoFencingService.zone_polygon(zone)
+            )
+            for zone in query.all()
+        ]
+
+    @staticmethod
+    def _bbox_intersects(min_lat, min_lng, max_lat, max_lng):
+        """
+        SQL condition for zones whose bbox intersects the window
+
+        Uses the GiST box index on Postgres and the B-tree bbox columns
+        elsewhere. Zones not yet backfilled (no bbox) always match.
+        """
+        if db.session.get_bind().dialect.name == "postgresql":
+            zone_box = db.func.box(
+                db.func.point(TollZone.min_lng, TollZone.min_lat),
+                db.func.point(TollZone.max_lng, TollZone.max_lat)
+            )
+            window_box = db.func.box(
+                db.func.point(min_lng, min_lat),
+                db.func.point(max_lng, max_lat)
+            )
+            overlaps = zone_box.op("&&")(window_box)
+        else:
+            overlaps = and_(
+                TollZone.min_lat <= max_lat,
+                TollZone.max_lat >= min_lat,
+                TollZone.min_lng <= max_lng,
+                TollZone.max_lng >= min_lng
+            )
+        return or_(overlaps, TollZone.min_lat.is_(None))
+
+    @staticmethod
+    def _build_zone_index():
+        """Build the full in-memory index, or None if the table is too large"""
+        max_zones = current_app.config.get("ZONE_CACHE_MAX_ZONES", 0)
+        if max_zones and TollZone.query.count() > max_zones:
+            return None
+
+        return ZoneIndex(
+            GeoFencingService.load_zone_snapshots(),
+            grid_cell_size=current_app.config.get("ZONE_GRID_CELL_DEGREES"),
+            grid_max_cells=current_app.config.get("ZONE_GRID_MAX_CELLS", 2_000_000)
+        )
+
+    @staticmethod
+    def get_cached_zone_index():
+        """
+        Return this worker's full ZoneIndex, rebuilding it when the zone-set
+        version in the database has moved past the cached one (in the
+        background unless ZONE_INDEX_BACKGROUND_REBUILD is off). None when
+        the zone table exceeds ZONE_CACHE_MAX_ZONES.
+        """
+        background = current_app.config.get("ZONE_INDEX_BACKGROUND_REBUILD", True)
+        return zone_index_cache.get(
+            builder=GeoFencingService._build_zone_index,
+            version_reader=ZoneSetVersion.current,
+            poll_seconds=current_app.config.get("ZONE_VERSION_POLL_SECONDS", 0),
+            app=current_app._get_current_object() if background else None
+        )
+
+    @staticmethod
+    def get_zone_index(window=None):
+        """
+        Return a ZoneIndex covering at least the given window
+
+        Uses the cached full index when the zone table fits in memory.
+        Otherwise builds a small index from the zones whose bbox intersects
+        the window, so only those polygons come over the wire.
+        """
+        index = GeoFencingService.get_cached_zone_index()
+        if index is not None:
+            return index
+        return ZoneIndex(GeoFencingService.load_zone_snapshots(window))
+
+    @staticmethod
+    def find_zone(latitude, longitude):
+        """Return the ZoneSnapshot containing the point, or None"""
+        window = (latitude, longitude, latitude, longitude)
+        return GeoFencingService.get_zone_index(window).find_zone(latitude, longitude)
+
     # --------------------------------------------------
     # Zone Entry Detection
     # --------------------------------------------------
@@ -99,62 +281,229 @@ class GeoFencingService:
             longitude: GPS longitude coordinate
             
         Returns:
-            dict: Contains zone info, payment trigger status, and message
-        """
-        active_zones = TollZone.query.all()
-
-        for zone in active_zones:
-            if GeoFencingService.is_point_in_polygon(
-                latitude, longitude, zone.polygon_coords
-            ):
-                # Check for active entry in THIS SPECIFIC ZONE (no exit yet)
-                existing_entry = TollEntry.query.filter_by(
-                    user_id=driver_id,
-                    zone_id=zone.zone_id,
-                    exit_time=None
-                ).first()
-
-                if existing_entry:
-                    return {
-                        "in_zone": True,
-                        "zone": zone,
-                        "should_trigger_payment": False,
-                        "message": "Driver already inside zone"
-                    }
-
-                # Check last exit from THIS ZONE (30-minute grace period rule)
-                recent_exit = TollEntry.query.filter(
-                    TollEntry.user_id == driver_id,
-                    TollEntry.zone_id == zone.zone_id,
-                    TollEntry.exit_time.isnot(None)
-                ).order_by(TollEntry.exit_time.desc()).first()
-
-                if recent_exit:
-                    time_diff = datetime.utcnow() - recent_exit.exit_time
-                    if time_diff < timedelta(minutes=30):
-                        return {
-                            "in_zone": True,
-                            "zone": zone,
-                            "should_trigger_payment": False,
-                            "message": "Recently exited zone — no duplicate charge"
-                        }
-
-                # Create new entry with zone_id
-                entry = TollEntry(
-                    user_id=driver_id,
-                    zone_id=zone.zone_id,
-                    entry_time=datetime.utcnow()
+            dict: Contains zone info, payment trigger status, message and
+                  the trajectory events detected since the previous fix
+        """
+        index = GeoFencingService.get_zone_index(
+            GeoFencingService._trajectory_window([(driver_id, latitude, longitude)])
+        )
+        zone = index.find_zone(latitude, longitude)
+
+        result = GeoFencingService._process_fix(
+            index, driver_id, zone, latitude, longitude, datetime.utcnow()
+        )
+        GeoFencingService._commit(driver_id)
+        return result
+
+    @staticmethod
+    def check_zone_entries(fixes):
+        """
+        Check a batch of driver fixes against the toll zones
+
+        All points are classified in one vectorized pass; trajectory and entry
+        detection then run per driver in timestamp order and the batch is
+        committed once.
+
+        Args:
+            fixes: List of dicts with driver_id (UUID), latitude, longitude
+                   and timestamp (naive UTC datetime). Timestamps come from
+                   the client and are clamped by _fix_time before use.
+
+        Returns:
+            list: One result dict per fix, in input order
+        """
+        if not fixes:
+            return []
+
+        index = GeoFencingService.get_zone_index(
+            GeoFencingService._trajectory_window(
+                [(fix["driver_id"], fix["latitude"], fix["longitude"]) for fix in fixes]
+            )
+        )
+        positions = index.classify_many(
+            [fix["latitude"] for fix in fixes],
+            [fix["longitude"] for fix in fixes]
+        )
+
+        skew = timedelta(seconds=current_app.config.get("FIX_MAX_CLOCK_SKEW_SECONDS", 60))
+        latest = datetime.utcnow() + skew
+
+        results = [None] * len(fixes)
+        order = sorted(
+            range(len(fixes)),
+            key=lambda i: (str(fixes[i]["driver_id"]), fixes[i]["timestamp"])
+        )
+        for i in order:
+            fix = fixes[i]
+            zone = index.zones[positions[i]] if positions[i] >= 0 else None
+            results[i] = GeoFencingService._process_fix(
+                index,
+                fix["driver_id"],
+                zone,
+                fix["latitude"],
+                fix["longitude"],
+                GeoFencingService._fix_time(fix["driver_id"], fix["timestamp"], latest)
+            )
+
+        GeoFencingService._commit(*{fix["driver_id"] for fix in fixes})
+        return results
+
+    @staticmethod
+    def _fix_time(driver_id, at, latest):
+        """
+        Clamp a client-supplied fix time to [driver's last known time, latest]
+
+        Entry times and the grace-period rule are decided on this time, so a
+        fix stamped before the driver's previous fix (or last recorded entry
+        or exit) must not reach back into an earlier grace window, and one
+        stamped in the future must not land in entry_time.
+        """
+        ttl = current_app.config.get("DRIVER_STATE_TTL_SECONDS", 300)
+        floor = driver_state_store.get(driver_id, ttl).last_event_at
+        previous = trajectory_processor.last_fix(driver_id)
+        if previous is not None and (floor is None or previous.at > floor):
+            floor = previous.at
+
+        if floor is not None and at < floor:
+            at = floor
+        return min(at, latest)
+
+    @staticmethod
+    def _trajectory_window(points):
+        """
+        Bounding box (min_lat, min_lng, max_lat, max_lng) of the given
+        (driver_id, lat, lng) points and each driver's previous fix
+        """
+        lats = []
+        lngs = []
+        for driver_id, latitude, longitude in points:
+            lats.append(latitude)
+            lngs.append(longitude)
+            previous = trajectory_processor.last_fix(driver_id)
+            if previous is not None:
+                lats.append(previous.latitude)
+                lngs.append(previous.longitude)
+        return min(lats), min(lngs), max(lats), max(lngs)
+
+    @staticmethod
+    def _process_fix(index, driver_id, zone, latitude, longitude, at):
+        """
+        Apply one fix: trajectory events since the previous fix first, then
+        the entry rules for the zone the fix lies in (if any). Does not commit.
+        """
+        max_gap = timedelta(seconds=current_app.config.get("TRAJECTORY_MAX_GAP_SECONDS", 600))
+        events = trajectory_processor.advance(
+            driver_id, latitude, longitude, at, index, max_gap=max_gap
+        )
+
+        entered_at = at
+        passed_through = None
+        for zone_event in events:
+            if zone_event.type == EXIT:
+                GeoFencingService._exit_zone(driver_id, zone_event.zone.zone_id, zone_event.exited_at)
+
+            elif zone_event.type == ENTRY:
+                if zone is not None and zone_event.zone.zone_id == zone.zone_id:
+                    entered_at = zone_event.entered_at
+
+            elif zone_event.type == PASS_THROUGH:
+                crossed = GeoFencingService._enter_zone(
+                    driver_id, zone_event.zone, zone_event.entered_at, commit=False
                 )
-                db.session.add(entry)
-                db.session.commit()
+                if crossed["should_trigger_payment"]:
+                    GeoFencingService._exit_zone(driver_id, zone_event.zone.zone_id, zone_event.exited_at)
+                    passed_through = passed_through or (zone_event, crossed.get("payment_id"))
+
+        if zone is not None:
+            result = GeoFencingService._enter_zone(driver_id, zone, entered_at, commit=False)
+        elif passed_through is not None:
+            crossed_event, payment_id = passed_through
+            result = {
+                "in_zone": False,
+                "zone": crossed_event.zone,
+                "should_trigger_payment": True,
+                "message": "Passed through toll zone — payment required"
+            }
+            if payment_id is not None:
+                result["payment_id"] = payment_id
+        else:
+            result = GeoFencingService._outside_result()
+
+        result["events"] = events
+        return result
+
+    @staticmethod
+    def _enter_zone(driver_id, zone, at, commit=True):
+        """
+        Apply the entry / duplicate-charge rules for a driver inside a zone
+
+        Repeat pings are answered from the in-memory driver state. Only a
+        candidate transition re-reads the driver from the database before
+        a new TollEntry is written (and the state updated to match).
+        """
+        ttl = current_app.config.get("DRIVER_STATE_TTL_SECONDS", 300)
+        state = driver_state_store.get(driver_id, ttl)
 
-                return {
-                    "in_zone": True,
-                    "zone": zone,
-                    "should_trigger_payment": True,
-                    "message": "Entered toll zone — payment required"
-                }
+        if not state.is_inside(zone.zone_id) and not state.in_grace_period(zone.zone_id, at):
+            state = driver_state_store.reload(driver_id)
+
+        # Active entry in THIS SPECIFIC ZONE (no exit yet)
+        if state.is_inside(zone.zone_id):
+            return {
+                "in_zone": True,
+                "zone": zone,
+                "should_trigger_payment": False,
+                "message": "Driver already inside zone"
+            }
+
+        # Last exit from THIS ZONE (30-minute grace period rule)
+        if state.in_grace_period(zone.zone_id, at):
+            return {
+                "in_zone": True,
+                "zone": zone,
+                "should_trigger_payment": False,
+                "message": "Recently exited zone — no duplicate charge"
+            }
+
+        # Create new entry with zone_id
+        entry = TollEntry(
+            user_id=driver_id,
+            zone_id=zone.zone_id,
+            entry_time=at
+        )
+        db.session.add(entry)
+        state.enter(zone.zone_id, at)
 
+        result = {
+            "in_zone": True,
+            "zone": zone,
+            "should_trigger_payment": True,
+            "message": "Entered toll zone — payment required"
+        }
+        if current_app.config.get("AUTO_CHARGE_ENABLED"):
+            result["payment_id"] = charge_pipeline.add_entry(entry, zone)
+            charge_pipeline.ensure_sweeper(current_app._get_current_object())
+
+        if commit:
+            GeoFencingService._commit(driver_id)
+        return result
+
+    @staticmethod
+    def _commit(*driver_ids):
+        """Commit, dropping cached state for the drivers if it fails"""
+        if not has_writes():
+            return  # nothing changed: skip the COMMIT round trip
+
+        try:
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            for driver_id in driver_ids:
+                driver_state_store.forget(driver_id)
+            raise
+
+    @staticmethod
+    def _outside_result():
         return {
             "in_zone": False,
             "zone": None,
@@ -166,24 +515,50 @@ class GeoFencingService:
     # Zone Exit Recording
     # --------------------------------------------------
     @staticmethod
-    def record_zone_exit(driver_id):
+    def record_zone_exit(driver_id, zone_id=None):
         """
-        Record when a driver exits their current toll zone
+        Record when a driver exits a toll zone
         
         Args:
             driver_id: UUID of the driver
+            zone_id: UUID of the zone being left; defaults to the zone of
+                     the driver's most recent open entry
             
         Returns:
             bool: True if exit was recorded, False if no active entry found
         """
+        if zone_id is None:
+            entry = TollEntry.query.filter_by(
+                user_id=driver_id,
+                exit_time=None
+            ).order_by(TollEntry.entry_time.desc()).first()
+
+            if not entry:
+                return False
+            zone_id = entry.zone_id
+
+        if not GeoFencingService._exit_zone(driver_id, zone_id, datetime.utcnow()):
+            return False
+
+        GeoFencingService._commit(driver_id)
+        return True
+
+    @staticmethod
+    def _exit_zone(driver_id, zone_id, at):
+        """Close the driver's open entry for one zone. Does not commit."""
         entry = TollEntry.query.filter_by(
             user_id=driver_id,
+            zone_id=zone_id,
             exit_time=None
-        ).first()
+        ).order_by(TollEntry.entry_time.desc()).first()
+
+        ttl = current_app.config.get("DRIVER_STATE_TTL_SECONDS", 300)
+        state = driver_state_store.get(driver_id, ttl)
 
         if not entry:
+            state.open_entries.pop(zone_id, None)
             return False
 
-        entry.exit_time = datetime.utcnow()
-        db.session.commit()
-        return True
\ No newline at end of file
+        entry.exit_time = max(at, entry.entry_time)
+        state.exit(zone_id, entry.exit_time, driver_state_store.grace_period)
+        return True
@@ -0,0 +1,197 @@
+"""
+M-Pesa HTTP Client
+File: backend/services/mpesa_http.py
+
+Responsibilities:
+- Keep one pooled, keep-alive requests.Session per process for Daraja traffic
+- Apply connect/read timeouts to every call
+- Retry idempotent calls with exponential backoff on transient failures
+- Guard every call with a circuit breaker and a per-process bulkhead
+"""
+
+import os
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import MaxRetryError, NewConnectionError
+from .config import MpesaConfig
+from .resilience import Bulkhead, CircuitBreaker
+
+
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+# Daraja also answers 500 for business-level errors; those mean Daraja is
+# up, so they do not count against the breaker. Any other 5xx does.
+DARAJA_BUSINESS_ERROR_CODES = frozenset({
+    "500.001.1001",  # The transaction is being processed (STK Query of an open push)
+})
+
+
+class MpesaHttpClient:
+    """
+    Thin wrapper around a pooled requests.Session.
+
+    The session is created lazily and re-created after a fork, so gunicorn
+    workers never share sockets with the master process.
+
+    Non-idempotent calls (STK push, C2B simulate) are only retried when the
+    connection could not be opened at all (connect timeout, refused, DNS
+    failure), since the request then never reached Daraja. Idempotent calls are also retried on read timeouts,
+    dropped connections and RETRY_STATUSES.
+
+    A call, retries included, first needs a bulkhead slot and the breaker's
+    permission; otherwise DependencyUnavailable is raised without touching
+    the network. Connection errors, timeouts and 5xx answers count as
+    breaker failures, except a 500 carrying one of
+    DARAJA_BUSINESS_ERROR_CODES.
+    """
+
+    def __init__(self, pool_size=None, connect_timeout=None, read_timeout=None,
+                 max_retries=None, backoff_seconds=None):
+        self.pool_size = pool_size or MpesaConfig.HTTP_POOL_SIZE
+        self.timeout = (
+            connect_timeout or MpesaConfig.HTTP_CONNECT_TIMEOUT,
+            read_timeout or MpesaConfig.HTTP_READ_TIMEOUT
+        )
+        self.max_retries = MpesaConfig.HTTP_MAX_RETRIES if max_retries is None else max_retries
+        self.backoff_seconds = (
+            MpesaConfig.HTTP_BACKOFF_SECONDS if backoff_seconds is None else backoff_seconds
+        )
+        self.retries = 0
+
+        self.breaker = CircuitBreaker(
+            "M-Pesa",
+            failure_threshold=MpesaConfig.BREAKER_FAILURE_THRESHOLD,
+            reset_seconds=MpesaConfig.BREAKER_RESET_SECONDS
+        )
+        self.bulkhead = Bulkhead(
+            "M-Pesa",
+            max_concurrent=MpesaConfig.BULKHEAD_MAX_CONCURRENT,
+            wait_seconds=MpesaConfig.BULKHEAD_WAIT_SECONDS
+        )
+
+        self._lock = threading.Lock()
+        self._session = None
+        self._pid = None
+
+    @property
+    def session(self):
+        if self._session is None or self._pid != os.getpid():
+            with self._lock:
+                if self._session is None or self._pid != os.getpid():
+                    self._session = self._new_session()
+                    self._pid = os.getpid()
+        return self._session
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def request(self, method, url, idempotent=None, **kwargs):
+        """
+        Send a request through the pooled session
+
+        Args:
+            method: HTTP method
+            url: Target URL
+            idempotent: Whether the call may be repeated safely. Defaults to
+                        True for IDEMPOTENT_METHODS.
+            **kwargs: Passed to requests.Session.request; timeout defaults
+                      to the client's (connect, read) pair
+
+        Returns:
+            requests.Response: The last response received
+
+        Raises:
+            requests.exceptions.RequestException: When every attempt failed
+            DependencyUnavailable: When the breaker is open or the bulkhead full
+        """
+        if idempotent is None:
+            idempotent = method.upper() in IDEMPOTENT_METHODS
+        kwargs.setdefault("timeout", self.timeout)
+
+        with self.bulkhead:
+            self.breaker.before_call()
+            try:
+                response = self._send(method, url, idempotent, kwargs)
+            except Exception:
+                # Also frees a half-open probe on unexpected errors
+                self.breaker.record_failure()
+                raise
+
+            if is_breaker_failure(response):
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            return response
+
+    def _send(self, method, url, idempotent, kwargs):
+        attempt = 0
+        while True:
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                if not (idempotent or connection_not_opened(e)) or attempt >= self.max_retries:
+                    raise
+            else:
+                if not idempotent or response.status_code not in RETRY_STATUSES \
+                        or attempt >= self.max_retries:
+                    return response
+
+            self.retries += 1
+            time.sleep(self.backoff_seconds * (2 ** attempt))
+            attempt += 1
+
+    def stats(self):
+        return {
+            "pool_size": self.pool_size,
+            "connect_timeout": self.timeout[0],
+            "read_timeout": self.timeout[1],
+            "max_retries": self.max_retries,
+            "retries": self.retries,
+            "breaker": self.breaker.stats(),
+            "bulkhead": self.bulkhead.stats()
+        }
+
+    def close(self):
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+            self._session = None
+            self._pid = None
+
+    def _new_session(self):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=self.pool_size)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+
+def connection_not_opened(error):
+    """True when a request failed before any of it was sent"""
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    reason = error.args[0] if error.args else None
+    if isinstance(reason, MaxRetryError):
+        reason = reason.reason
+    return isinstance(reason, NewConnectionError)
+
+
+def is_breaker_failure(response):
+    """True for 5xx answers other than Daraja's business-level 500s"""
+    if response.status_code < 500:
+        return False
+    if response.status_code == 500:
+        try:
+            body = response.json()
+        except ValueError:
+            return True
+        return not (isinstance(body, dict) and body.get("errorCode") in DARAJA_BUSINESS_ERROR_CODES)
+    return True
+
+
+mpesa_http = MpesaHttpClient()
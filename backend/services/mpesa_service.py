@@ -1,21 +1,91 @@
 import requests
 from requests.auth import HTTPBasicAuth
 import base64
+import threading
+import time
 from datetime import datetime
 from .config import MpesaConfig
+from .mpesa_http import mpesa_http
+from .resilience import DependencyUnavailable
+
+
+class StkPushNotSent(Exception):
+    """Raised when an STK push failed before the request reached Daraja"""
+
+
+class StkPushUnconfirmed(Exception):
+    """Raised when Daraja answered an STK push with a server error (it may still have acted on it)"""
 
 
 class MpesaService:
     """Service for M-Pesa API interactions"""
-    
-    @staticmethod
-    def get_access_token():
+
+    # OAuth token cache (shared by all threads in this process)
+    _token = None
+    _token_expires_at = 0.0
+    _token_lock = threading.Lock()
+    _token_hits = 0
+    _token_misses = 0
+
+    @classmethod
+    def get_access_token(cls):
         """
-        Get OAuth access token from M-Pesa API
+        Get OAuth access token, reusing the cached one until shortly before
+        it expires. Concurrent callers share a single refresh.
         
         Returns:
             str: Access token
         
+        Raises:
+            Exception: If token retrieval fails
+        """
+        token = cls._token
+        if token and time.monotonic() < cls._token_expires_at:
+            cls._token_hits += 1
+            return token
+
+        with cls._token_lock:
+            # Another thread may have refreshed while we waited
+            if cls._token and time.monotonic() < cls._token_expires_at:
+                cls._token_hits += 1
+                return cls._token
+
+            cls._token_misses += 1
+            token, expires_in = cls._fetch_access_token()
+            margin = MpesaConfig.TOKEN_REFRESH_MARGIN_SECONDS
+            cls._token = token
+            cls._token_expires_at = time.monotonic() + max(expires_in - margin, 0)
+            return token
+
+    @classmethod
+    def invalidate_access_token(cls):
+        """Forget the cached token (e.g. after a 401 from Daraja)"""
+        with cls._token_lock:
+            cls._token = None
+            cls._token_expires_at = 0.0
+
+    @classmethod
+    def reset_token_cache(cls):
+        cls.invalidate_access_token()
+        cls._token_hits = 0
+        cls._token_misses = 0
+
+    @classmethod
+    def token_cache_stats(cls):
+        return {
+            "hits": cls._token_hits,
+            "misses": cls._token_misses,
+            "cached": bool(cls._token) and time.monotonic() < cls._token_expires_at
+        }
+
+    @staticmethod
+    def _fetch_access_token():
+        """
+        Request a new OAuth access token from M-Pesa API
+        
+        Returns:
+            tuple: (access token, lifetime in seconds)
+        
         Raises:
             Exception: If token retrieval fails
         """
@@ -23,18 +93,18 @@ class MpesaService:
             raise Exception("M-Pesa credentials not configured")
         
         try:
-            response = requests.get(
+            response = mpesa_http.get(
                 MpesaConfig.OAUTH_URL,
                 auth=HTTPBasicAuth(
                     MpesaConfig.CONSUMER_KEY.strip(),
                     MpesaConfig.CONSUMER_SECRET.strip()
                 ),
-                headers={"Content-Type": "application/json"},
-                timeout=30
+                headers={"Content-Type": "application/json"}
             )
             
             response.raise_for_status()
-            return response.json()["access_token"]
+            data = response.json()
+            return data["access_token"], int(data.get("expires_in", 3599))
             
         except requests.exceptions.RequestException as e:
             raise Exception(f"Failed to get access token: {str(e)}")
@@ -51,9 +121,20 @@ class MpesaService:
             account_reference: Reference for the transaction
         
         Returns:
-            dict: M-Pesa API response
+            dict: M-Pesa API response (ResponseCode "0" when accepted)
+        
+        Raises:
+            StkPushNotSent: The access token could not be obtained
+            StkPushUnconfirmed: Daraja answered with a 5xx
+            DependencyUnavailable: The breaker or bulkhead refused the call
+            requests.exceptions.RequestException: The call itself failed
         """
-        access_token = MpesaService.get_access_token()
+        try:
+            access_token = MpesaService.get_access_token()
+        except DependencyUnavailable:
+            raise
+        except Exception as e:
+            raise StkPushNotSent(str(e))
         timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
         
         shortcode = str(MpesaConfig.STK_SHORTCODE)
@@ -80,13 +161,60 @@ class MpesaService:
             "Content-Type": "application/json"
         }
         
-        response = requests.post(
+        response = mpesa_http.post(
             MpesaConfig.STK_PUSH_URL,
             json=payload,
+            headers=headers
+        )
+        
+        if response.status_code == 401:
+            MpesaService.invalidate_access_token()
+        
+        if response.status_code >= 500:
+            raise StkPushUnconfirmed(f"Daraja answered {response.status_code}: {response.text[:200]}")
+        
+        return response.json()
+    
+    
+    @staticmethod
+    def stk_query(checkout_request_id):
+        """
+        Query the outcome of an STK Push
+        
+        Args:
+            checkout_request_id: CheckoutRequestID returned by stk_push
+        
+        Returns:
+            dict: M-Pesa API response. ResultCode "0" means paid, any other
+                  ResultCode is final; an errorCode means still processing.
+        """
+        access_token = MpesaService.get_access_token()
+        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+        password_str = f"{MpesaConfig.STK_SHORTCODE}{MpesaConfig.PASSKEY}{timestamp}"
+        
+        payload = {
+            "BusinessShortCode": str(MpesaConfig.STK_SHORTCODE),
+            "Password": base64.b64encode(password_str.encode()).decode(),
+            "Timestamp": timestamp,
+            "CheckoutRequestID": checkout_request_id
+        }
+        
+        headers = {
+            "Authorization": f"Bearer {access_token}",
+            "Content-Type": "application/json"
+        }
+        
+        # A status query can be repeated safely
+        response = mpesa_http.post(
+            MpesaConfig.STK_QUERY_URL,
+            json=payload,
             headers=headers,
-            timeout=30
+            idempotent=True
         )
         
+        if response.status_code == 401:
+            MpesaService.invalidate_access_token()
+        
         return response.json()
     
     
@@ -118,12 +246,45 @@ class MpesaService:
             "Content-Type": "application/json"
         }
         
-        response = requests.post(
+        response = mpesa_http.post(
             MpesaConfig.C2B_SIMULATE_URL,
             json=payload,
-            headers=headers,
-            timeout=30
+            headers=headers
         )
         
+        if response.status_code == 401:
+            MpesaService.invalidate_access_token()
+        
         response.raise_for_status()
-        return response.json()
\ No newline at end of file
+        return response.json()
+    
+    
+    @staticmethod
+    def register_c2b_urls():
+        """
+        Register C2B validation and confirmation URLs
+        
+        Returns:
+            dict: M-Pesa API response
+        """
+        access_token = MpesaService.get_access_token()
+        
+        payload = {
+            "ShortCode": MpesaConfig.C2B_SHORTCODE,
+            "ResponseType": "Completed",
+            "ConfirmationURL": f"{MpesaConfig.BASE_URL}c2b/confirm",
+            "ValidationURL": f"{MpesaConfig.BASE_URL}c2b/validate"
+        }
+        
+        # Re-registering the same URLs is harmless, so this may be retried
+        response = mpesa_http.post(
+            MpesaConfig.C2B_REGISTER_URL,
+            json=payload,
+            headers={"Authorization": f"Bearer {access_token}"},
+            idempotent=True
+        )
+        
+        if response.status_code == 401:
+            MpesaService.invalidate_access_token()
+        
+        return response.json()
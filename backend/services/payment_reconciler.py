@@ -0,0 +1,175 @@
+"""
+Payment Reconciler
+File: backend/services/payment_reconciler.py
+
+Responsibilities:
+- Find PENDING payments older than a threshold, in keyset-paginated batches
+- Ask Daraja for their outcome (STK Query) through a bounded, rate-limited pool
+- Apply the outcomes with one bulk UPDATE per status and one commit per batch
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from sqlalchemy import and_, or_
+from db import db, TollPaid
+from .config import MpesaConfig
+from .mpesa_service import MpesaService
+
+
+class RateLimiter:
+    """Spaces calls at least 1/rate seconds apart across threads"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0
+        self._lock = threading.Lock()
+        self._next = 0.0
+
+    def acquire(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+
+
+class PaymentReconciler:
+    """
+    Settles payments whose STK callback never arrived.
+
+    Rows queued for an STK push but never sent (no CheckoutRequestID after
+    the threshold, e.g. the worker died) are failed without asking Daraja.
+    A query that errors or reports the request as still processing leaves
+    the row PENDING for the next run. UNKNOWN rows (the push may have reached
+    Daraja but no CheckoutRequestID came back) cannot be queried and are
+    never failed automatically; each run reports how many there are.
+    """
+
+    def __init__(self, older_than_seconds=None, batch_size=None, concurrency=None,
+                 queries_per_second=None):
+        self.older_than = timedelta(seconds=(
+            MpesaConfig.RECONCILE_AFTER_SECONDS if older_than_seconds is None else older_than_seconds
+        ))
+        self.batch_size = batch_size or MpesaConfig.RECONCILE_BATCH_SIZE
+        self.concurrency = concurrency or MpesaConfig.RECONCILE_CONCURRENCY
+        self.queries_per_second = (
+            MpesaConfig.RECONCILE_QUERIES_PER_SECOND if queries_per_second is None else queries_per_second
+        )
+
+    def run_once(self):
+        """
+        Reconcile every payment that is PENDING and older than the threshold.
+        Must run inside an app context.
+
+        Returns:
+            dict: Counts and durations for the run
+        """
+        started = time.perf_counter()
+        cutoff = datetime.utcnow() - self.older_than
+        stats = {
+            "scanned": 0, "completed": 0, "failed": 0, "abandoned": 0,
+            "still_pending": 0, "errors": 0, "batches": 0, "unconfirmed": 0,
+            "query_seconds": 0.0, "write_seconds": 0.0
+        }
+
+        stats["abandoned"] = TollPaid.query.filter(
+            TollPaid.status == "PENDING",
+            TollPaid.checkout_request_id.is_(None),
+            TollPaid.created_at < cutoff
+        ).update({TollPaid.status: "FAILED"}, synchronize_session=False)
+        db.session.commit()
+
+        limiter = RateLimiter(self.queries_per_second)
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="reconcile") as pool:
+            for batch in self._pending_batches(cutoff):
+                stats["batches"] += 1
+                stats["scanned"] += len(batch)
+
+                t0 = time.perf_counter()
+                outcomes = list(pool.map(
+                    lambda row: self._query(limiter, row.checkout_request_id), batch
+                ))
+                stats["query_seconds"] += time.perf_counter() - t0
+
+                settled = {"COMPLETED": [], "FAILED": []}
+                for row, outcome in zip(batch, outcomes):
+                    if outcome in settled:
+                        settled[outcome].append(row.id)
+                    else:
+                        stats[outcome] += 1
+
+                t0 = time.perf_counter()
+                for status, ids in settled.items():
+                    if ids:
+                        TollPaid.query.filter(
+                            TollPaid.id.in_(ids),
+                            TollPaid.status == "PENDING"
+                        ).update({TollPaid.status: status}, synchronize_session=False)
+                db.session.commit()
+                stats["write_seconds"] += time.perf_counter() - t0
+
+                stats["completed"] += len(settled["COMPLETED"])
+                stats["failed"] += len(settled["FAILED"])
+
+        stats["unconfirmed"] = TollPaid.query.filter(TollPaid.status == "UNKNOWN").count()
+        stats["query_seconds"] = round(stats["query_seconds"], 3)
+        stats["write_seconds"] = round(stats["write_seconds"], 3)
+        stats["duration_s"] = round(time.perf_counter() - started, 3)
+        return stats
+
+    def run_forever(self, app, interval_seconds=None):
+        """Run a pass every interval_seconds (for a dedicated process)"""
+        interval = interval_seconds or MpesaConfig.RECONCILE_INTERVAL_SECONDS
+        while True:
+            with app.app_context():
+                try:
+                    print(f"🔁 Reconciled payments: {self.run_once()}")
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"❌ Payment reconciliation failed: {str(e)}")
+                finally:
+                    db.session.remove()
+            time.sleep(interval)
+
+    def _pending_batches(self, cutoff):
+        """Yield batches ordered by (created_at, id), resuming after the last key"""
+        last = None
+        while True:
+            query = db.session.query(
+                TollPaid.id, TollPaid.checkout_request_id, TollPaid.created_at
+            ).filter(
+                TollPaid.status == "PENDING",
+                TollPaid.checkout_request_id.isnot(None),
+                TollPaid.created_at < cutoff
+            )
+            if last is not None:
+                query = query.filter(or_(
+                    TollPaid.created_at > last.created_at,
+                    and_(TollPaid.created_at == last.created_at, TollPaid.id > last.id)
+                ))
+
+            batch = query.order_by(TollPaid.created_at, TollPaid.id).limit(self.batch_size).all()
+            if not batch:
+                return
+            yield batch
+            last = batch[-1]
+
+    @staticmethod
+    def _query(limiter, checkout_request_id):
+        """Return COMPLETED, FAILED, still_pending or errors for one payment"""
+        limiter.acquire()
+        try:
+            response = MpesaService.stk_query(checkout_request_id)
+        except Exception as e:
+            print(f"❌ STK query failed for {checkout_request_id}: {str(e)}")
+            return "errors"
+
+        result_code = response.get("ResultCode")
+        if result_code is None:
+            # e.g. errorCode 500.001.1001 "The transaction is being processed"
+            return "still_pending"
+        return "COMPLETED" if str(result_code) == "0" else "FAILED"
@@ -0,0 +1,165 @@
+"""
+Circuit Breaker and Bulkhead
+File: backend/services/resilience.py
+
+Responsibilities:
+- Stop calling a dependency that keeps failing, and probe it again after a pause
+- Cap concurrent calls to a dependency so it cannot tie up every worker thread
+- Count state changes and rejections for the stats endpoints
+"""
+
+import threading
+import time
+
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class DependencyUnavailable(Exception):
+    """Raised instead of calling a dependency that is failing or saturated"""
+
+
+class CircuitOpenError(DependencyUnavailable):
+    pass
+
+
+class BulkheadFullError(DependencyUnavailable):
+    pass
+
+
+class CircuitBreaker:
+    """
+    Classic three-state breaker.
+
+    closed:    calls pass; failure_threshold consecutive failures open it
+    open:      calls are rejected until reset_seconds have passed
+    half_open: up to half_open_max_calls probes pass; a success closes the
+               breaker, a failure opens it again
+    """
+
+    def __init__(self, name, failure_threshold=5, reset_seconds=30, half_open_max_calls=1):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.half_open_max_calls = half_open_max_calls
+
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+
+        self.rejected = 0
+        self.opened = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state()
+
+    def allows_request(self):
+        """Whether a call would be let through now, without reserving a probe"""
+        with self._lock:
+            state = self._current_state()
+            return state == CLOSED or (state == HALF_OPEN and self._probes < self.half_open_max_calls)
+
+    def before_call(self):
+        """
+        Reserve a call
+
+        Raises:
+            CircuitOpenError: If the breaker is open or its probes are taken
+        """
+        with self._lock:
+            state = self._current_state()
+            if state == CLOSED:
+                return
+            if state == HALF_OPEN and self._probes < self.half_open_max_calls:
+                self._probes += 1
+                return
+            self.rejected += 1
+
+        raise CircuitOpenError(f"{self.name} circuit is open, try again shortly")
+
+    def record_success(self):
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+            self._probes = 0
+
+    def record_failure(self):
+        with self._lock:
+            state = self._current_state()
+            self._failures += 1
+            if state == HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+                self._probes = 0
+                self.opened += 1
+
+    def reset(self):
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+            self._probes = 0
+            self.rejected = 0
+            self.opened = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "state": self._current_state(),
+                "consecutive_failures": self._failures,
+                "times_opened": self.opened,
+                "rejected": self.rejected
+            }
+
+    def _current_state(self):
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_seconds:
+            self._state = HALF_OPEN
+            self._probes = 0
+        return self._state
+
+
+class Bulkhead:
+    """Semaphore-bounded slot pool; waits up to wait_seconds for a slot"""
+
+    def __init__(self, name, max_concurrent=8, wait_seconds=0):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.wait_seconds = wait_seconds
+
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self.active = 0
+        self.peak = 0
+        self.rejected = 0
+
+    def __enter__(self):
+        acquired = self._slots.acquire(timeout=self.wait_seconds) if self.wait_seconds \
+            else self._slots.acquire(blocking=False)
+
+        with self._lock:
+            if not acquired:
+                self.rejected += 1
+                raise BulkheadFullError(
+                    f"Too many concurrent {self.name} calls ({self.max_concurrent}), try again shortly"
+                )
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        return self
+
+    def __exit__(self, *exc):
+        with self._lock:
+            self.active -= 1
+        self._slots.release()
+
+    def stats(self):
+        return {
+            "max_concurrent": self.max_concurrent,
+            "active": self.active,
+            "peak": self.peak,
+            "rejected": self.rejected
+        }
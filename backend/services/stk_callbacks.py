@@ -0,0 +1,138 @@
+"""
+STK Callback Ingestion
+File: backend/services/stk_callbacks.py
+
+Responsibilities:
+- Parse Daraja STK callbacks into compact records
+- Apply a batch of records to tolls_paid as at most two upserts
+- Own the process-wide batch writer used when callbacks are ingested in batches
+"""
+
+import uuid
+from collections import namedtuple
+from datetime import datetime
+from sqlalchemy import func
+from db import db, TollPaid
+from .batch_writer import BatchWriter
+from .config import MpesaConfig
+
+
+StkCallback = namedtuple("StkCallback", [
+    "checkout_request_id", "result_code", "result_desc",
+    "receipt_number", "phone_number", "amount"
+])
+
+
+def parse_stk_callback(data):
+    """
+    Extract the fields we store from a Daraja STK callback body
+
+    Args:
+        data: Parsed JSON body ({"Body": {"stkCallback": {...}}})
+
+    Returns:
+        StkCallback
+    """
+    callback_data = (data or {}).get("Body", {}).get("stkCallback", {})
+
+    metadata = {}
+    for item in callback_data.get("CallbackMetadata", {}).get("Item", []):
+        metadata[item.get("Name")] = item.get("Value")
+
+    phone_number = metadata.get("PhoneNumber")
+
+    return StkCallback(
+        checkout_request_id=callback_data.get("CheckoutRequestID"),
+        result_code=callback_data.get("ResultCode"),
+        result_desc=callback_data.get("ResultDesc"),
+        receipt_number=metadata.get("MpesaReceiptNumber"),
+        phone_number=str(phone_number) if phone_number is not None else None,
+        amount=metadata.get("Amount")
+    )
+
+
+def apply_stk_callbacks(callbacks):
+    """
+    Apply callbacks to tolls_paid without committing
+
+    Callbacks are upserted on checkout_request_id, one statement for
+    successes and one for failures. The matching payment is completed or
+    failed (a completed payment is never failed), and a row is inserted
+    when none exists yet, e.g. when the callback beats the STK worker;
+    the worker then folds it into its payment. When a batch holds several
+    callbacks for the same CheckoutRequestID a success is never undone by
+    a later failure.
+
+    Returns:
+        int: Number of payments touched
+    """
+    latest = {}
+    for callback in callbacks:
+        if not callback.checkout_request_id:
+            continue
+        previous = latest.get(callback.checkout_request_id)
+        if previous is None or previous.result_code != 0:
+            latest[callback.checkout_request_id] = callback
+
+    now = datetime.utcnow()
+    rows = {"COMPLETED": [], "FAILED": []}
+    for callback in latest.values():
+        status = "COMPLETED" if callback.result_code == 0 else "FAILED"
+        rows[status].append({
+            "id": uuid.uuid4(),
+            "zone_id": None,
+            "amount": int(callback.amount) if callback.amount else 0,
+            "checkout_request_id": callback.checkout_request_id,
+            "mpesa_receipt_number": callback.receipt_number,
+            "phone_number": callback.phone_number,
+            "status": status,
+            "created_at": now,
+            "updated_at": now
+        })
+
+    touched = 0
+    if rows["COMPLETED"]:
+        touched += db.session.execute(_callback_upsert(rows["COMPLETED"], "COMPLETED")).rowcount
+    if rows["FAILED"]:
+        touched += db.session.execute(_callback_upsert(rows["FAILED"], "FAILED")).rowcount
+    return touched
+
+
+def _callback_upsert(rows, status):
+    """INSERT ... ON CONFLICT (checkout_request_id) DO UPDATE for the active dialect"""
+    dialect = db.session.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f"No upsert for dialect {dialect}")
+
+    table = TollPaid.__table__
+    statement = insert(table).values(rows)
+
+    if status == "FAILED":
+        return statement.on_conflict_do_update(
+            index_elements=[table.c.checkout_request_id],
+            set_={"status": "FAILED", "updated_at": statement.excluded.updated_at},
+            where=table.c.status != "COMPLETED"
+        )
+
+    return statement.on_conflict_do_update(
+        index_elements=[table.c.checkout_request_id],
+        set_={
+            "status": "COMPLETED",
+            "updated_at": statement.excluded.updated_at,
+            "mpesa_receipt_number": statement.excluded.mpesa_receipt_number,
+            # Keep the number captured at push time if the callback has none
+            "phone_number": func.coalesce(statement.excluded.phone_number, table.c.phone_number)
+        }
+    )
+
+
+stk_callback_writer = BatchWriter(
+    "stk-callbacks",
+    apply_stk_callbacks,
+    batch_size=MpesaConfig.STK_CALLBACK_BATCH_SIZE,
+    flush_seconds=MpesaConfig.STK_CALLBACK_FLUSH_SECONDS
+)
@@ -0,0 +1,299 @@
+"""
+STK Push Dispatcher
+File: backend/services/stk_dispatcher.py
+
+Responsibilities:
+- Run STK push calls on a bounded pool of background workers
+- Record the Daraja outcome on the PENDING TollPaid row created by the request
+- Retry pushes that never reached Daraja; never fail one that may have
+- Reject new work when the queue is full instead of blocking web workers
+"""
+
+import os
+import queue
+import threading
+from collections import namedtuple
+from datetime import datetime
+import requests
+from sqlalchemy.exc import IntegrityError
+from db import db, TollPaid, TollPaidDuplicate
+from .config import MpesaConfig
+from .mpesa_http import connection_not_opened
+from .mpesa_service import MpesaService, StkPushNotSent
+from .resilience import DependencyUnavailable
+
+
+StkPushJob = namedtuple(
+    "StkPushJob", ["app", "payment_id", "phone_number", "amount", "account_reference", "attempt"],
+    defaults=(0,)
+)
+
+# Outcomes of one push attempt
+ACCEPTED = "accepted"
+REJECTED = "rejected"    # Daraja said no: nothing was charged
+NOT_SENT = "not_sent"    # never reached Daraja: safe to send again
+UNCONFIRMED = "unconfirmed"  # may have reached Daraja: must not be sent again
+
+
+class DispatcherBusy(Exception):
+    """Raised when the STK push queue is full"""
+
+
+class StkPushDispatcher:
+    """
+    Bounded queue of STK push jobs drained by a fixed set of daemon threads.
+
+    Workers start on first submit and are re-started after a fork, so each
+    gunicorn worker owns its own pool. A job only ever touches the payment
+    row it was created for, and only while it is PENDING without a
+    CheckoutRequestID:
+
+    - accepted: the CheckoutRequestID is stored; the callback (or the
+      reconciler) completes the payment
+    - rejected by Daraja: the row is FAILED and may be pushed again
+    - never sent (breaker open, bulkhead full, no token, connect timeout):
+      the job is retried after requeue_seconds, up to max_requeues times,
+      then FAILED
+    - unconfirmed (read timeout, dropped connection, 5xx): Daraja may have
+      sent the prompt, so the row becomes UNKNOWN. It is never pushed again
+      automatically; the reconciler reports it for follow-up.
+    """
+
+    def __init__(self, workers=None, queue_size=None, requeue_seconds=None, max_requeues=None):
+        self.workers = workers or MpesaConfig.STK_PUSH_WORKERS
+        self.queue_size = queue_size or MpesaConfig.STK_PUSH_QUEUE_SIZE
+        self.requeue_seconds = (
+            MpesaConfig.STK_PUSH_REQUEUE_SECONDS if requeue_seconds is None else requeue_seconds
+        )
+        self.max_requeues = MpesaConfig.STK_PUSH_MAX_REQUEUES if max_requeues is None else max_requeues
+
+        self._lock = threading.Lock()
+        self._queue = None
+        self._threads = []
+        self._pid = None
+
+        self.submitted = 0
+        self.accepted = 0
+        self.failed = 0
+        self.requeued = 0
+        self.unconfirmed = 0
+        self.rejected = 0
+
+    def submit(self, app, payment_id, phone_number, amount, account_reference="TollPayment"):
+        """
+        Queue an STK push for an existing PENDING payment
+
+        Args:
+            app: Flask app the worker should run the job under
+            payment_id: UUID of the TollPaid row
+            phone_number: Customer phone number (254XXXXXXXXX)
+            amount: Amount to charge
+            account_reference: Reference for the transaction
+
+        Raises:
+            DispatcherBusy: If the queue is full
+        """
+        self._ensure_started()
+        job = StkPushJob(app, payment_id, phone_number, amount, account_reference)
+
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            self.rejected += 1
+            raise DispatcherBusy("Payment queue is full, try again shortly")
+
+        self.submitted += 1
+
+    def join(self):
+        """Block until every queued job has been processed"""
+        if self._queue is not None:
+            self._queue.join()
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "queue_size": self.queue_size,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "submitted": self.submitted,
+            "accepted": self.accepted,
+            "failed": self.failed,
+            "requeued": self.requeued,
+            "unconfirmed": self.unconfirmed,
+            "rejected": self.rejected
+        }
+
+    def shutdown(self):
+        """Stop the workers after the jobs already queued"""
+        with self._lock:
+            if self._queue is not None and self._pid == os.getpid():
+                for _ in self._threads:
+                    self._queue.put(None)
+                for thread in self._threads:
+                    thread.join()
+            self._queue = None
+            self._threads = []
+            self._pid = None
+
+    def _ensure_started(self):
+        if self._pid == os.getpid():
+            return
+
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+
+            self._queue = queue.Queue(maxsize=self.queue_size)
+            self._threads = [
+                threading.Thread(target=self._run, args=(self._queue,), name=f"stk-push-{i}", daemon=True)
+                for i in range(self.workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+            self._pid = os.getpid()
+
+    def _run(self, jobs):
+        while True:
+            job = jobs.get()
+            try:
+                if job is None:
+                    return
+                self._process(job)
+            finally:
+                jobs.task_done()
+
+    def _process(self, job):
+        with job.app.app_context():
+            try:
+                # Skip jobs whose row moved on meanwhile (e.g. a requeued
+                # job the reconciler already gave up on)
+                still_pending = TollPaid.query.filter(
+                    TollPaid.id == job.payment_id,
+                    TollPaid.status == "PENDING",
+                    TollPaid.checkout_request_id.is_(None)
+                ).count()
+                if not still_pending:
+                    return
+
+                outcome, response = self._push(job)
+
+                if outcome == ACCEPTED:
+                    self._record_checkout(job.payment_id, response.get("CheckoutRequestID"))
+                    self.accepted += 1
+                elif outcome == NOT_SENT and job.attempt < self.max_requeues:
+                    self._requeue(job)
+                elif outcome == UNCONFIRMED:
+                    self._set_status(job.payment_id, "UNKNOWN")
+                    self.unconfirmed += 1
+                    print(f"⚠️  STK push outcome unknown for payment {job.payment_id}: {response}")
+                else:
+                    self._set_status(job.payment_id, "FAILED")
+                    self.failed += 1
+                    print(f"❌ STK push {outcome} for payment {job.payment_id}: {response}")
+
+            except Exception as e:
+                db.session.rollback()
+                print(f"❌ Error recording STK push for payment {job.payment_id}: {str(e)}")
+            finally:
+                db.session.remove()
+
+    @staticmethod
+    def _push(job):
+        """Call Daraja once and classify the result as (outcome, response or error)"""
+        try:
+            response = MpesaService.stk_push(
+                phone_number=job.phone_number,
+                amount=job.amount,
+                account_reference=job.account_reference
+            )
+        except (DependencyUnavailable, StkPushNotSent) as e:
+            return NOT_SENT, str(e)
+        except requests.exceptions.RequestException as e:
+            if connection_not_opened(e):
+                return NOT_SENT, str(e)
+            return UNCONFIRMED, str(e)
+        except Exception as e:
+            # Read timeouts, dropped connections, 5xx, unparseable bodies
+            return UNCONFIRMED, str(e)
+
+        if response.get("ResponseCode") == "0":
+            return ACCEPTED, response
+        return REJECTED, response
+
+    def _requeue(self, job):
+        """Send a job that never reached Daraja again after requeue_seconds"""
+        def put_back():
+            try:
+                self._ensure_started()
+                self._queue.put_nowait(job._replace(attempt=job.attempt + 1))
+            except queue.Full:
+                with job.app.app_context():
+                    self._set_status(job.payment_id, "FAILED")
+                    db.session.remove()
+                self.failed += 1
+
+        self.requeued += 1
+        timer = threading.Timer(self.requeue_seconds, put_back)
+        timer.daemon = True
+        timer.start()
+
+    @staticmethod
+    def _set_status(payment_id, status):
+        """Move the row on, unless a callback or the reconciler got there first"""
+        TollPaid.query.filter(
+            TollPaid.id == payment_id,
+            TollPaid.status == "PENDING",
+            TollPaid.checkout_request_id.is_(None)
+        ).update({TollPaid.status: status}, synchronize_session=False)
+        db.session.commit()
+
+    def _record_checkout(self, payment_id, checkout_request_id):
+        # The callback can land between the lookup for an early row and our
+        # commit; the unique index then rejects us and the retry adopts it
+        for attempt in range(2):
+            payment = db.session.get(TollPaid, payment_id)
+            if payment is None:
+                return
+            self._adopt_early_callback(payment, checkout_request_id)
+            payment.checkout_request_id = checkout_request_id
+            try:
+                db.session.commit()
+                return
+            except IntegrityError:
+                db.session.rollback()
+                if attempt:
+                    raise
+
+    @staticmethod
+    def _adopt_early_callback(payment, checkout_request_id):
+        """
+        Fold in a row the callback inserted before we stored the
+        CheckoutRequestID, so the payment id the client polls stays valid
+        and the unique index on checkout_request_id holds. The folded row
+        moves to tolls_paid_duplicates.
+        """
+        early = TollPaid.query.filter_by(checkout_request_id=checkout_request_id).first()
+        if early is None or early.id == payment.id:
+            return
+
+        payment.status = early.status
+        payment.mpesa_receipt_number = early.mpesa_receipt_number
+        payment.phone_number = early.phone_number or payment.phone_number
+
+        # Keep Daraja's record the way duplicate rows are kept
+        db.session.add(TollPaidDuplicate(
+            id=early.id,
+            zone_id=early.zone_id,
+            amount=early.amount,
+            checkout_request_id=early.checkout_request_id,
+            mpesa_receipt_number=early.mpesa_receipt_number,
+            phone_number=early.phone_number,
+            status=early.status,
+            created_at=early.created_at,
+            duplicate_of=payment.id,
+            archived_at=datetime.utcnow()
+        ))
+        db.session.delete(early)
+        db.session.flush()
+
+
+stk_dispatcher = StkPushDispatcher()
@@ -0,0 +1,136 @@
+"""
+Trajectory Processor
+File: backend/services/trajectory.py
+
+Responsibilities:
+- Remember each driver's previous fix
+- Test the segment between consecutive fixes against nearby zone polygons
+- Emit entry, exit and pass-through events with interpolated crossing times
+"""
+
+import threading
+from collections import namedtuple
+from datetime import timedelta
+from shapely.geometry import LineString, Point
+
+
+ENTRY = "entry"
+EXIT = "exit"
+PASS_THROUGH = "pass_through"
+
+Fix = namedtuple("Fix", ["latitude", "longitude", "at"])
+
+# entered_at / exited_at are None when the event has no such crossing
+ZoneEvent = namedtuple("ZoneEvent", ["type", "zone", "entered_at", "exited_at"])
+
+
+class TrajectoryProcessor:
+    """
+    Turns consecutive fixes of a driver into zone crossing events.
+
+    Only zones whose bounding box touches the segment are evaluated. When
+    two fixes are further apart than max_gap the straight segment between
+    them is not trusted: entries and exits are stamped with the fix time
+    and pass-throughs are not inferred.
+    """
+
+    def __init__(self, max_gap=timedelta(minutes=10)):
+        self.max_gap = max_gap
+        self._lock = threading.Lock()
+        self._last_fix = {}
+
+    def advance(self, driver_id, latitude, longitude, at, index, max_gap=None):
+        """
+        Record a new fix for the driver and return the events it implies
+
+        Args:
+            driver_id: UUID of the driver
+            latitude: GPS latitude coordinate
+            longitude: GPS longitude coordinate
+            at: Naive UTC datetime of the fix
+            index: ZoneIndex to test the segment against
+            max_gap: Overrides the processor's max_gap for this call
+
+        Returns:
+            list: ZoneEvent objects ordered by time
+        """
+        current = Fix(latitude, longitude, at)
+
+        with self._lock:
+            previous = self._last_fix.get(driver_id)
+            # Out-of-order fixes never move the trajectory backwards
+            if previous is not None and at < previous.at:
+                return []
+            self._last_fix[driver_id] = current
+
+        if previous is None or (previous.latitude, previous.longitude) == (latitude, longitude):
+            return []
+
+        return self.segment_events(previous, current, index, max_gap)
+
+    def segment_events(self, previous, current, index, max_gap=None):
+        """Classify the segment previous -> current against candidate zones"""
+        start = Point(previous.longitude, previous.latitude)
+        end = Point(current.longitude, current.latitude)
+        segment = LineString([start, end])
+        trusted = current.at - previous.at <= (max_gap or self.max_gap)
+
+        events = []
+        for zone in index.candidates_for_geometry(segment):
+            was_inside = zone.polygon.intersects(start)
+            is_inside = zone.polygon.intersects(end)
+
+            if was_inside and is_inside:
+                continue
+
+            if is_inside:
+                entered_at = current.at
+                if trusted:
+                    entered_at, _ = self._crossing_times(zone, segment, previous, current)
+                events.append(ZoneEvent(ENTRY, zone, entered_at, None))
+
+            elif was_inside:
+                exited_at = current.at
+                if trusted:
+                    _, exited_at = self._crossing_times(zone, segment, previous, current)
+                events.append(ZoneEvent(EXIT, zone, None, exited_at))
+
+            elif trusted and zone.polygon.intersects(segment):
+                entered_at, exited_at = self._crossing_times(zone, segment, previous, current)
+                events.append(ZoneEvent(PASS_THROUGH, zone, entered_at, exited_at))
+
+        events.sort(key=lambda event: event.entered_at or event.exited_at)
+        return events
+
+    def last_fix(self, driver_id):
+        """Return the driver's previous Fix, or None"""
+        return self._last_fix.get(driver_id)
+
+    def forget(self, driver_id):
+        with self._lock:
+            self._last_fix.pop(driver_id, None)
+
+    def reset(self):
+        with self._lock:
+            self._last_fix = {}
+
+    @staticmethod
+    def _crossing_times(zone, segment, previous, current):
+        """
+        Interpolate when the segment first enters and last leaves the zone,
+        assuming constant speed between the two fixes
+        """
+        overlap = zone.polygon.intersection(segment)
+        fractions = [
+            segment.project(Point(coord), normalized=True)
+            for part in getattr(overlap, "geoms", [overlap])
+            for coord in part.coords
+        ]
+        elapsed = current.at - previous.at
+        return (
+            previous.at + elapsed * min(fractions),
+            previous.at + elapsed * max(fractions)
+        )
+
+
+trajectory_processor = TrajectoryProcessor()
@@ -0,0 +1,125 @@
+"""
+Zone Coverage Grid
+File: backend/services/zone_grid.py
+
+Responsibilities:
+- Split the plane into fixed lat/lng cells and classify each cell near a zone
+  as fully inside a zone or on a zone boundary
+- Answer interior and exterior pings with a dict lookup
+- Leave only boundary cells to the exact point-in-polygon test
+"""
+
+import math
+import numpy as np
+from shapely import box, contains, intersects
+
+
+INTERIOR = 0
+BOUNDARY = 1
+
+
+class GridTooLarge(ValueError):
+    """Raised when the zones would need more cells than allowed"""
+
+
+class ZoneGrid:
+    """
+    Fixed lat/lng grid over zone polygons.
+
+    cells maps (col, row) -> (INTERIOR, zone_position) or
+    (BOUNDARY, zone_positions). Cells that are absent lie outside every zone.
+    Zone positions refer to the zone list the grid was built from, and on
+    overlap the lowest position wins, matching ZoneIndex.find_zone.
+    """
+
+    def __init__(self, polygons, cell_size, max_cells=2_000_000):
+        if cell_size <= 0:
+            raise ValueError("cell_size must be positive")
+
+        self.cell_size = cell_size
+        self.cells = {}
+        self.lookups = 0
+        self.exact_checks = 0
+
+        self._build(polygons, max_cells)
+
+    def cell_of(self, lat, lng):
+        return (math.floor(lng / self.cell_size), math.floor(lat / self.cell_size))
+
+    def lookup(self, lat, lng):
+        """
+        Return the grid's answer for a point
+
+        Returns:
+            tuple: (INTERIOR, position) when the cell decides the zone,
+                   (BOUNDARY, positions) when an exact test is still needed,
+                   None when the point is outside every zone
+        """
+        self.lookups += 1
+        cell = self.cells.get(self.cell_of(lat, lng))
+        if cell is not None and cell[0] == BOUNDARY:
+            self.exact_checks += 1
+        return cell
+
+    def stats(self):
+        interior = sum(1 for kind, _ in self.cells.values() if kind == INTERIOR)
+        return {
+            "cell_size": self.cell_size,
+            "cells": len(self.cells),
+            "interior_cells": interior,
+            "boundary_cells": len(self.cells) - interior,
+            "lookups": self.lookups,
+            "exact_checks": self.exact_checks,
+            "hit_rate": self.hit_rate()
+        }
+
+    def hit_rate(self):
+        """Share of lookups answered without an exact polygon test"""
+        if not self.lookups:
+            return None
+        return round(1 - self.exact_checks / self.lookups, 4)
+
+    def _build(self, polygons, max_cells):
+        size = self.cell_size
+
+        ranges = []
+        total = 0
+        for polygon in polygons:
+            min_x, min_y, max_x, max_y = polygon.bounds
+            cols = np.arange(math.floor(min_x / size), math.floor(max_x / size) + 1)
+            rows = np.arange(math.floor(min_y / size), math.floor(max_y / size) + 1)
+            ranges.append((cols, rows))
+            total += len(cols) * len(rows)
+
+        if total > max_cells:
+            raise GridTooLarge(f"Zones need {total} grid cells (limit {max_cells})")
+
+        interior = {}
+        boundary = {}
+        for position, (polygon, (cols, rows)) in enumerate(zip(polygons, ranges)):
+            col_grid, row_grid = np.meshgrid(cols, rows)
+            col_grid = col_grid.ravel()
+            row_grid = row_grid.ravel()
+            cell_boxes = box(
+                col_grid * size, row_grid * size,
+                (col_grid + 1) * size, (row_grid + 1) * size
+            )
+
+            inside = contains(polygon, cell_boxes)
+            touching = intersects(polygon, cell_boxes) & ~inside
+
+            for col, row in zip(col_grid[inside].tolist(), row_grid[inside].tolist()):
+                interior.setdefault((col, row), position)
+            for col, row in zip(col_grid[touching].tolist(), row_grid[touching].tolist()):
+                boundary.setdefault((col, row), []).append(position)
+
+        for key, position in interior.items():
+            earlier = [p for p in boundary.get(key, ()) if p < position]
+            if earlier:
+                self.cells[key] = (BOUNDARY, earlier + [position])
+            else:
+                self.cells[key] = (INTERIOR, position)
+
+        for key, positions in boundary.items():
+            if key not in interior:
+                self.cells[key] = (BOUNDARY, positions)
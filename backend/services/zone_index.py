@@ -0,0 +1,245 @@
+"""
+Zone Spatial Index
+File: backend/services/zone_index.py
+
+Responsibilities:
+- Hold an in-process STRtree over prepared toll zone polygons
+- Narrow each location ping to the zones whose bounding box contains it
+- Run the exact point-in-polygon test only on those candidates
+- Optionally precompute a coverage grid that answers most points by lookup
+"""
+
+import threading
+import time
+import numpy as np
+from shapely import STRtree, intersects_xy, points, prepare
+from shapely.geometry import Point
+from services.zone_grid import INTERIOR, GridTooLarge, ZoneGrid
+
+
+class ZoneSnapshot:
+    """
+    Detached, read-only view of a toll zone.
+
+    Exposes the same attributes the routes read from a TollZone
+    (zone_id, zone_name, charge_amount) so it can be returned in its place.
+    """
+
+    __slots__ = ("zone_id", "zone_name", "charge_amount", "polygon")
+
+    def __init__(self, zone_id, zone_name, charge_amount, polygon):
+        self.zone_id = zone_id
+        self.zone_name = zone_name
+        self.charge_amount = charge_amount
+        self.polygon = polygon
+
+    def __repr__(self):
+        return f"<ZoneSnapshot {self.zone_name}>"
+
+
+class ZoneIndex:
+    """
+    STRtree over zone polygons, built once and queried per ping.
+
+    With grid_cell_size set, a ZoneGrid is precomputed as well so that
+    points in interior or exterior cells skip the tree and polygon tests.
+    """
+
+    def __init__(self, snapshots, grid_cell_size=None, grid_max_cells=2_000_000):
+        self.zones = list(snapshots)
+
+        polygons = [zone.polygon for zone in self.zones]
+        for polygon in polygons:
+            prepare(polygon)
+
+        self._polygons = np.array(polygons, dtype=object)
+        self._tree = STRtree(polygons)
+
+        self.grid = None
+        if grid_cell_size:
+            try:
+                self.grid = ZoneGrid(polygons, grid_cell_size, grid_max_cells)
+            except GridTooLarge as e:
+                print(f"⚠️  Zone grid disabled: {str(e)}")
+
+    def __len__(self):
+        return len(self.zones)
+
+    def candidates(self, lat, lng):
+        """Return zones whose bounding box contains the point, in zone order"""
+        hits = self._tree.query(Point(lng, lat))
+        return [self.zones[i] for i in sorted(hits)]
+
+    def candidates_for_geometry(self, geometry):
+        """Return zones whose bounding box intersects the geometry's, in zone order"""
+        return [self.zones[i] for i in sorted(self._tree.query(geometry))]
+
+    def find_zone(self, lat, lng):
+        """
+        Return the first zone containing (or touching) the point.
+
+        Zones keep the order they were loaded in, so overlapping zones
+        resolve the same way the old linear scan did.
+        """
+        point = Point(lng, lat)
+
+        if self.grid is not None:
+            cell = self.grid.lookup(lat, lng)
+            if cell is None:
+                return None
+            kind, positions = cell
+            if kind == INTERIOR:
+                return self.zones[positions]
+            for i in positions:
+                if self._polygons[i].intersects(point):
+                    return self.zones[i]
+            return None
+
+        for i in sorted(self._tree.query(point)):
+            zone = self.zones[i]
+            if zone.polygon.intersects(point):
+                return zone
+        return None
+
+    def classify_many(self, lats, lngs):
+        """
+        Classify many points in one vectorized pass.
+
+        Args:
+            lats: Sequence of latitudes
+            lngs: Sequence of longitudes (same length as lats)
+
+        Returns:
+            numpy.ndarray: Position in self.zones of the first zone containing
+            each point, or -1 when the point is outside every zone
+        """
+        lats = np.asarray(lats, dtype=float)
+        lngs = np.asarray(lngs, dtype=float)
+        no_zone = len(self.zones)
+        result = np.full(len(lats), no_zone, dtype=np.int64)
+
+        if len(lats) and no_zone:
+            # Bounding-box candidates as (point, zone) pairs
+            point_idx, zone_idx = self._tree.query(points(lngs, lats))
+            if len(point_idx):
+                hit = intersects_xy(
+                    self._polygons[zone_idx], lngs[point_idx], lats[point_idx]
+                )
+                np.minimum.at(result, point_idx[hit], zone_idx[hit])
+
+        result[result == no_zone] = -1
+        return result
+
+
+# --------------------------------------------------
+# Process-wide index
+# --------------------------------------------------
+_NOT_BUILT = object()
+
+
+class ZoneIndexCache:
+    """
+    Per-process ZoneIndex keyed by the zone-set version.
+
+    Zone edits bump ZoneSetVersion in the database. Each worker compares
+    that version (at most once per poll interval) with the one its index
+    was built from and swaps in a freshly built index when they differ.
+    Readers always see either the old or the new index, never a partial one.
+
+    Only the first build blocks the caller. Given an app, later rebuilds
+    run on a background thread while the old index keeps answering, so a
+    zone edit never stalls pings behind a grid rebuild.
+
+    The builder may return None to signal that the zone set is too large
+    to hold in memory; that answer is cached per version like an index.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._current = (_NOT_BUILT, None)  # (index, version) swapped as one unit
+        self._checked_at = 0.0
+        self._rebuild = None  # background rebuild thread, if one is running
+        self._generation = 0  # bumped by reset() so a stale rebuild is discarded
+        self.background_builds = 0
+
+    @property
+    def version(self):
+        return self._current[1]
+
+    def get(self, builder, version_reader, poll_seconds=0.0, app=None):
+        """
+        Return the index that is current as of the last version check.
+
+        Args:
+            builder: Callable returning a ZoneIndex, or None when the zone
+                     set should not be cached
+            version_reader: Callable returning the current zone-set version
+            poll_seconds: Minimum time between version checks
+            app: Flask app to rebuild under in the background; without it
+                 every rebuild happens in the calling thread
+
+        Returns:
+            ZoneIndex or None
+        """
+        index, built_version = self._current
+        now = time.monotonic()
+        if index is not _NOT_BUILT and now - self._checked_at < poll_seconds:
+            return index
+
+        version = version_reader()
+        if index is not _NOT_BUILT and version == built_version:
+            self._checked_at = now
+            return index
+
+        with self._lock:
+            index, built_version = self._current
+            if index is not _NOT_BUILT and version != built_version and app is not None:
+                # Keep serving the old index until the new one is swapped in
+                if self._rebuild is None:
+                    self._rebuild = threading.Thread(
+                        target=self._build_in_background,
+                        args=(app, builder, version, self._generation),
+                        name="zone-index-rebuild", daemon=True
+                    )
+                    self._rebuild.start()
+            elif index is _NOT_BUILT or version != built_version:
+                index = builder()
+                self._current = (index, version)
+            self._checked_at = now
+            return index
+
+    def wait_for_rebuild(self, timeout=None):
+        """Block until the running background rebuild (if any) has swapped in"""
+        thread = self._rebuild
+        if thread is not None:
+            thread.join(timeout)
+
+    def reset(self):
+        with self._lock:
+            self._current = (_NOT_BUILT, None)
+            self._checked_at = 0.0
+            self._generation += 1
+            self.background_builds = 0
+
+    def _build_in_background(self, app, builder, version, generation):
+        try:
+            with app.app_context():
+                index = builder()
+            with self._lock:
+                if generation == self._generation:
+                    self._current = (index, version)
+                    self.background_builds += 1
+        except Exception as e:
+            # Keep the old index; the next version check retries
+            print(f"❌ Zone index rebuild failed: {str(e)}")
+        finally:
+            with self._lock:
+                self._rebuild = None
+
+
+zone_index_cache = ZoneIndexCache()
+
+
+def reset_zone_index():
+    """Drop the process-wide index so the next lookup rebuilds it"""
+    zone_index_cache.reset()
@@ -0,0 +1,69 @@
+"""
+Zone Payload Cache
+File: backend/services/zone_payload.py
+
+Responsibilities:
+- Serialize the zone set for /toll-zones and /check-zones once per zone-set version
+- Derive an ETag (content hash) and Last-Modified for conditional GETs
+- Keep the bytes per process, swapped in whole when the version moves
+"""
+
+import hashlib
+import json
+from collections import namedtuple
+from flask import Response, current_app, request
+from db import db, TollZone, ZoneSetVersion
+from services.zone_index import ZoneIndexCache
+
+
+ZonePayload = namedtuple("ZonePayload", ["toll_zones", "check_zones", "etag", "last_modified"])
+
+
+# Same version-keyed, poll-limited cache the zone index uses
+zone_payload_cache = ZoneIndexCache()
+
+
+def get_zone_payload():
+    """Return the ZonePayload for the current zone-set version"""
+    return zone_payload_cache.get(
+        builder=build_zone_payload,
+        version_reader=ZoneSetVersion.current,
+        poll_seconds=current_app.config.get("ZONE_VERSION_POLL_SECONDS", 0)
+    )
+
+
+def build_zone_payload():
+    """Serialize every zone into both response bodies"""
+    # Same order the endpoints have always returned (and the zone index
+    # loads in): the driver app treats the first zone as its default
+    zones = [zone.to_dict() for zone in TollZone.query.all()]
+    last_modified = db.session.query(ZoneSetVersion.updated_at).filter_by(id=1).scalar()
+
+    toll_zones = json.dumps({"success": True, "data": zones}, separators=(",", ":")).encode()
+    check_zones = json.dumps(
+        {"success": True, "count": len(zones), "zones": zones}, separators=(",", ":")
+    ).encode()
+
+    # Hash the content rather than trust the version number, so a zone read
+    # racing a bump can never be served under the wrong tag
+    etag = hashlib.sha1(toll_zones).hexdigest()
+    return ZonePayload(toll_zones, check_zones, etag, last_modified)
+
+
+def zone_set_response(body, payload):
+    """
+    200 with the cached bytes, or 304 when the request's If-None-Match /
+    If-Modified-Since shows the client already has this zone set
+    """
+    response = Response(body, mimetype="application/json")
+    response.set_etag(payload.etag)
+    if payload.last_modified is not None:
+        response.last_modified = payload.last_modified
+    # Clients may keep the body but must revalidate before using it
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
+def reset_zone_payload():
+    """Drop the cached payload so the next request rebuilds it"""
+    zone_payload_cache.reset()
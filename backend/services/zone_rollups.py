@@ -0,0 +1,211 @@
+"""
+Zone Rollups
+File: backend/services/zone_rollups.py
+
+Responsibilities:
+- Maintain per-zone hourly and daily counts of entries, completed and
+  failed payments, and their amounts
+- Find the zone-hours touched since a stored watermark and recompute only
+  those, so a refresh costs O(changed buckets) rather than O(rows)
+- Derive daily rollups from the hourly ones
+"""
+
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import case, func, select, union
+from db import db, TollEntry, TollPaid, ZoneHourlyRollup, ZoneDailyRollup, RollupWatermark
+
+
+METRICS = ("entries", "payments_completed", "payments_failed", "amount_completed", "amount_failed")
+UPSERT_CHUNK = 500
+
+
+class ZoneRollups:
+    """
+    Watermark-driven rollup refresh.
+
+    Entries are picked up by created_at and payments by updated_at, which
+    every status change bumps. Each touched (zone, hour) is recomputed from
+    the source rows for that hour alone, so a payment that moves from
+    FAILED to COMPLETED is moved between counters rather than counted
+    twice, and re-running a refresh is harmless. The window re-reads
+    ROLLUP_LAG_SECONDS before the watermark to catch transactions that
+    committed late with an earlier timestamp.
+
+    Payments without a zone_id are not attributed to any zone.
+    """
+
+    WATERMARK = "zone_rollups"
+
+    def __init__(self, lag_seconds=None):
+        self.lag_seconds = lag_seconds
+
+    def refresh(self, now=None):
+        """
+        Bring the rollups up to date. Must run inside an app context.
+
+        Returns:
+            dict: Counts and duration for the run
+        """
+        started = time.perf_counter()
+        now = now or datetime.utcnow()
+        lag = timedelta(seconds=(
+            current_app.config.get("ROLLUP_LAG_SECONDS", 30) if self.lag_seconds is None else self.lag_seconds
+        ))
+
+        watermark = db.session.get(RollupWatermark, self.WATERMARK)
+        since = watermark.value - lag if watermark is not None else None
+
+        if since is None:
+            # First run: one GROUP BY over everything
+            hourly = self._aggregate_hours(None, None, None)
+        else:
+            hourly = {}
+            for hour, zones in self._touched_hours(since).items():
+                counts = self._aggregate_hours(hour, hour + timedelta(hours=1), zones)
+                for zone_id in zones:
+                    hourly[(zone_id, hour)] = counts.get((zone_id, hour), dict.fromkeys(METRICS, 0))
+
+        _upsert(ZoneHourlyRollup, [
+            {"zone_id": zone_id, "bucket_start": hour, **counts}
+            for (zone_id, hour), counts in hourly.items()
+        ])
+
+        days = defaultdict(set)
+        for zone_id, hour in hourly:
+            days[hour.replace(hour=0)].add(zone_id)
+        daily_rows = []
+        for day, zones in days.items():
+            daily_rows.extend(self._sum_day(day, zones))
+        _upsert(ZoneDailyRollup, daily_rows)
+
+        if watermark is None:
+            db.session.add(RollupWatermark(name=self.WATERMARK, value=now))
+        else:
+            watermark.value = now
+        db.session.commit()
+
+        return {
+            "since": since.isoformat() if since else None,
+            "hours": len(hourly),
+            "days": len(daily_rows),
+            "duration_s": round(time.perf_counter() - started, 3)
+        }
+
+    def run_forever(self, app, interval_seconds=None):
+        """Refresh every interval_seconds (for a dedicated process)"""
+        interval = interval_seconds or app.config.get("ROLLUP_INTERVAL_SECONDS", 60)
+        while True:
+            with app.app_context():
+                try:
+                    print(f"📊 Refreshed zone rollups: {self.refresh()}")
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"❌ Zone rollup refresh failed: {str(e)}")
+                finally:
+                    db.session.remove()
+            time.sleep(interval)
+
+    def _touched_hours(self, since):
+        """{hour: {zone_id, ...}} for entries added and payments changed since the watermark"""
+        entries = select(
+            TollEntry.zone_id, _hour(TollEntry.entry_time)
+        ).where(TollEntry.created_at > since)
+        payments = select(
+            TollPaid.zone_id, _hour(TollPaid.created_at)
+        ).where(TollPaid.updated_at > since, TollPaid.zone_id.isnot(None))
+
+        touched = defaultdict(set)
+        for zone_id, hour in db.session.execute(union(entries, payments)):
+            touched[_as_datetime(hour)].add(zone_id)
+        return touched
+
+    @staticmethod
+    def _aggregate_hours(start, end, zones):
+        """{(zone_id, hour): counts} from the source tables, optionally limited to [start, end) and zones"""
+        entry_hour = _hour(TollEntry.entry_time)
+        entries = db.session.query(TollEntry.zone_id, entry_hour, func.count())
+        if start is not None:
+            entries = entries.filter(
+                TollEntry.zone_id.in_(zones),
+                TollEntry.entry_time >= start,
+                TollEntry.entry_time < end
+            )
+
+        completed = TollPaid.status == "COMPLETED"
+        failed = TollPaid.status == "FAILED"
+        payment_hour = _hour(TollPaid.created_at)
+        payments = db.session.query(
+            TollPaid.zone_id, payment_hour,
+            func.sum(case((completed, 1), else_=0)),
+            func.sum(case((failed, 1), else_=0)),
+            func.sum(case((completed, TollPaid.amount), else_=0)),
+            func.sum(case((failed, TollPaid.amount), else_=0))
+        ).filter(TollPaid.zone_id.isnot(None))
+        if start is not None:
+            payments = payments.filter(
+                TollPaid.zone_id.in_(zones),
+                TollPaid.created_at >= start,
+                TollPaid.created_at < end
+            )
+
+        counts = defaultdict(lambda: dict.fromkeys(METRICS, 0))
+        for zone_id, hour, entry_count in entries.group_by(TollEntry.zone_id, entry_hour):
+            counts[(zone_id, _as_datetime(hour))]["entries"] = entry_count
+        for zone_id, hour, *sums in payments.group_by(TollPaid.zone_id, payment_hour):
+            bucket = counts[(zone_id, _as_datetime(hour))]
+            for name, value in zip(METRICS[1:], sums):
+                bucket[name] = int(value or 0)
+        return counts
+
+    @staticmethod
+    def _sum_day(day, zones):
+        """Daily rollup rows for one day, summed from the hourly rollups"""
+        rows = db.session.query(
+            ZoneHourlyRollup.zone_id,
+            *(func.sum(getattr(ZoneHourlyRollup, name)) for name in METRICS)
+        ).filter(
+            ZoneHourlyRollup.zone_id.in_(zones),
+            ZoneHourlyRollup.bucket_start >= day,
+            ZoneHourlyRollup.bucket_start < day + timedelta(days=1)
+        ).group_by(ZoneHourlyRollup.zone_id).all()
+
+        return [
+            {"zone_id": zone_id, "bucket_start": day, **dict(zip(METRICS, (int(v or 0) for v in sums)))}
+            for zone_id, *sums in rows
+        ]
+
+
+def _hour(column):
+    """Truncate a timestamp column to the hour in the active dialect"""
+    if db.session.get_bind().dialect.name == "sqlite":
+        return func.strftime("%Y-%m-%d %H:00:00", column)
+    return func.date_trunc("hour", column)
+
+
+def _as_datetime(value):
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+
+def _upsert(model, rows):
+    """INSERT ... ON CONFLICT (zone_id, bucket_start) DO UPDATE, in chunks"""
+    dialect = db.session.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f"No upsert for dialect {dialect}")
+
+    table = model.__table__
+    for i in range(0, len(rows), UPSERT_CHUNK):
+        statement = insert(table).values(rows[i:i + UPSERT_CHUNK])
+        db.session.execute(statement.on_conflict_do_update(
+            index_elements=[table.c.zone_id, table.c.bucket_start],
+            set_={name: statement.excluded[name] for name in METRICS}
+        ))
+
+
+zone_rollups = ZoneRollups()
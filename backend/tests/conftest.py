@@ -0,0 +1,50 @@
+import pytest
+from flask import Flask
+from flask_jwt_extended import JWTManager
+
+from config import TestingConfig
+from db import db
+from routes.geo_fencing_routes import geo_fencing_bp
+from routes.mpesa_routes import mpesa_bp
+from routes.reports import reports_bp
+from routes.toll_zones import toll_zones_bp
+from routes.tolls_history import tolls_history_bp
+from services.driver_state import driver_state_store
+from services.trajectory import trajectory_processor
+from services.zone_index import reset_zone_index
+from services.zone_payload import reset_zone_payload
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config.from_object(TestingConfig)
+    app.config["SQLALCHEMY_ECHO"] = False
+
+    db.init_app(app)
+    JWTManager(app)
+    app.register_blueprint(geo_fencing_bp)
+    app.register_blueprint(toll_zones_bp)
+    app.register_blueprint(mpesa_bp)
+    app.register_blueprint(tolls_history_bp)
+    app.register_blueprint(reports_bp)
+
+    with app.app_context():
+        db.create_all()
+        reset_zone_index()
+        reset_zone_payload()
+        driver_state_store.reset()
+        trajectory_processor.reset()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+    reset_zone_index()
+    reset_zone_payload()
+    driver_state_store.reset()
+    trajectory_processor.reset()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
@@ -0,0 +1,44 @@
+from db import db, TollPaid
+from services.batch_writer import BatchWriter
+
+
+def insert_payments(amounts):
+    for amount in amounts:
+        if amount < 0:
+            raise ValueError("negative amount")
+        db.session.add(TollPaid(amount=amount, status="PENDING"))
+
+
+def test_writer_batches_records(app):
+    writer = BatchWriter("test", insert_payments, batch_size=10, flush_seconds=0.5)
+
+    for amount in range(25):
+        writer.submit(app, amount)
+    writer.flush()
+
+    assert TollPaid.query.count() == 25
+    # Full batches are written without waiting for the flush interval
+    assert writer.stats()["batches"] == 3
+    assert writer.stats()["largest_batch"] == 10
+    writer.shutdown()
+
+
+def test_bad_record_does_not_drop_its_batch(app):
+    writer = BatchWriter("test", insert_payments, batch_size=3, flush_seconds=0.5)
+
+    for amount in (1, -1, 2):
+        writer.submit(app, amount)
+    writer.flush()
+
+    assert sorted(amount for (amount,) in db.session.query(TollPaid.amount)) == [1, 2]
+    assert writer.stats()["failed_records"] == 1
+    writer.shutdown()
+
+
+def test_shutdown_writes_pending_records(app):
+    writer = BatchWriter("test", insert_payments, batch_size=100, flush_seconds=60)
+
+    writer.submit(app, 5)
+    writer.shutdown()
+
+    assert TollPaid.query.count() == 1
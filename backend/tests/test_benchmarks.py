@@ -0,0 +1,40 @@
+import json
+
+from benchmarks import bench_geofencing
+
+
+def test_geofencing_benchmark_writes_results(tmp_path):
+    output = tmp_path / "bench.json"
+
+    exit_code = bench_geofencing.main([
+        "--sizes", "10", "--drivers", "5", "--pings", "50", "--output", str(output)
+    ])
+
+    results = json.loads(output.read_text())["results"]
+    assert exit_code == 0
+    assert {r["mode"] for r in results} == {"index", "grid", "batch", "db", "db_sql"}
+    assert all(r["p99_us"] >= r["p50_us"] for r in results)
+    assert bench_geofencing.main([
+        "--sizes", "10", "--drivers", "5", "--pings", "50", "--no-db",
+        "--output", str(tmp_path / "again.json"), "--compare", str(output), "--tolerance", "1000"
+    ]) == 0
+
+
+def test_stk_push_load_harness_writes_results(tmp_path):
+    from benchmarks import load_stk_push
+
+    output = tmp_path / "stk.json"
+
+    exit_code = load_stk_push.main([
+        "--requests", "10", "--concurrency", "3", "--wait", "--poll-interval", "0.02",
+        "--latency-ms", "0", "--jitter-ms", "0", "--callback-delay-ms", "10",
+        "--decline-rate", "0.5", "--output", str(output)
+    ])
+
+    report = json.loads(output.read_text())
+    assert exit_code == 0
+    assert report["summary"]["http_status"] == {"202": 10}
+    assert sum(report["summary"]["outcomes"].values()) == 10
+    assert set(report["summary"]["outcomes"]) <= {"paid", "failed"}
+    assert report["daraja"]["stk_push"] == 10
+    assert report["daraja"]["oauth"] == 1
@@ -0,0 +1,167 @@
+from datetime import datetime, timedelta
+
+import pytest
+from flask_jwt_extended import create_access_token
+
+from db import db, TollEntry, TollPaid
+from services.charge_pipeline import ChargePipeline, charge_pipeline
+from services.geo_service import GeoFencingService
+from services.stk_dispatcher import stk_dispatcher
+from tests.test_geo_service import make_driver, make_zone
+
+
+@pytest.fixture(autouse=True)
+def auto_charge(app):
+    app.config["AUTO_CHARGE_ENABLED"] = True
+
+
+def capture_submits(monkeypatch):
+    calls = []
+    monkeypatch.setattr(stk_dispatcher, "submit", lambda app, payment_id, **kwargs: calls.append((payment_id, kwargs)))
+    return calls
+
+
+# ---------------------------------------------------------------------------
+# Queuing on zone entry
+# ---------------------------------------------------------------------------
+
+def test_zone_entry_queues_charge_linked_to_entry(app):
+    zone = make_zone("Thika Road Toll", -1.2195, 36.8869, charge=100)
+    driver = make_driver()
+
+    result = GeoFencingService.check_zone_entry(driver.user_id, -1.217, 36.889)
+
+    charge = db.session.get(TollPaid, result["payment_id"])
+    assert charge.status == "QUEUED"
+    assert charge.amount == 100
+    assert charge.zone_id == zone.zone_id
+    assert TollEntry.query.one().payment_id == charge.id
+
+
+def test_each_charged_entry_gets_its_own_charge(app):
+    make_zone("Thika Road Toll", -1.2195, 36.8869, charge=100)
+    driver_id = make_driver().user_id
+    start = datetime.utcnow() - timedelta(hours=2)
+
+    def fix(lat, lng, minutes):
+        return {"driver_id": driver_id, "latitude": lat, "longitude": lng,
+                "timestamp": start + timedelta(minutes=minutes)}
+
+    results = GeoFencingService.check_zone_entries([
+        fix(-1.217, 36.889, 0),   # enter: charged
+        fix(-1.217, 36.889, 1),   # still inside
+        fix(-1.217, 36.899, 2),   # exit
+        fix(-1.217, 36.889, 10),  # back within the grace period
+        fix(-1.217, 36.899, 11),  # exit again
+        fix(-1.217, 36.889, 60),  # back after the grace period: charged
+    ])
+
+    payment_ids = [result.get("payment_id") for result in results]
+    assert [p is not None for p in payment_ids] == [True, False, False, False, False, True]
+    assert payment_ids[0] != payment_ids[5]
+    assert [p.amount for p in TollPaid.query] == [100, 100]
+    for entry in TollEntry.query.filter(TollEntry.payment_id.isnot(None)):
+        assert TollEntry.query.filter_by(payment_id=entry.payment_id).count() == 1
+
+
+def test_entries_in_different_zones_are_charged_separately(app):
+    thika = make_zone("Thika Road Toll", -1.2195, 36.8869, charge=100)
+    mombasa = make_zone("Mombasa Road Toll", -1.3195, 36.8869, charge=150)
+    driver = make_driver()
+
+    first = GeoFencingService.check_zone_entry(driver.user_id, -1.217, 36.889)
+    second = GeoFencingService.check_zone_entry(driver.user_id, -1.317, 36.889)
+
+    assert first["payment_id"] != second["payment_id"]
+    assert db.session.get(TollPaid, first["payment_id"]).zone_id == thika.zone_id
+    assert db.session.get(TollPaid, second["payment_id"]).zone_id == mombasa.zone_id
+    assert sorted(p.amount for p in TollPaid.query) == [100, 150]
+
+
+def test_auto_charge_can_be_disabled(app):
+    app.config["AUTO_CHARGE_ENABLED"] = False
+    make_zone("Thika Road Toll", -1.2195, 36.8869)
+    driver = make_driver()
+
+    result = GeoFencingService.check_zone_entry(driver.user_id, -1.217, 36.889)
+
+    assert "payment_id" not in result
+    assert TollPaid.query.count() == 0
+
+
+# ---------------------------------------------------------------------------
+# Dispatch
+# ---------------------------------------------------------------------------
+
+def test_due_charge_is_pushed_once(app, monkeypatch):
+    calls = capture_submits(monkeypatch)
+    make_zone("Thika Road Toll", -1.2195, 36.8869)
+    driver = make_driver()
+    driver.phone_number = "254700000001"
+    db.session.commit()
+
+    payment_id = GeoFencingService.check_zone_entry(driver.user_id, -1.217, 36.889)["payment_id"]
+    pipeline = ChargePipeline()
+
+    assert pipeline.dispatch_due(app) == 1
+    assert pipeline.dispatch_due(app) == 0
+
+    assert calls == [(payment_id, {"phone_number": "254700000001", "amount": 100})]
+    charge = db.session.get(TollPaid, payment_id)
+    assert charge.status == "PENDING"
+    assert charge.phone_number == "254700000001"
+
+
+def test_charge_without_phone_is_left_unpaid(app, client, monkeypatch):
+    calls = capture_submits(monkeypatch)
+    make_zone("Thika Road Toll", -1.2195, 36.8869)
+    driver = make_driver()
+
+    payment_id = GeoFencingService.check_zone_entry(driver.user_id, -1.217, 36.889)["payment_id"]
+    ChargePipeline().dispatch_due(app)
+
+    assert calls == []
+    assert client.get(f"/payments/status/{payment_id}").json["status"] == "unpaid"
+
+    # The driver can still pay it from the app
+    response = client.post("/payments/stk-push", json={"phone": "254700000002", "payment_id": str(payment_id)})
+    assert response.status_code == 202
+    assert response.json["payment_id"] == str(payment_id)
+    assert calls == [(payment_id, {"phone_number": "254700000002", "amount": 100})]
+    assert TollPaid.query.count() == 1
+
+    # ...but not push it twice
+    again = client.post("/payments/stk-push", json={"phone": "254700000002", "payment_id": str(payment_id)})
+    assert again.status_code == 409
+
+
+def test_stk_push_by_amount_pays_the_drivers_queued_charge(app, client, monkeypatch):
+    calls = capture_submits(monkeypatch)
+    zone = make_zone("Thika Road Toll", -1.2195, 36.8869)
+    driver = make_driver()
+
+    payment_id = GeoFencingService.check_zone_entry(driver.user_id, -1.217, 36.889)["payment_id"]
+    headers = {"Authorization": f"Bearer {create_access_token(identity=str(driver.user_id))}"}
+    response = client.post("/payments/stk-push", headers=headers, json={
+        "phone": "254700000002", "amount": 100, "zone_id": str(zone.zone_id)
+    })
+
+    assert response.status_code == 202
+    assert response.json["payment_id"] == str(payment_id)
+    assert calls == [(payment_id, {"phone_number": "254700000002", "amount": 100})]
+    assert TollPaid.query.one().status == "PENDING"
+
+
+def test_open_breaker_leaves_charges_queued(app, monkeypatch):
+    calls = capture_submits(monkeypatch)
+    make_zone("Thika Road Toll", -1.2195, 36.8869)
+    driver = make_driver()
+    driver.phone_number = "254700000001"
+    db.session.commit()
+
+    GeoFencingService.check_zone_entry(driver.user_id, -1.217, 36.889)
+    monkeypatch.setattr("services.charge_pipeline.mpesa_http.breaker.allows_request", lambda: False)
+
+    assert charge_pipeline.dispatch_due(app) == 0
+    assert calls == []
+    assert TollPaid.query.one().status == "QUEUED"
@@ -0,0 +1,39 @@
+from db import db, has_writes, User
+
+
+def test_has_writes_sees_pending_changes(app):
+    assert not has_writes()
+
+    db.session.add(User(username="driver", password_hash="x"))
+
+    assert has_writes()
+
+
+def test_has_writes_sees_flushed_changes(app):
+    db.session.add(User(username="driver", password_hash="x"))
+    db.session.flush()
+    assert not (db.session.new or db.session.dirty)
+
+    assert has_writes()
+    db.session.commit()
+    assert not has_writes()
+
+
+def test_has_writes_sees_bulk_updates(app):
+    db.session.add(User(username="driver", password_hash="x"))
+    db.session.commit()
+
+    User.query.filter_by(username="driver").update({User.password_hash: "y"})
+
+    assert has_writes()
+    db.session.rollback()
+    assert not has_writes()
+
+
+def test_reads_are_not_writes(app):
+    db.session.add(User(username="driver", password_hash="x"))
+    db.session.commit()
+
+    User.query.filter_by(username="driver").all()
+
+    assert not has_writes()
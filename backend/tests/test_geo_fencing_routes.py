@@ -0,0 +1,56 @@
+from flask_jwt_extended import create_access_token
+
+from db import TollEntry, TollPaid
+from tests.test_geo_service import make_driver, make_zone
+
+
+def auth_headers(user):
+    return {"Authorization": f"Bearer {create_access_token(identity=str(user.user_id))}"}
+
+
+def test_check_location_batch_returns_results_in_input_order(app, client):
+    make_zone("Thika Road Toll", -1.2195, 36.8869)
+    driver = make_driver()
+
+    fixes = [
+        {"driver_id": str(driver.user_id), "latitude": -1.5, "longitude": 36.5,
+         "timestamp": "2026-01-15T18:00:00Z"},
+        {"driver_id": str(driver.user_id), "latitude": -1.217, "longitude": 36.889,
+         "timestamp": "2026-01-15T18:01:00Z"},
+        {"driver_id": "not-a-uuid", "latitude": -1.217, "longitude": 36.889},
+        {"latitude": -1.216, "longitude": 36.888, "timestamp": 1768500120},
+        {"driver_id": str(driver.user_id), "latitude": -1.216, "longitude": 36.888,
+         "timestamp": "2026-01-15T18:03:00Z"},
+    ]
+
+    response = client.post("/check-location/batch", json={"fixes": fixes}, headers=auth_headers(driver))
+    results = response.get_json()["results"]
+
+    assert response.status_code == 200
+    assert [r.get("in_zone") for r in results] == [False, True, None, True, True]
+    assert results[2]["error"] == "Invalid driver_id format"
+    assert [r.get("should_trigger_payment") for r in results] == [False, True, None, False, False]
+    assert results[1]["zone"]["zone_name"] == "Thika Road Toll"
+    assert TollEntry.query.count() == 1
+
+
+def test_check_location_batch_rejects_other_drivers_fixes(app, client):
+    make_zone("Thika Road Toll", -1.2195, 36.8869)
+    attacker = make_driver()
+    victim = make_driver("victim")
+
+    fixes = [{"driver_id": str(victim.user_id), "latitude": -1.217, "longitude": 36.889}]
+    response = client.post("/check-location/batch", json={"fixes": fixes}, headers=auth_headers(attacker))
+
+    assert response.status_code == 200
+    assert response.get_json()["results"] == [
+        {"success": False, "error": "driver_id does not match the signed-in driver"}
+    ]
+    assert TollEntry.query.count() == 0
+    assert TollPaid.query.count() == 0
+
+
+def test_check_location_batch_rejects_empty_body(app, client):
+    driver = make_driver()
+    response = client.post("/check-location/batch", json={"fixes": []}, headers=auth_headers(driver))
+    assert response.status_code == 400
@@ -0,0 +1,369 @@
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+from db import db, User, TollZone, TollEntry, ZoneSetVersion
+from services.driver_state import driver_state_store
+from services.geo_service import GeoFencingService
+from services.zone_index import ZoneIndex, ZoneSnapshot, zone_index_cache
+
+
+def square(lat, lng, size=0.005):
+    return [
+        {"lat": lat, "lng": lng},
+        {"lat": lat, "lng": lng + size},
+        {"lat": lat + size, "lng": lng + size},
+        {"lat": lat + size, "lng": lng},
+        {"lat": lat, "lng": lng},
+    ]
+
+
+def make_zone(name, lat, lng, charge=100, size=0.005, normalize=True):
+    zone = TollZone(zone_name=name, charge_amount=charge, polygon_coords=square(lat, lng, size))
+    if normalize:
+        GeoFencingService.store_zone_geometry(zone, zone.polygon_coords)
+    db.session.add(zone)
+    db.session.commit()
+    return zone
+
+
+def make_driver(username="driver"):
+    user = User(username=username, password_hash="x")
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+def snapshot(name, lat, lng, size=0.005):
+    return ZoneSnapshot(
+        zone_id=uuid.uuid4(),
+        zone_name=name,
+        charge_amount=100,
+        polygon=GeoFencingService.build_polygon(square(lat, lng, size))
+    )
+
+
+# --------------------------------------------------
+# Polygon parsing
+# --------------------------------------------------
+def test_build_polygon_accepts_geojson_and_simple_formats():
+    simple = GeoFencingService.build_polygon(square(-1.2195, 36.8869))
+    geojson = GeoFencingService.build_polygon({
+        "type": "Polygon",
+        "coordinates": [[[c["lng"], c["lat"]] for c in square(-1.2195, 36.8869)]]
+    })
+    assert simple.equals(geojson)
+
+
+def test_build_polygon_swaps_reversed_geojson():
+    polygon = GeoFencingService.build_polygon({
+        "type": "Polygon",
+        "coordinates": [[[c["lat"], c["lng"] + 100] for c in square(-1.2195, 36.8869)]]
+    })
+    assert polygon.bounds[0] > 100
+
+
+# --------------------------------------------------
+# Spatial index
+# --------------------------------------------------
+def test_zone_index_finds_containing_zone_and_boundary():
+    index = ZoneIndex([snapshot("A", -1.22, 36.88), snapshot("B", -1.32, 36.92)])
+
+    assert index.find_zone(-1.218, 36.882).zone_name == "A"
+    assert index.find_zone(-1.318, 36.922).zone_name == "B"
+    assert index.find_zone(-1.22, 36.882).zone_name == "A"
+    assert index.find_zone(-1.0, 36.0) is None
+
+
+def test_zone_index_prefers_first_loaded_zone_on_overlap():
+    index = ZoneIndex([snapshot("first", -1.22, 36.88), snapshot("second", -1.221, 36.881)])
+    assert index.find_zone(-1.218, 36.882).zone_name == "first"
+
+
+def test_zone_index_candidates_are_bbox_filtered():
+    zones = [snapshot(f"Z{i}", -1.0 + i * 0.01, 36.0) for i in range(50)]
+    index = ZoneIndex(zones)
+
+    candidates = index.candidates(-1.0 + 7 * 0.01 + 0.001, 36.001)
+    assert [zone.zone_name for zone in candidates] == ["Z7"]
+
+
+# --------------------------------------------------
+# Zone entry detection
+# --------------------------------------------------
+def test_check_zone_entry_creates_single_entry(app):
+    make_zone("Thika Road Toll", -1.2195, 36.8869)
+    driver = make_driver()
+
+    first = GeoFencingService.check_zone_entry(driver.user_id, -1.217, 36.889)
+    second = GeoFencingService.check_zone_entry(driver.user_id, -1.217, 36.889)
+
+    assert first["should_trigger_payment"] is True
+    assert first["zone"].zone_name == "Thika Road Toll"
+    assert second["should_trigger_payment"] is False
+    assert TollEntry.query.count() == 1
+
+
+def test_check_zone_entry_outside_all_zones(app):
+    make_zone("Thika Road Toll", -1.2195, 36.8869)
+    driver = make_driver()
+
+    result = GeoFencingService.check_zone_entry(driver.user_id, -1.5, 36.5)
+
+    assert result["in_zone"] is False
+    assert TollEntry.query.count() == 0
+
+
+# --------------------------------------------------
+# Versioned zone cache
+# --------------------------------------------------
+def test_zone_index_rebuilds_after_version_bump(app):
+    make_zone("Thika Road Toll", -1.2195, 36.8869)
+    index = GeoFencingService.get_zone_index()
+    assert GeoFencingService.get_zone_index() is index
+
+    zone = TollZone(zone_name="Mombasa Road Toll", charge_amount=75, polygon_coords=square(-1.3195, 36.9269))
+    db.session.add(zone)
+    db.session.commit()
+    assert GeoFencingService.find_zone(-1.317, 36.929) is None
+
+    ZoneSetVersion.bump()
+    db.session.commit()
+    assert GeoFencingService.get_zone_index() is not index
+    assert GeoFencingService.find_zone(-1.317, 36.929).zone_name == "Mombasa Road Toll"
+
+
+def test_zone_index_rebuilds_in_background_after_version_bump(app):
+    app.config["ZONE_INDEX_BACKGROUND_REBUILD"] = True
+    make_zone("Thika Road Toll", -1.2195, 36.8869)
+    index = GeoFencingService.get_zone_index()
+
+    make_zone("Mombasa Road Toll", -1.3195, 36.9269)
+    ZoneSetVersion.bump()
+    db.session.commit()
+
+    # The old index keeps answering while the new one is built
+    assert GeoFencingService.get_zone_index() is index
+    zone_index_cache.wait_for_rebuild(timeout=10)
+
+    assert zone_index_cache.background_builds == 1
+    assert GeoFencingService.get_zone_index() is not index
+    assert GeoFencingService.find_zone(-1.317, 36.929).zone_name == "Mombasa Road Toll"
+
+
+# --------------------------------------------------
+# Driver state
+# --------------------------------------------------
+def count_queries(fn):
+    statements = []
+
+    def before_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", before_execute)
+    try:
+        fn()
+    finally:
+        event.remove(db.engine, "before_cursor_execute", before_execute)
+    return len(statements)
+
+
+def test_repeat_ping_inside_zone_needs_no_query(app):
+    make_zone("Thika Road Toll", -1.2195, 36.8869)
+    driver_id = make_driver().user_id
+    GeoFencingService.check_zone_entry(driver_id, -1.217, 36.889)
+
+    queries = count_queries(
+        lambda: GeoFencingService.check_zone_entry(driver_id, -1.217, 36.889)
+    )
+    assert queries == 1  # zone-set version poll only
+
+
+def count_commits(fn):
+    commits = []
+
+    def on_commit(conn):
+        commits.append(conn)
+
+    event.listen(db.engine, "commit", on_commit)
+    try:
+        fn()
+    finally:
+        event.remove(db.engine, "commit", on_commit)
+    return len(commits)
+
+
+def test_repeat_ping_inside_zone_skips_commit(app):
+    make_zone("Thika Road Toll", -1.2195, 36.8869)
+    driver_id = make_driver().user_id
+    GeoFencingService.check_zone_entry(driver_id, -1.217, 36.889)
+
+    commits = count_commits(
+        lambda: GeoFencingService.check_zone_entry(driver_id, -1.217, 36.889)
+    )
+    assert commits == 0
+
+
+def test_grace_period_after_exit_is_served_from_state(app):
+    make_zone("Thika Road Toll", -1.2195, 36.8869)
+    driver = make_driver()
+    GeoFencingService.check_zone_entry(driver.user_id, -1.217, 36.889)
+    assert GeoFencingService.record_zone_exit(driver.user_id) is True
+
+    result = GeoFencingService.check_zone_entry(driver.user_id, -1.217, 36.889)
+
+    assert result["should_trigger_payment"] is False
+    assert result["message"] == "Recently exited zone — no duplicate charge"
+    assert TollEntry.query.count() == 1
+
+
+def test_driver_state_warms_from_open_entries(app):
+    zone = make_zone("Thika Road Toll", -1.2195, 36.8869)
+    driver = make_driver()
+    db.session.add(TollEntry(user_id=driver.user_id, zone_id=zone.zone_id, entry_time=datetime.utcnow()))
+    db.session.commit()
+
+    result = GeoFencingService.check_zone_entry(driver.user_id, -1.217, 36.889)
+
+    assert result["message"] == "Driver already inside zone"
+    assert driver_state_store.get(driver.user_id, 300).is_inside(zone.zone_id)
+
+
+# --------------------------------------------------
+# Trajectory events
+# --------------------------------------------------
+def fix(driver_id, lat, lng, minute):
+    return {
+        "driver_id": driver_id,
+        "latitude": lat,
+        "longitude": lng,
+        "timestamp": datetime(2026, 1, 15, 18, minute)
+    }
+
+
+def test_leaving_zone_records_exit_automatically(app):
+    zone = make_zone("Thika Road Toll", -1.2195, 36.8869)
+    driver_id = make_driver().user_id
+
+    results = GeoFencingService.check_zone_entries([
+        fix(driver_id, -1.217, 36.889, 0),
+        fix(driver_id, -1.217, 36.899, 2),
+    ])
+
+    entry = TollEntry.query.one()
+    assert [event.type for event in results[1]["events"]] == ["exit"]
+    assert entry.zone_id == zone.zone_id
+    assert entry.entry_time == datetime(2026, 1, 15, 18, 0)
+    assert datetime(2026, 1, 15, 18, 0) < entry.exit_time < datetime(2026, 1, 15, 18, 2)
+
+
+def test_sparse_fixes_across_small_zone_record_pass_through(app):
+    make_zone("Thika Road Toll", -1.2195, 36.8869)
+    driver_id = make_driver().user_id
+
+    results = GeoFencingService.check_zone_entries([
+        fix(driver_id, -1.217, 36.880, 0),
+        fix(driver_id, -1.217, 36.900, 2),
+    ])
+
+    entry = TollEntry.query.one()
+    assert results[1]["in_zone"] is False
+    assert results[1]["should_trigger_payment"] is True
+    assert [event.type for event in results[1]["events"]] == ["pass_through"]
+    assert entry.entry_time < entry.exit_time
+
+
+def test_pass_through_not_inferred_across_long_gap(app):
+    make_zone("Thika Road Toll", -1.2195, 36.8869)
+    driver_id = make_driver().user_id
+
+    GeoFencingService.check_zone_entries([
+        fix(driver_id, -1.217, 36.880, 0),
+        fix(driver_id, -1.217, 36.900, 30),
+    ])
+
+    assert TollEntry.query.count() == 0
+
+
+def test_backdated_fix_cannot_reach_into_old_grace_window(app):
+    zone = make_zone("Thika Road Toll", -1.2195, 36.8869)
+    driver_id = make_driver().user_id
+    db.session.add(TollEntry(
+        user_id=driver_id, zone_id=zone.zone_id,
+        entry_time=datetime(2026, 1, 15, 17, 0), exit_time=datetime(2026, 1, 15, 17, 5)
+    ))
+    db.session.commit()
+    GeoFencingService.check_zone_entries([fix(driver_id, -1.5, 36.5, 0)])
+
+    # Back in the zone at 18:02, but stamped inside the 17:05 grace window
+    backdated = fix(driver_id, -1.217, 36.889, 2)
+    backdated["timestamp"] = datetime(2026, 1, 15, 17, 10)
+    result = GeoFencingService.check_zone_entries([backdated])[0]
+
+    assert result["should_trigger_payment"] is True
+    entry = TollEntry.query.filter_by(exit_time=None).one()
+    assert entry.entry_time == datetime(2026, 1, 15, 18, 0)
+
+
+def test_future_fix_is_clamped_to_server_clock(app):
+    make_zone("Thika Road Toll", -1.2195, 36.8869)
+    driver_id = make_driver().user_id
+    future = fix(driver_id, -1.217, 36.889, 0)
+    future["timestamp"] = datetime.utcnow() + timedelta(days=365)
+
+    GeoFencingService.check_zone_entries([future])
+
+    skew = timedelta(seconds=app.config["FIX_MAX_CLOCK_SKEW_SECONDS"])
+    assert TollEntry.query.one().entry_time <= datetime.utcnow() + skew
+
+
+# --------------------------------------------------
+# Coverage grid
+# --------------------------------------------------
+def test_zone_grid_matches_exact_lookup():
+    zones = [snapshot("A", -1.22, 36.88), snapshot("B", -1.2185, 36.8815), snapshot("C", -1.32, 36.92)]
+    exact = ZoneIndex(zones)
+    gridded = ZoneIndex(zones, grid_cell_size=0.001)
+
+    for i in range(400):
+        lat = -1.2225 + (i % 20) * 0.0005
+        lng = 36.8775 + (i // 20) * 0.0005
+        expected = exact.find_zone(lat, lng)
+        actual = gridded.find_zone(lat, lng)
+        assert (actual and actual.zone_name) == (expected and expected.zone_name)
+
+    stats = gridded.grid.stats()
+    assert stats["interior_cells"] > 0
+    assert 0 < stats["hit_rate"] < 1
+
+
+def test_zone_grid_disabled_when_too_large():
+    index = ZoneIndex([snapshot("huge", -10, 30, size=5)], grid_cell_size=0.001, grid_max_cells=1000)
+    assert index.grid is None
+    assert index.find_zone(-8, 32).zone_name == "huge"
+
+
+# --------------------------------------------------
+# SQL bounding-box prefilter
+# --------------------------------------------------
+def test_large_zone_tables_use_sql_bbox_prefilter(app):
+    app.config["ZONE_CACHE_MAX_ZONES"] = 1
+    for i in range(5):
+        make_zone(f"Z{i}", -1.0 + i * 0.01, 36.0)
+    driver_id = make_driver().user_id
+
+    assert GeoFencingService.get_cached_zone_index() is None
+    assert len(GeoFencingService.load_zone_snapshots((-0.969, 36.001, -0.969, 36.001))) == 1
+
+    result = GeoFencingService.check_zone_entry(driver_id, -0.969, 36.001)
+    assert result["zone"].zone_name == "Z3"
+    assert GeoFencingService.find_zone(-0.5, 36.001) is None
+
+
+def test_bbox_prefilter_includes_zones_without_bbox(app):
+    make_zone("legacy", -1.0, 36.0, normalize=False)
+    zone = TollZone.query.one()
+    assert zone.min_lat is None
+
+    assert len(GeoFencingService.load_zone_snapshots((10.0, 10.0, 10.0, 10.0))) == 1
@@ -0,0 +1,64 @@
+import pytest
+
+import init_db
+from db import db, TollZone, ZoneChange, ZoneSetVersion, ZoneHourlyRollup, RollupWatermark
+from tests.test_geo_service import make_zone
+
+
+@pytest.fixture
+def cli_app(app, monkeypatch):
+    """Run the init_db commands against the test app"""
+    monkeypatch.setattr(init_db, "create_app", lambda: app)
+    return app
+
+
+def test_grid_command_rebuilds_and_samples(cli_app, capsys):
+    make_zone("Thika Road Toll", -1.2195, 36.8869)
+    before = ZoneSetVersion.current()
+
+    init_db.rebuild_zone_grid(samples=100)
+
+    assert ZoneSetVersion.current() == before + 1
+    assert "lookups: 100" in capsys.readouterr().out
+
+
+def test_backfill_geometry_command_normalizes_and_logs_zones(cli_app, capsys):
+    zone = make_zone("Thika Road Toll", -1.2195, 36.8869, normalize=False)
+
+    init_db.backfill_zone_geometry()
+
+    assert db.session.get(TollZone, zone.zone_id).geometry_wkb is not None
+    assert ZoneChange.query.filter_by(zone_id=zone.zone_id).count() == 1
+    assert "Converted 1 zone(s)" in capsys.readouterr().out
+
+
+def test_backfill_geometry_without_conversions_leaves_version_alone(cli_app, capsys):
+    zone = make_zone("Bowtie", -1.2195, 36.8869, normalize=False)
+    zone.polygon_coords = [
+        {"lat": 0, "lng": 0}, {"lat": 1, "lng": 1},
+        {"lat": 0, "lng": 1}, {"lat": 1, "lng": 0}, {"lat": 0, "lng": 0}
+    ]
+    db.session.commit()
+    before = ZoneSetVersion.current()
+
+    init_db.backfill_zone_geometry()
+
+    assert ZoneSetVersion.current() == before
+    assert ZoneChange.query.count() == 0
+    assert "Converted 0 zone(s)" in capsys.readouterr().out
+
+
+def test_reconcile_payments_command_runs_once(cli_app, capsys):
+    init_db.reconcile_payments()
+
+    assert "Reconciliation complete" in capsys.readouterr().out
+
+
+def test_refresh_rollups_command_runs_once(cli_app, capsys):
+    make_zone("Thika Road Toll", -1.2195, 36.8869)
+
+    init_db.refresh_rollups()
+
+    assert db.session.get(RollupWatermark, "zone_rollups") is not None
+    assert ZoneHourlyRollup.query.count() == 0
+    assert "Rollups up to date" in capsys.readouterr().out
@@ -0,0 +1,104 @@
+import importlib.util
+from pathlib import Path
+
+import pytest
+import sqlalchemy as sa
+from alembic.migration import MigrationContext
+from alembic.operations import Operations
+
+VERSIONS = Path(__file__).resolve().parent.parent / "migrations" / "versions"
+
+
+def load_migration(revision):
+    path = next(VERSIONS.glob(f"{revision}_*.py"))
+    spec = importlib.util.spec_from_file_location(path.stem, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def connection():
+    engine = sa.create_engine("sqlite://")
+    with engine.begin() as conn:
+        conn.execute(sa.text(
+            "CREATE TABLE tolls_paid ("
+            "id VARCHAR PRIMARY KEY, checkout_request_id VARCHAR, "
+            "status VARCHAR, amount NUMERIC, created_at DATETIME)"
+        ))
+        yield conn
+    engine.dispose()
+
+
+def run(connection, migration, step):
+    with Operations.context(MigrationContext.configure(connection)):
+        getattr(migration, step)()
+
+
+def paid_rows(connection, table="tolls_paid"):
+    return connection.execute(sa.text(f"SELECT id, status FROM {table} ORDER BY id")).all()
+
+
+def test_unique_checkout_migration_archives_duplicates(connection):
+    migration = load_migration("e25a8f4c7b19")
+    connection.execute(sa.text(
+        "INSERT INTO tolls_paid VALUES "
+        "('a', 'ws_1', 'PENDING', 100, '2026-01-15 18:00:00'), "
+        "('b', 'ws_1', 'COMPLETED', 100, '2026-01-15 18:01:00'), "
+        "('c', 'ws_1', 'FAILED', 100, '2026-01-15 18:02:00'), "
+        "('d', 'ws_2', 'PENDING', 50, '2026-01-15 18:00:00')"
+    ))
+
+    run(connection, migration, "upgrade")
+
+    assert paid_rows(connection) == [("b", "COMPLETED"), ("d", "PENDING")]
+    assert paid_rows(connection, migration.ARCHIVE_TABLE) == [("a", "PENDING"), ("c", "FAILED")]
+
+    run(connection, migration, "downgrade")
+
+    assert [row.id for row in paid_rows(connection)] == ["a", "b", "c", "d"]
+    assert not sa.inspect(connection).has_table(migration.ARCHIVE_TABLE)
+
+
+def test_unique_checkout_migration_without_duplicates_creates_no_archive(connection):
+    migration = load_migration("e25a8f4c7b19")
+    connection.execute(sa.text(
+        "INSERT INTO tolls_paid VALUES ('a', 'ws_1', 'PENDING', 100, '2026-01-15 18:00:00')"
+    ))
+
+    run(connection, migration, "upgrade")
+
+    assert paid_rows(connection) == [("a", "PENDING")]
+    assert not sa.inspect(connection).has_table(migration.ARCHIVE_TABLE)
+
+
+def test_duplicate_links_migration_extends_existing_archive(connection):
+    archive = load_migration("e25a8f4c7b19")
+    links = load_migration("6b2e9d4f1a38")
+    connection.execute(sa.text(
+        "INSERT INTO tolls_paid VALUES "
+        "('a', 'ws_1', 'PENDING', 100, '2026-01-15 18:00:00'), "
+        "('b', 'ws_1', 'COMPLETED', 100, '2026-01-15 18:01:00')"
+    ))
+    run(connection, archive, "upgrade")
+
+    run(connection, links, "upgrade")
+
+    columns = {column["name"] for column in sa.inspect(connection).get_columns("tolls_paid_duplicates")}
+    assert {"duplicate_of", "archived_at"} <= columns
+    assert paid_rows(connection, "tolls_paid_duplicates") == [("a", "PENDING")]
+
+    run(connection, links, "downgrade")
+    run(connection, archive, "downgrade")
+
+    assert [row.id for row in paid_rows(connection)] == ["a", "b"]
+
+
+def test_duplicate_links_migration_creates_missing_archive(connection):
+    links = load_migration("6b2e9d4f1a38")
+
+    run(connection, links, "upgrade")
+    assert sa.inspect(connection).has_table("tolls_paid_duplicates")
+
+    run(connection, links, "downgrade")
+    assert not sa.inspect(connection).has_table("tolls_paid_duplicates")
@@ -0,0 +1,383 @@
+import time
+import uuid
+from datetime import datetime
+
+import pytest
+import requests
+
+from db import db, TollEntry, TollPaid, TollPaidDuplicate
+from services.mpesa_service import MpesaService, StkPushUnconfirmed
+from services.resilience import DependencyUnavailable
+from services.stk_dispatcher import StkPushDispatcher, StkPushJob, stk_dispatcher
+from tests.test_geo_fencing_routes import auth_headers
+from tests.test_geo_service import make_driver, make_zone
+
+
+def fake_stk_push(monkeypatch, response):
+    calls = []
+
+    def stk_push(phone_number, amount, account_reference="TollPayment"):
+        calls.append((phone_number, amount))
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    monkeypatch.setattr(MpesaService, "stk_push", staticmethod(stk_push))
+    return calls
+
+
+def push(client, **overrides):
+    body = {"phone": "254700000001", "amount": 100, **overrides}
+    return client.post("/payments/stk-push", json=body)
+
+
+# ---------------------------------------------------------------------------
+# Asynchronous STK push
+# ---------------------------------------------------------------------------
+
+def test_stk_push_returns_before_daraja_is_called(app, client, monkeypatch):
+    monkeypatch.setattr(stk_dispatcher, "submit", lambda *args, **kwargs: None)
+
+    response = push(client)
+
+    assert response.status_code == 202
+    payment = db.session.get(TollPaid, uuid.UUID(response.json["payment_id"]))
+    assert payment.status == "PENDING"
+    assert payment.checkout_request_id is None
+
+    status = client.get(f"/payments/status/{payment.id}").json
+    assert status["status"] == "queued"
+
+
+def test_worker_records_checkout_request_id(app, client, monkeypatch):
+    calls = fake_stk_push(monkeypatch, {"ResponseCode": "0", "CheckoutRequestID": "ws_CO_1"})
+
+    payment_id = push(client).json["payment_id"]
+    stk_dispatcher.join()
+
+    assert calls == [("254700000001", 100)]
+    status = client.get(f"/payments/status/{payment_id}").json
+    assert status["status"] == "pending"
+    assert status["checkout_request_id"] == "ws_CO_1"
+
+    # The payment screen may also poll by CheckoutRequestID
+    assert client.get("/payments/status/ws_CO_1").json["payment_id"] == payment_id
+
+
+def test_worker_fails_rejected_push(app, client, monkeypatch):
+    fake_stk_push(monkeypatch, {"ResponseCode": "1", "errorMessage": "Invalid phone"})
+
+    payment_id = push(client).json["payment_id"]
+    stk_dispatcher.join()
+
+    assert client.get(f"/payments/status/{payment_id}").json["status"] == "failed"
+
+
+@pytest.mark.parametrize("error", [
+    requests.exceptions.ReadTimeout("read timed out"),
+    StkPushUnconfirmed("Daraja answered 500"),
+    Exception("unexpected")
+])
+def test_unconfirmed_push_is_never_pushed_again(app, client, monkeypatch, error):
+    fake_stk_push(monkeypatch, error)
+
+    payment_id = push(client).json["payment_id"]
+    stk_dispatcher.join()
+
+    assert db.session.get(TollPaid, uuid.UUID(payment_id)).status == "UNKNOWN"
+    assert client.get(f"/payments/status/{payment_id}").json["status"] == "pending"
+    assert push(client, payment_id=payment_id).status_code == 409
+
+
+def test_push_that_never_reached_daraja_is_requeued(app, monkeypatch):
+    outcomes = [DependencyUnavailable("M-Pesa circuit is open"), {"ResponseCode": "0", "CheckoutRequestID": "ws_CO_1"}]
+
+    def stk_push(phone_number, amount, account_reference="TollPayment"):
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    monkeypatch.setattr(MpesaService, "stk_push", staticmethod(stk_push))
+    payment = TollPaid(amount=100, phone_number="254700000001", status="PENDING")
+    db.session.add(payment)
+    db.session.commit()
+
+    dispatcher = StkPushDispatcher(workers=1, requeue_seconds=0)
+    dispatcher.submit(app, payment.id, phone_number="254700000001", amount=100)
+    for _ in range(100):
+        dispatcher.join()
+        if dispatcher.accepted:
+            break
+        time.sleep(0.01)
+    dispatcher.shutdown()
+
+    assert dispatcher.stats()["requeued"] == 1
+    db.session.expire_all()
+    assert db.session.get(TollPaid, payment.id).checkout_request_id == "ws_CO_1"
+
+
+def test_full_queue_rejects_push(app, client, monkeypatch):
+    dispatcher = StkPushDispatcher(workers=1, queue_size=1)
+    dispatcher._ensure_started()
+    # Park the only worker so the queue fills up
+    dispatcher._queue.put(None)
+    dispatcher._threads[0].join()
+    dispatcher._queue.put_nowait(object())
+    monkeypatch.setattr("routes.mpesa_routes.stk_dispatcher", dispatcher)
+
+    response = push(client)
+
+    assert response.status_code == 503
+    assert TollPaid.query.one().status == "FAILED"
+    assert dispatcher.stats()["rejected"] == 1
+
+
+def test_stk_push_fails_fast_while_breaker_is_open(app, client, monkeypatch):
+    from services.mpesa_http import mpesa_http
+    from services.resilience import CircuitBreaker
+
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_seconds=60)
+    breaker.record_failure()
+    monkeypatch.setattr(mpesa_http, "breaker", breaker)
+
+    response = push(client)
+
+    assert response.status_code == 503
+    assert TollPaid.query.count() == 0
+
+
+def test_stk_push_rejects_malformed_ids(app, client):
+    for body in ({"zone_id": "not-a-zone"}, {"payment_id": "not-a-charge"}):
+        response = client.post("/payments/stk-push", json={"phone": "254712345678", "amount": 50, **body})
+
+        assert response.status_code == 400
+        assert "must be UUIDs" in response.json["error"]
+    assert TollPaid.query.count() == 0
+
+
+def test_status_of_unknown_payment(client):
+    assert client.get(f"/payments/status/{uuid.uuid4()}").status_code == 404
+
+
+# ---------------------------------------------------------------------------
+# STK callbacks
+# ---------------------------------------------------------------------------
+
+def callback_body(checkout_request_id, result_code=0, receipt="RCP1"):
+    callback = {
+        "CheckoutRequestID": checkout_request_id,
+        "ResultCode": result_code,
+        "ResultDesc": "ok" if result_code == 0 else "Request cancelled by user"
+    }
+    if result_code == 0:
+        callback["CallbackMetadata"] = {"Item": [
+            {"Name": "Amount", "Value": 100},
+            {"Name": "MpesaReceiptNumber", "Value": receipt},
+            {"Name": "PhoneNumber", "Value": 254700000001}
+        ]}
+    return {"Body": {"stkCallback": callback}}
+
+
+def pending_payment(checkout_request_id):
+    payment = TollPaid(amount=100, checkout_request_id=checkout_request_id, status="PENDING")
+    db.session.add(payment)
+    db.session.commit()
+    return payment.id
+
+
+def test_callback_completes_payment(app, client):
+    payment_id = pending_payment("ws_CO_1")
+
+    response = client.post("/payments/stk/callback", json=callback_body("ws_CO_1"))
+
+    assert response.json["ResultCode"] == 0
+    payment = db.session.get(TollPaid, payment_id)
+    assert payment.status == "COMPLETED"
+    assert payment.mpesa_receipt_number == "RCP1"
+    assert payment.phone_number == "254700000001"
+
+
+def test_batched_callbacks_share_one_commit(app, client, monkeypatch):
+    from services.config import MpesaConfig
+    from services.stk_callbacks import stk_callback_writer
+
+    monkeypatch.setattr(MpesaConfig, "STK_CALLBACK_MODE", "batched")
+    monkeypatch.setattr(stk_callback_writer, "flush_seconds", 0.5)
+    for i in range(5):
+        pending_payment(f"ws_CO_{i}")
+    batches_before = stk_callback_writer.stats()["batches"]
+
+    for i in range(5):
+        result_code = 0 if i % 2 == 0 else 1032
+        assert client.post("/payments/stk/callback", json=callback_body(f"ws_CO_{i}", result_code)).status_code == 200
+    stk_callback_writer.flush()
+
+    assert stk_callback_writer.stats()["batches"] == batches_before + 1
+    db.session.expire_all()
+    statuses = dict(db.session.query(TollPaid.checkout_request_id, TollPaid.status))
+    assert statuses == {
+        "ws_CO_0": "COMPLETED", "ws_CO_1": "FAILED", "ws_CO_2": "COMPLETED",
+        "ws_CO_3": "FAILED", "ws_CO_4": "COMPLETED"
+    }
+
+
+def test_failed_callback_does_not_undo_completion(app):
+    from services.stk_callbacks import apply_stk_callbacks, parse_stk_callback
+
+    pending_payment("ws_CO_1")
+    apply_stk_callbacks([
+        parse_stk_callback(callback_body("ws_CO_1")),
+        parse_stk_callback(callback_body("ws_CO_1", result_code=1))
+    ])
+    db.session.commit()
+
+    assert TollPaid.query.one().status == "COMPLETED"
+
+
+def test_duplicate_callbacks_keep_one_row(app, client):
+    for _ in range(3):
+        client.post("/payments/stk/callback", json=callback_body("ws_CO_9"))
+
+    payment = TollPaid.query.one()
+    assert payment.status == "COMPLETED"
+    assert payment.amount == 100
+
+
+@pytest.mark.parametrize("result_code, status", [(0, "COMPLETED"), (1032, "FAILED")])
+def test_callback_before_checkout_id_is_stored(app, client, monkeypatch, result_code, status):
+    monkeypatch.setattr(stk_dispatcher, "submit", lambda *args, **kwargs: None)
+    payment_id = uuid.UUID(push(client).json["payment_id"])
+
+    # Callback wins the race against the worker
+    client.post("/payments/stk/callback", json=callback_body("ws_CO_1", result_code))
+    fake_stk_push(monkeypatch, {"ResponseCode": "0", "CheckoutRequestID": "ws_CO_1"})
+    stk_dispatcher._process(StkPushJob(app, payment_id, "254700000001", 100, "TollPayment"))
+
+    payment = TollPaid.query.one()
+    assert payment.id == payment_id
+    assert payment.status == status
+    assert payment.amount == 100
+
+    # Daraja's own row is archived, not lost
+    early = TollPaidDuplicate.query.one()
+    assert early.duplicate_of == payment_id
+    assert early.checkout_request_id == "ws_CO_1"
+    assert early.status == status
+    assert early.created_at is not None
+
+
+# ---------------------------------------------------------------------------
+# C2B confirmations
+# ---------------------------------------------------------------------------
+
+def confirmation_body(trans_id, bill_ref, amount="100.00"):
+    return {
+        "TransactionType": "Pay Bill",
+        "TransID": trans_id,
+        "TransTime": "20261017120000",
+        "TransAmount": amount,
+        "BusinessShortCode": "600383",
+        "BillRefNumber": bill_ref,
+        "MSISDN": "254700000001"
+    }
+
+
+def test_c2b_confirmations_are_stored_and_settle_charges(app, client, monkeypatch):
+    from db import C2BPayment
+    from services.c2b_confirmations import c2b_confirmation_writer
+
+    monkeypatch.setattr(c2b_confirmation_writer, "flush_seconds", 0.5)
+    zone = make_zone("Thika Road Toll", -1.2195, 36.8869)
+    driver = make_driver()
+    charge = TollPaid(amount=100, status="UNPAID")
+    short = TollPaid(amount=300, status="UNPAID")
+    db.session.add_all([charge, short])
+    db.session.flush()
+    db.session.add_all([
+        TollEntry(user_id=driver.user_id, zone_id=zone.zone_id, entry_time=datetime.utcnow(), payment_id=charge.id),
+        TollEntry(user_id=driver.user_id, zone_id=zone.zone_id, entry_time=datetime.utcnow(), payment_id=short.id)
+    ])
+    db.session.commit()
+
+    for body in (
+        confirmation_body("TX1", str(charge.id)),
+        confirmation_body("TX1", str(charge.id)),  # Daraja retry
+        confirmation_body("TX2", str(short.id)),   # does not cover the charge
+        confirmation_body("TX3", "Payment")
+    ):
+        assert client.post("/payments/c2b/confirm", json=body).json["ResultCode"] == 0
+    c2b_confirmation_writer.flush()
+
+    db.session.expire_all()
+    assert C2BPayment.query.count() == 3
+    assert db.session.get(TollPaid, charge.id).status == "COMPLETED"
+    assert db.session.get(TollPaid, charge.id).mpesa_receipt_number == "TX1"
+    assert db.session.get(TollPaid, short.id).status == "UNPAID"
+
+    headers = auth_headers(driver)
+    by_ref = client.get(f"/payments/c2b/payments/{charge.id}", headers=headers).json["payments"]
+    assert [(p["trans_id"], p["payment_id"]) for p in by_ref] == [("TX1", str(charge.id))]
+    assert client.get("/payments/c2b/payments/TX2", headers=headers).json["payments"][0]["amount"] == 100
+
+
+def test_c2b_confirmation_does_not_settle_charge_with_push_in_flight(app, monkeypatch):
+    from collections import namedtuple
+    from db import C2BPayment
+    from services import c2b_confirmations
+    from services.c2b_confirmations import apply_c2b_confirmations, parse_c2b_confirmation
+
+    pushed = TollPaid(amount=100, status="PENDING", checkout_request_id="ws_CO_1")
+    failed = TollPaid(amount=100, status="FAILED")
+    raced = TollPaid(amount=100, status="PENDING")
+    db.session.add_all([pushed, failed, raced])
+    db.session.commit()
+
+    # raced was read as UNPAID just before a push claimed it
+    read_charges = c2b_confirmations._referenced_charges
+    Row = namedtuple("Row", ["id", "amount", "status"])
+
+    def stale_read(confirmations):
+        charges = read_charges(confirmations)
+        charges[str(raced.id)] = Row(raced.id, 100, "UNPAID")
+        return charges
+
+    monkeypatch.setattr(c2b_confirmations, "_referenced_charges", stale_read)
+
+    settled = apply_c2b_confirmations([
+        parse_c2b_confirmation(confirmation_body("TX1", str(pushed.id))),
+        parse_c2b_confirmation(confirmation_body("TX2", str(failed.id))),
+        parse_c2b_confirmation(confirmation_body("TX3", str(raced.id)))
+    ])
+    db.session.commit()
+
+    assert settled == 1
+    assert db.session.get(TollPaid, pushed.id).status == "PENDING"
+    assert db.session.get(TollPaid, raced.id).status == "PENDING"
+    assert db.session.get(TollPaid, failed.id).mpesa_receipt_number == "TX2"
+    links = {row.trans_id: row.payment_id for row in C2BPayment.query}
+    assert links == {"TX1": None, "TX2": failed.id, "TX3": None}
+
+
+def test_c2b_payments_are_only_shown_to_their_driver(app, client):
+    from db import C2BPayment
+
+    zone = make_zone("Thika Road Toll", -1.2195, 36.8869)
+    owner = make_driver()
+    other = make_driver("other")
+    charge = TollPaid(amount=100, status="COMPLETED")
+    db.session.add(charge)
+    db.session.flush()
+    db.session.add_all([
+        TollEntry(user_id=owner.user_id, zone_id=zone.zone_id, entry_time=datetime.utcnow(), payment_id=charge.id),
+        C2BPayment(trans_id="TX1", bill_ref_number=str(charge.id), amount=100, msisdn="254700000001",
+                   payment_id=charge.id),
+        C2BPayment(trans_id="TX2", bill_ref_number="Payment", amount=50, msisdn="254700000002")
+    ])
+    db.session.commit()
+
+    assert client.get("/payments/c2b/payments/TX1").status_code == 401
+    assert client.get("/payments/c2b/payments/TX1", headers=auth_headers(other)).json["payments"] == []
+    assert client.get("/payments/c2b/payments/TX2", headers=auth_headers(owner)).json["payments"] == []
+    assert client.get("/payments/c2b/payments/TX1", headers=auth_headers(owner)).json["payments"][0]["msisdn"] \
+        == "254700000001"
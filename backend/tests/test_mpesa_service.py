@@ -0,0 +1,304 @@
+import os
+import threading
+import time
+
+import pytest
+import requests
+from urllib3.exceptions import MaxRetryError, NewConnectionError, ProtocolError
+
+from services.config import MpesaConfig
+from services.mpesa_http import MpesaHttpClient, mpesa_http
+from services.mpesa_service import MpesaService, StkPushNotSent, StkPushUnconfirmed
+from services.resilience import (
+    Bulkhead, BulkheadFullError, CircuitBreaker, CircuitOpenError, CLOSED, HALF_OPEN, OPEN
+)
+
+
+class FakeResponse:
+    def __init__(self, payload, status_code=200):
+        self.payload = payload
+        self.status_code = status_code
+        self.text = str(payload)
+
+    def json(self):
+        return self.payload
+
+    def raise_for_status(self):
+        pass
+
+
+@pytest.fixture(autouse=True)
+def mpesa_credentials(monkeypatch):
+    monkeypatch.setattr(MpesaConfig, "CONSUMER_KEY", "key")
+    monkeypatch.setattr(MpesaConfig, "CONSUMER_SECRET", "secret")
+    MpesaService.reset_token_cache()
+    yield
+    MpesaService.reset_token_cache()
+
+
+def fake_oauth(monkeypatch, expires_in="3599", delay=0):
+    calls = []
+
+    def get(url, **kwargs):
+        calls.append(url)
+        time.sleep(delay)
+        return FakeResponse({"access_token": f"token-{len(calls)}", "expires_in": expires_in})
+
+    monkeypatch.setattr(mpesa_http, "get", get)
+    return calls
+
+
+# ---------------------------------------------------------------------------
+# OAuth token cache
+# ---------------------------------------------------------------------------
+
+def test_token_is_reused_until_expiry(monkeypatch):
+    calls = fake_oauth(monkeypatch)
+
+    assert MpesaService.get_access_token() == "token-1"
+    assert MpesaService.get_access_token() == "token-1"
+
+    assert len(calls) == 1
+    stats = MpesaService.token_cache_stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["cached"] is True
+
+
+def test_token_refreshes_inside_margin(monkeypatch):
+    # Lifetime shorter than the refresh margin is never served from cache
+    calls = fake_oauth(monkeypatch, expires_in="30")
+
+    MpesaService.get_access_token()
+    assert MpesaService.get_access_token() == "token-2"
+    assert len(calls) == 2
+
+
+def test_concurrent_callers_share_one_refresh(monkeypatch):
+    calls = fake_oauth(monkeypatch, delay=0.05)
+    tokens = []
+
+    threads = [
+        threading.Thread(target=lambda: tokens.append(MpesaService.get_access_token()))
+        for _ in range(10)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert tokens == ["token-1"] * 10
+
+
+def test_invalidate_forces_refresh(monkeypatch):
+    calls = fake_oauth(monkeypatch)
+
+    MpesaService.get_access_token()
+    MpesaService.invalidate_access_token()
+
+    assert MpesaService.get_access_token() == "token-2"
+    assert len(calls) == 2
+
+
+def test_stk_push_server_error_is_unconfirmed(monkeypatch):
+    fake_oauth(monkeypatch)
+    monkeypatch.setattr(mpesa_http, "post", lambda url, **kwargs: FakeResponse({}, status_code=500))
+
+    with pytest.raises(StkPushUnconfirmed):
+        MpesaService.stk_push("254700000001", 100)
+
+
+def test_stk_push_without_token_is_not_sent(monkeypatch):
+    def get(url, **kwargs):
+        raise requests.exceptions.ConnectionError("no route")
+
+    monkeypatch.setattr(mpesa_http, "get", get)
+
+    with pytest.raises(StkPushNotSent):
+        MpesaService.stk_push("254700000001", 100)
+
+
+# ---------------------------------------------------------------------------
+# Pooled HTTP client
+# ---------------------------------------------------------------------------
+
+class FakeSession:
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = []
+
+    def request(self, method, url, **kwargs):
+        self.calls.append((method, url, kwargs))
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        if isinstance(outcome, tuple):
+            status_code, payload = outcome
+            return FakeResponse(payload, status_code=status_code)
+        return FakeResponse({}, status_code=outcome)
+
+
+def client_with(outcomes, max_retries=2):
+    client = MpesaHttpClient(max_retries=max_retries, backoff_seconds=0)
+    session = FakeSession(outcomes)
+    client._session = session
+    client._pid = os.getpid()
+    return client, session
+
+
+def test_client_applies_default_timeouts():
+    client, session = client_with([200])
+
+    client.get("https://daraja.test/oauth")
+
+    assert session.calls[0][2]["timeout"] == client.timeout
+
+
+def test_idempotent_calls_retry_transient_failures():
+    client, session = client_with([requests.exceptions.ReadTimeout(), 503, 200])
+
+    response = client.get("https://daraja.test/oauth")
+
+    assert response.status_code == 200
+    assert len(session.calls) == 3
+    assert client.stats()["retries"] == 2
+
+
+def test_retries_are_bounded():
+    client, session = client_with([503, 503, 503, 503])
+
+    assert client.get("https://daraja.test/oauth").status_code == 503
+    assert len(session.calls) == 3
+
+
+def refused():
+    reason = NewConnectionError(None, "Connection refused")
+    return requests.exceptions.ConnectionError(MaxRetryError(None, "https://daraja.test/stk", reason))
+
+
+def test_non_idempotent_calls_retry_only_unopened_connections():
+    client, session = client_with([requests.exceptions.ConnectTimeout(), refused(), 503])
+    assert client.post("https://daraja.test/stk").status_code == 503
+    assert len(session.calls) == 3
+
+    dropped = requests.exceptions.ConnectionError(ProtocolError("Connection aborted."))
+    client, session = client_with([dropped])
+    with pytest.raises(requests.exceptions.ConnectionError):
+        client.post("https://daraja.test/stk")
+    assert len(session.calls) == 1
+
+    client, session = client_with([requests.exceptions.ReadTimeout()])
+    with pytest.raises(requests.exceptions.ReadTimeout):
+        client.post("https://daraja.test/stk")
+    assert len(session.calls) == 1
+
+
+def test_session_is_reused():
+    client = MpesaHttpClient()
+    assert client.session is client.session
+    client.close()
+
+
+# ---------------------------------------------------------------------------
+# Circuit breaker and bulkhead
+# ---------------------------------------------------------------------------
+
+def test_breaker_opens_and_probes_after_reset():
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_seconds=0.05)
+
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    time.sleep(0.06)
+    assert breaker.state == HALF_OPEN
+    breaker.before_call()
+    # Only one probe at a time
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.stats()["rejected"] == 2
+
+
+def test_failed_probe_reopens_breaker():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_seconds=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+
+    breaker.before_call()
+    breaker.record_failure()
+
+    assert breaker.state == OPEN
+    assert breaker.stats()["times_opened"] == 2
+
+
+def test_bulkhead_caps_concurrent_calls():
+    bulkhead = Bulkhead("test", max_concurrent=2)
+
+    with bulkhead, bulkhead:
+        with pytest.raises(BulkheadFullError):
+            with bulkhead:
+                pass
+
+    with bulkhead:
+        assert bulkhead.stats()["active"] == 1
+    assert bulkhead.stats() == {"max_concurrent": 2, "active": 0, "peak": 2, "rejected": 1}
+
+
+def test_client_stops_calling_failing_daraja():
+    client, session = client_with([503, 503, 200], max_retries=0)
+    client.breaker = CircuitBreaker("test", failure_threshold=2, reset_seconds=60)
+
+    client.post("https://daraja.test/stk")
+    client.post("https://daraja.test/stk")
+    with pytest.raises(CircuitOpenError):
+        client.post("https://daraja.test/stk")
+
+    assert len(session.calls) == 2
+    assert client.stats()["breaker"]["state"] == OPEN
+
+
+def test_daraja_500_outage_opens_breaker():
+    client, session = client_with([500, 500, 200], max_retries=0)
+    client.breaker = CircuitBreaker("test", failure_threshold=2, reset_seconds=60)
+
+    client.post("https://daraja.test/stk")
+    client.post("https://daraja.test/stk")
+
+    assert client.breaker.state == OPEN
+
+
+def test_daraja_business_500_does_not_count_against_breaker():
+    # STK Query of a push the customer has not answered yet
+    processing = (500, {"errorCode": "500.001.1001", "errorMessage": "The transaction is being processed"})
+    client, session = client_with([processing, processing], max_retries=0)
+    client.breaker = CircuitBreaker("test", failure_threshold=2, reset_seconds=60)
+
+    client.post("https://daraja.test/stkquery")
+    client.post("https://daraja.test/stkquery")
+
+    assert client.breaker.state == CLOSED
+
+
+def test_breaker_opens_against_fake_daraja_outage():
+    from benchmarks.fake_daraja import FakeDarajaServer
+
+    with FakeDarajaServer(failure_rate=1.0) as daraja:
+        client = MpesaHttpClient(max_retries=0, backoff_seconds=0)
+        client.breaker = CircuitBreaker("test", failure_threshold=3, reset_seconds=60)
+
+        statuses = [client.post(f"{daraja.url}/mpesa/stkpush/v1/processrequest", json={}).status_code
+                    for _ in range(3)]
+        with pytest.raises(CircuitOpenError):
+            client.post(f"{daraja.url}/mpesa/stkpush/v1/processrequest", json={})
+
+        assert statuses == [500, 500, 500]
+        assert daraja.fake.counts["stk_push"] == 3
+        client.close()
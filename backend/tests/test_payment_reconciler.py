@@ -0,0 +1,74 @@
+from datetime import datetime, timedelta
+
+from db import db, TollPaid
+from services.mpesa_service import MpesaService
+from services.payment_reconciler import PaymentReconciler, RateLimiter
+
+
+DARAJA_OUTCOMES = {
+    "ws_paid": {"ResultCode": "0", "ResultDesc": "The service request is processed successfully."},
+    "ws_cancelled": {"ResultCode": "1032", "ResultDesc": "Request cancelled by user"},
+    "ws_processing": {"errorCode": "500.001.1001", "errorMessage": "The transaction is being processed"},
+    "ws_paid_too": {"ResultCode": "0", "ResultDesc": "The service request is processed successfully."}
+}
+
+
+def fake_stk_query(monkeypatch):
+    queried = []
+
+    def stk_query(checkout_request_id):
+        queried.append(checkout_request_id)
+        if checkout_request_id == "ws_unreachable":
+            raise Exception("Daraja unreachable")
+        return DARAJA_OUTCOMES[checkout_request_id]
+
+    monkeypatch.setattr(MpesaService, "stk_query", staticmethod(stk_query))
+    return queried
+
+
+def payment(checkout_request_id, created_at, status="PENDING"):
+    row = TollPaid(amount=100, checkout_request_id=checkout_request_id, status=status, created_at=created_at)
+    db.session.add(row)
+    return row
+
+
+def statuses():
+    return {
+        checkout or "queued": status
+        for checkout, status in db.session.query(TollPaid.checkout_request_id, TollPaid.status)
+    }
+
+
+def test_reconciler_settles_stuck_payments(app, monkeypatch):
+    queried = fake_stk_query(monkeypatch)
+    stuck_since = datetime.utcnow() - timedelta(hours=1)
+    # Identical timestamps exercise the id tie-breaker of the keyset
+    for checkout in ("ws_paid", "ws_cancelled", "ws_processing", "ws_paid_too", "ws_unreachable"):
+        payment(checkout, stuck_since)
+    payment(None, stuck_since)
+    payment("ws_recent", datetime.utcnow())
+    payment("ws_done", stuck_since, status="COMPLETED")
+    db.session.commit()
+
+    stats = PaymentReconciler(
+        older_than_seconds=300, batch_size=2, concurrency=3, queries_per_second=0
+    ).run_once()
+
+    assert sorted(queried) == sorted(["ws_paid", "ws_cancelled", "ws_processing", "ws_paid_too", "ws_unreachable"])
+    assert statuses() == {
+        "ws_paid": "COMPLETED", "ws_paid_too": "COMPLETED", "ws_cancelled": "FAILED",
+        "ws_processing": "PENDING", "ws_unreachable": "PENDING", "queued": "FAILED",
+        "ws_recent": "PENDING", "ws_done": "COMPLETED"
+    }
+    assert stats["scanned"] == 5
+    assert stats["batches"] == 3
+    assert (stats["completed"], stats["failed"], stats["abandoned"]) == (2, 1, 1)
+    assert (stats["still_pending"], stats["errors"]) == (1, 1)
+
+
+def test_rate_limiter_spaces_calls():
+    limiter = RateLimiter(50)
+    started = datetime.utcnow()
+    for _ in range(6):
+        limiter.acquire()
+    assert datetime.utcnow() - started >= timedelta(seconds=0.09)
@@ -0,0 +1,72 @@
+"""
+Query-plan checks for the toll_entries hot path.
+
+Captures the SELECTs that check_zone_entry and record_zone_exit issue
+against toll_entries and asserts SQLite plans them through the indexes
+added in migration 8d3f6a1c0b52 rather than a table scan.
+"""
+
+from sqlalchemy import event
+
+from db import db
+from services.driver_state import driver_state_store
+from services.geo_service import GeoFencingService
+from tests.test_geo_service import make_driver, make_zone
+
+
+def capture_toll_entry_selects(fn):
+    statements = []
+
+    def before_execute(conn, cursor, statement, parameters, context, executemany):
+        if "FROM toll_entries" in statement and statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    event.listen(db.engine, "before_cursor_execute", before_execute)
+    try:
+        fn()
+    finally:
+        event.remove(db.engine, "before_cursor_execute", before_execute)
+    return statements
+
+
+def query_plan(statement, parameters):
+    rows = db.session.connection().exec_driver_sql(
+        "EXPLAIN QUERY PLAN " + statement, parameters
+    ).fetchall()
+    return " | ".join(row[-1] for row in rows)
+
+
+def assert_uses_toll_entry_index(statements):
+    assert statements
+    for statement, parameters in statements:
+        plan = query_plan(statement, parameters)
+        assert "INDEX ix_toll_entries_" in plan, f"{plan}\n{statement}"
+
+
+def test_check_zone_entry_uses_toll_entry_indexes(app):
+    make_zone("Thika Road Toll", -1.2195, 36.8869)
+    driver_id = make_driver().user_id
+    driver_state_store.warm()  # once per process, scans recent rows only
+
+    statements = capture_toll_entry_selects(
+        lambda: GeoFencingService.check_zone_entry(driver_id, -1.217, 36.889)
+    )
+
+    assert_uses_toll_entry_index(statements)
+
+
+def test_record_zone_exit_uses_open_entry_index(app):
+    zone = make_zone("Thika Road Toll", -1.2195, 36.8869)
+    driver_id = make_driver().user_id
+    zone_id = zone.zone_id
+    GeoFencingService.check_zone_entry(driver_id, -1.217, 36.889)
+
+    statements = capture_toll_entry_selects(
+        lambda: GeoFencingService.record_zone_exit(driver_id, zone_id)
+    )
+
+    assert_uses_toll_entry_index(statements)
+    assert all(
+        "ix_toll_entries_open" in query_plan(statement, parameters)
+        for statement, parameters in statements
+    )
@@ -0,0 +1,156 @@
+import uuid
+
+from db import db, TollZone, ZoneChange
+from services.geo_service import GeoFencingService
+from tests.test_geo_service import make_driver, square
+
+
+def test_create_toll_zone_stores_canonical_geometry(app, client):
+    response = client.post("/toll-zones", json={
+        "zone_name": "Thika Road Toll",
+        "charge_amount": 50,
+        "polygon_coords": square(-1.2195, 36.8869)
+    })
+
+    zone = TollZone.query.one()
+    assert response.status_code == 201
+    assert zone.polygon_coords["type"] == "Polygon"
+    assert zone.geometry_wkb is not None
+    assert (zone.min_lat, zone.max_lng) == (-1.2195, 36.8919)
+    assert GeoFencingService.find_zone(-1.217, 36.889).zone_name == "Thika Road Toll"
+
+
+def test_create_toll_zone_fixes_reversed_axis_order(app, client):
+    reversed_coords = [[c["lat"], c["lng"] + 100] for c in square(-1.2195, 36.8869)]
+    client.post("/toll-zones", json={
+        "zone_name": "Reversed",
+        "charge_amount": 50,
+        "polygon_coords": {"type": "Polygon", "coordinates": [reversed_coords]}
+    })
+
+    zone = TollZone.query.one()
+    assert zone.min_lng > 100
+    assert zone.polygon_coords["coordinates"][0][0][0] > 100
+
+
+def test_create_toll_zone_rejects_self_intersecting_polygon(app, client):
+    bowtie = [
+        {"lat": 0, "lng": 0}, {"lat": 1, "lng": 1},
+        {"lat": 0, "lng": 1}, {"lat": 1, "lng": 0}, {"lat": 0, "lng": 0}
+    ]
+    response = client.post("/toll-zones", json={
+        "zone_name": "Bowtie", "charge_amount": 50, "polygon_coords": bowtie
+    })
+
+    assert response.status_code == 400
+    assert response.get_json()["error"].startswith("Invalid polygon_coords")
+    assert TollZone.query.count() == 0
+
+
+# ---------------------------------------------------------------------------
+# Conditional GET
+# ---------------------------------------------------------------------------
+
+def create_zone(client, name="Thika Road Toll"):
+    return client.post("/toll-zones", json={
+        "zone_name": name, "charge_amount": 50, "polygon_coords": square(-1.2195, 36.8869)
+    })
+
+
+def test_zone_lists_answer_304_until_zones_change(app, client):
+    create_zone(client)
+
+    for url in ("/toll-zones", "/check-zones"):
+        first = client.get(url)
+        assert first.status_code == 200
+        assert first.headers["ETag"] and first.headers["Last-Modified"]
+        assert first.json["success"] is True
+
+        again = client.get(url, headers={"If-None-Match": first.headers["ETag"]})
+        assert again.status_code == 304
+        assert again.data == b""
+
+    etag = client.get("/toll-zones").headers["ETag"]
+    create_zone(client, "Mombasa Road Toll")
+
+    changed = client.get("/toll-zones", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert len(changed.json["data"]) == 2
+    assert client.get("/check-zones").json["count"] == 2
+
+
+def test_zone_list_is_served_from_cached_bytes(app, client, monkeypatch):
+    create_zone(client)
+    client.get("/toll-zones")
+
+    def fail(self):
+        raise AssertionError("zone serialized again")
+
+    monkeypatch.setattr(TollZone, "to_dict", fail)
+    assert client.get("/toll-zones").status_code == 200
+    assert client.get("/check-zones").status_code == 200
+
+
+def test_zone_lists_keep_table_order(app, client):
+    # The driver app defaults to the first zone, so the cached body must
+    # not reorder zones (here: by descending zone_id)
+    for i, name in enumerate(["First", "Second", "Third"]):
+        db.session.add(TollZone(
+            zone_id=uuid.UUID("cba"[i] * 32), zone_name=name, charge_amount=50,
+            polygon_coords=square(-1.2195 + i, 36.8869)
+        ))
+    db.session.commit()
+    expected = [zone.zone_name for zone in TollZone.query.all()]
+
+    assert [zone["zone_name"] for zone in client.get("/toll-zones").json["data"]] == expected
+    assert [zone["zone_name"] for zone in client.get("/check-zones").json["zones"]] == expected
+
+
+# ---------------------------------------------------------------------------
+# Delta sync
+# ---------------------------------------------------------------------------
+
+def test_changes_feed_replays_creates_updates_and_deletes(app, client):
+    first = create_zone(client).json["zone"]["zone_id"]
+    snapshot = client.get("/toll-zones/changes").json
+    assert snapshot["snapshot"] is True
+    assert [z["zone_id"] for z in snapshot["upserts"]] == [first]
+
+    second = create_zone(client, "Mombasa Road Toll").json["zone"]["zone_id"]
+    client.put(f"/toll-zones/{first}", json={"charge_amount": 80})
+    client.put(f"/toll-zones/{first}", json={"charge_amount": 90})
+    assert client.delete(f"/toll-zones/{second}").status_code == 200
+
+    delta = client.get("/toll-zones/changes", query_string={"since": snapshot["seq"]}).json
+    assert delta["snapshot"] is False
+    assert delta["seq"] == snapshot["seq"] + 4
+    assert [(z["zone_id"], z["charge_amount"]) for z in delta["upserts"]] == [(first, 90)]
+    assert delta["deletes"] == [second]
+
+    idle = client.get("/toll-zones/changes", query_string={"since": delta["seq"]}).json
+    assert (idle["snapshot"], idle["upserts"], idle["deletes"]) == (False, [], [])
+
+
+def test_changes_feed_falls_back_to_snapshot(app, client):
+    create_zone(client)
+    seq = client.get("/toll-zones/changes").json["seq"]
+
+    # Ahead of the server, e.g. after a database restore
+    assert client.get("/toll-zones/changes", query_string={"since": seq + 10}).json["snapshot"] is True
+
+    # Behind a pruned log
+    create_zone(client, "Mombasa Road Toll")
+    ZoneChange.query.filter(ZoneChange.seq <= seq).delete()
+    db.session.commit()
+    stale = client.get("/toll-zones/changes", query_string={"since": seq - 1}).json
+    assert stale["snapshot"] is True
+    assert len(stale["upserts"]) == 2
+
+
+def test_zone_with_entries_cannot_be_deleted(app, client):
+    zone_id = create_zone(client).json["zone"]["zone_id"]
+    driver = make_driver()
+    GeoFencingService.check_zone_entry(driver.user_id, -1.217, 36.889)
+
+    assert client.delete(f"/toll-zones/{zone_id}").status_code == 409
+    assert TollZone.query.count() == 1
@@ -0,0 +1,176 @@
+import json
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+from db import db, TollEntry, TollPaid
+from tests.test_geo_fencing_routes import auth_headers
+from tests.test_geo_service import make_driver, make_zone
+from tests.test_query_plans import query_plan
+
+
+def make_payments(count, zone=None, status="COMPLETED", start=datetime(2026, 1, 1)):
+    payments = [
+        TollPaid(
+            zone_id=zone.zone_id if zone else None,
+            amount=100,
+            status=status,
+            # Pairs share a timestamp so the id tie-breaker is exercised
+            created_at=start + timedelta(minutes=i // 2)
+        )
+        for i in range(count)
+    ]
+    db.session.add_all(payments)
+    db.session.commit()
+    return payments
+
+
+def test_payments_always_have_a_keyset_timestamp(app):
+    payment = TollPaid(amount=100, status="PENDING")
+    db.session.add(payment)
+    db.session.commit()
+
+    assert payment.created_at is not None
+    assert not TollPaid.__table__.c.created_at.nullable
+
+
+def test_pages_cover_every_row_once_newest_first(app, client):
+    zone = make_zone("Thika Road Toll", -1.2195, 36.8869)
+    make_payments(7, zone)
+
+    seen = []
+    cursor = None
+    while True:
+        query = {"limit": 3, **({"cursor": cursor} if cursor else {})}
+        page = client.get("/tolls-history", query_string=query).json
+        seen.extend(page["data"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    assert len(seen) == 7
+    assert len({row["id"] for row in seen}) == 7
+    keys = [(row["created_at"], row["id"]) for row in seen]
+    assert keys == sorted(keys, reverse=True)
+    assert all(row["zone_name"] == "Thika Road Toll" for row in seen)
+
+
+def test_history_is_one_query_per_page(app, client):
+    zone = make_zone("Thika Road Toll", -1.2195, 36.8869)
+    make_payments(20, zone)
+    statements = []
+
+    def before_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", before_execute)
+    try:
+        client.get("/tolls-history")
+    finally:
+        event.remove(db.engine, "before_cursor_execute", before_execute)
+
+    assert len(statements) == 1
+
+
+def test_history_filters(app, client):
+    zone = make_zone("Thika Road Toll", -1.2195, 36.8869)
+    make_payments(4, zone, status="COMPLETED")
+    make_payments(3, status="FAILED", start=datetime(2026, 2, 1))
+
+    def count(**query):
+        return len(client.get("/tolls-history", query_string=query).json["data"])
+
+    assert count(status="failed") == 3
+    assert count(zone_id=str(zone.zone_id)) == 4
+    assert count(**{"from": "2026-02-01"}) == 3
+    assert count(to="2026-01-01T00:01:00") == 2
+    assert client.get("/tolls-history", query_string={"zone_id": "nope"}).status_code == 400
+    assert client.get("/tolls-history", query_string={"cursor": "nope"}).status_code == 400
+
+
+def test_ndjson_streams_every_matching_row(app, client, monkeypatch):
+    monkeypatch.setattr("routes.tolls_history.STREAM_BATCH_SIZE", 2)
+    make_payments(5)
+
+    response = client.get("/tolls-history", query_string={"format": "ndjson"})
+
+    assert response.mimetype == "application/x-ndjson"
+    rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert len({row["id"] for row in rows}) == 5
+
+
+# ---------------------------------------------------------------------------
+# Per-driver trips
+# ---------------------------------------------------------------------------
+
+def make_trips(driver, zone, count, start=datetime(2026, 1, 1)):
+    entries = [
+        TollEntry(
+            user_id=driver.user_id,
+            zone_id=zone.zone_id,
+            entry_time=start + timedelta(minutes=i // 2),
+            exit_time=start + timedelta(minutes=i // 2, seconds=30)
+        )
+        for i in range(count)
+    ]
+    db.session.add_all(entries)
+    db.session.commit()
+    return entries
+
+
+def test_my_trips_pages_only_the_drivers_entries(app, client):
+    zone = make_zone("Thika Road Toll", -1.2195, 36.8869)
+    driver = make_driver()
+    make_trips(driver, zone, 5)
+    make_trips(make_driver("other"), zone, 3)
+
+    charge = TollPaid(amount=100, status="COMPLETED", mpesa_receipt_number="RCP1")
+    db.session.add(charge)
+    db.session.flush()
+    TollEntry.query.filter_by(user_id=driver.user_id).update({TollEntry.payment_id: charge.id})
+    db.session.commit()
+
+    seen = []
+    cursor = None
+    while True:
+        query = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        page = client.get("/my-trips", query_string=query, headers=auth_headers(driver)).json
+        seen.extend(page["data"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    assert len({trip["entry_id"] for trip in seen}) == 5
+    keys = [(trip["entry_time"], trip["entry_id"]) for trip in seen]
+    assert keys == sorted(keys, reverse=True)
+    assert seen[0]["zone_name"] == "Thika Road Toll"
+    assert seen[0]["payment"]["mpesa_receipt_number"] == "RCP1"
+
+
+def test_my_trips_requires_a_token(client):
+    assert client.get("/my-trips").status_code == 401
+
+
+def test_my_trips_walks_user_entry_time_index(app, client):
+    zone = make_zone("Thika Road Toll", -1.2195, 36.8869)
+    driver = make_driver()
+    make_trips(driver, zone, 10)
+    statements = []
+
+    def before_execute(conn, cursor, statement, parameters, context, executemany):
+        if "FROM toll_entries" in statement:
+            statements.append((statement, parameters))
+
+    event.listen(db.engine, "before_cursor_execute", before_execute)
+    try:
+        first = client.get("/my-trips", query_string={"limit": 3}, headers=auth_headers(driver)).json
+        client.get("/my-trips", query_string={"limit": 3, "cursor": first["next_cursor"]},
+                   headers=auth_headers(driver))
+    finally:
+        event.remove(db.engine, "before_cursor_execute", before_execute)
+
+    assert len(statements) == 2
+    for statement, parameters in statements:
+        plan = query_plan(statement, parameters)
+        assert "ix_toll_entries_user_entry_time" in plan, plan
+        assert "TEMP B-TREE" not in plan, plan
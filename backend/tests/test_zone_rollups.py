@@ -0,0 +1,91 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+from db import db, TollEntry, TollPaid, ZoneHourlyRollup, ZoneDailyRollup
+from services.zone_rollups import ZoneRollups
+from tests.test_geo_service import make_driver, make_zone
+
+DAY = datetime(2026, 3, 1)
+
+
+def add_traffic(zone, driver, hour, entries=0, completed=0, failed=0, amount=100):
+    at = DAY + timedelta(hours=hour, minutes=5)
+    db.session.add_all(
+        TollEntry(user_id=driver.user_id, zone_id=zone.zone_id, entry_time=at) for _ in range(entries)
+    )
+    payments = [
+        TollPaid(zone_id=zone.zone_id, amount=amount, status=status, created_at=at)
+        for status, count in (("COMPLETED", completed), ("FAILED", failed))
+        for _ in range(count)
+    ]
+    db.session.add_all(payments)
+    db.session.commit()
+    return payments
+
+
+def hourly(zone, hour):
+    return db.session.get(ZoneHourlyRollup, (zone.zone_id, DAY + timedelta(hours=hour)))
+
+
+def test_first_refresh_builds_hourly_and_daily_rollups(app):
+    zone = make_zone("Thika Road Toll", -1.2195, 36.8869)
+    driver = make_driver()
+    add_traffic(zone, driver, 8, entries=3, completed=2, failed=1)
+    add_traffic(zone, driver, 9, entries=1, completed=1, amount=250)
+
+    ZoneRollups(lag_seconds=0).refresh()
+
+    morning = hourly(zone, 8)
+    assert (morning.entries, morning.payments_completed, morning.payments_failed) == (3, 2, 1)
+    assert (morning.amount_completed, morning.amount_failed) == (200, 100)
+
+    day = db.session.get(ZoneDailyRollup, (zone.zone_id, DAY))
+    assert (day.entries, day.payments_completed, day.amount_completed) == (4, 3, 450)
+
+
+def test_refresh_moves_changed_payments_between_counters(app):
+    zone = make_zone("Thika Road Toll", -1.2195, 36.8869)
+    driver = make_driver()
+    rollups = ZoneRollups(lag_seconds=0)
+    failed = add_traffic(zone, driver, 8, entries=1, failed=1)[0]
+    rollups.refresh(now=datetime.utcnow() - timedelta(seconds=1))
+
+    # A retried push succeeds; a new entry lands in the same hour
+    TollPaid.query.filter_by(id=failed.id).update({TollPaid.status: "COMPLETED"})
+    add_traffic(zone, driver, 8, entries=1)
+    stats = rollups.refresh()
+
+    assert stats["hours"] == 1
+    db.session.expire_all()
+    bucket = hourly(zone, 8)
+    assert (bucket.entries, bucket.payments_completed, bucket.payments_failed) == (2, 1, 0)
+    assert db.session.get(ZoneDailyRollup, (zone.zone_id, DAY)).amount_completed == 100
+
+
+def test_report_reads_only_rollups(app, client):
+    zone = make_zone("Thika Road Toll", -1.2195, 36.8869)
+    driver = make_driver()
+    add_traffic(zone, driver, 8, entries=2, completed=2)
+    add_traffic(zone, driver, 10, entries=1, failed=1)
+    ZoneRollups(lag_seconds=0).refresh()
+    statements = []
+
+    def before_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", before_execute)
+    try:
+        report = client.get("/reports/zones", query_string={
+            "granularity": "hour", "from": "2026-03-01", "to": "2026-03-02"
+        }).json
+    finally:
+        event.remove(db.engine, "before_cursor_execute", before_execute)
+
+    assert [b["bucket_start"] for b in report["buckets"]] == ["2026-03-01T08:00:00", "2026-03-01T10:00:00"]
+    totals = report["totals"][str(zone.zone_id)]
+    assert (totals["entries"], totals["payments_completed"], totals["payments_failed"]) == (3, 2, 1)
+    assert not any("toll_entries" in s or "tolls_paid" in s for s in statements)
+
+    daily = client.get("/reports/zones", query_string={"from": "2026-03-01", "to": "2026-03-02"}).json
+    assert daily["buckets"][0]["amount_completed"] == 200
@@ -13,8 +13,12 @@ function App() {
 
   const handleTollDetected = (zone) => {
     setActiveZone((prev) => {
-      // ✅ Do NOT overwrite a paid zone
-      if (prev?.zone_id === zone.zone_id) return prev;
+      // ✅ Do NOT overwrite a paid zone, but keep the server's queued charge
+      if (prev?.zone_id === zone.zone_id) {
+        return zone.payment_id && !prev.payment_id
+          ? { ...prev, payment_id: zone.payment_id }
+          : prev;
+      }
 
       return {
         ...zone,
@@ -12,6 +12,34 @@ const markerIcon = new L.Icon({
   iconAnchor: [12, 41]
 });
 
+async function checkLocation(zones) {
+  const token = localStorage.getItem("token");
+  if (!token) return null;
+
+  try {
+    const res = await fetch(`${API_BASE_URL}/api/check-location`, {
+      method: "POST",
+      headers: {
+        "Content-Type": "application/json",
+        Authorization: `Bearer ${token}`
+      },
+      body: JSON.stringify({
+        latitude: DRIVER_POSITION[0],
+        longitude: DRIVER_POSITION[1]
+      })
+    });
+    const json = await res.json();
+
+    if (!json.success || !json.in_zone || !json.zone) return null;
+
+    const zone = zones.find((z) => z.zone_id === json.zone.zone_id) || json.zone;
+    return { ...zone, payment_id: json.payment_id };
+  } catch (err) {
+    console.error("Failed to check location", err);
+    return null;
+  }
+}
+
 export default function MapView({ onTollDetected }) {
   const [zones, setZones] = useState([]);
 
@@ -36,7 +64,14 @@ export default function MapView({ onTollDetected }) {
 
         setZones(formatted);
 
-        if (formatted.length && onTollDetected) {
+        if (!onTollDetected) return;
+
+        // Signed in: ask the server which zone we are in; it returns the
+        // payment_id of the charge it queued for the entry (if any)
+        const detected = await checkLocation(formatted);
+        if (detected) {
+          onTollDetected(detected);
+        } else if (formatted.length) {
           onTollDetected(formatted[0]);
         }
       } catch (err) {
@@ -17,11 +17,11 @@ export default function TollPaymentModal({ toll, onClose, onSuccess }) {
     };
   }, []);
 
-  const startPollingStatus = (checkoutRequestId) => {
+  const startPollingStatus = (paymentId) => {
     pollRef.current = setInterval(async () => {
       try {
         const res = await fetch(
-          `${API_BASE_URL}/payments/status/${checkoutRequestId}`
+          `${API_BASE_URL}/payments/status/${paymentId}`
         );
         const data = await res.json();
 
@@ -63,14 +63,16 @@ export default function TollPaymentModal({ toll, onClose, onSuccess }) {
         body: JSON.stringify({
           phone: `254${phone}`,
           amount: toll.charge_amount,
-          zone_id: toll.zone_id
+          zone_id: toll.zone_id,
+          // Charge already queued by the zone check, if any
+          payment_id: toll.payment_id
         })
       });
 
       const data = await res.json();
 
-      if (data.success && data.response?.CheckoutRequestID) {
-        startPollingStatus(data.response.CheckoutRequestID);
+      if (data.success && data.payment_id) {
+        startPollingStatus(data.payment_id);
       } else {
         setLoading(false);
         setError("Unable to initiate payment.");